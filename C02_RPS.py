@@ -1,51 +1,71 @@
+"""Rock, paper, scissors against the computer.
+
+    python C02_RPS.py              #the computer plays at random
+    python C02_RPS.py markov2      #or any rps_sim.STRATEGIES, learning from your moves
+
+For matches of millions of rounds between strategies see rps_sim.py.
+"""
 import random, sys
-from C03_zigzag import zigzag
-
-print("ROCK, PAPER, SCISSORS!")
-
-#Variables to keep track of wins, losses, and ties
-wins = 0
-losses = 0
-ties = 0
-
-while True: #Main game loop
-    print("%s Wins, %s Losses, %s Ties" % (wins, losses, ties))
-    while True: #player input loop
-        print("Enter your move: r, p, s, or q for quit")
-        playerMove = input()
-        if playerMove == 'q':
-            sys.exit() #quits the program
-        if playerMove in ["r","p","s"]:
-            break
-        print("Type r, p, s, or q")
-
-    #Display player choice
-    if playerMove == 'r':
-        print("ROCK versus...")
-    elif playerMove == 'p':
-        print("PAPER versus...")
-    elif playerMove == 's':
-        print("SCISSORS versus...")
-
-    #Display what computer chose
-    randomNumber = random.randint(1, 3)
-    if randomNumber == 1:
-        computerMove = 'r'
-        print("ROCK")
-    if randomNumber == 2:
-        computerMove = 'p'
-        print("PAPER")
-    if randomNumber == 3:
-        computerMove = 's'
-        print("SCISSORS")
-
-    #Display and record round results
-    if playerMove == computerMove:
-        print('Tie')
-        ties += 1
-    elif (playerMove == 'r' and computerMove == 's') or (playerMove == 's' and computerMove == 'p') or (playerMove == 'p' and computerMove == 'r'):
-        print("You win!")
-        wins+=1
-    else:
-        print("You lose!")
-        losses += 1
\ No newline at end of file
+
+MOVES = 'rps'
+NAMES = ('ROCK', 'PAPER', 'SCISSORS')
+#RESULT[player][computer]: 1 the player wins, -1 the player loses, 0 a tie
+RESULT = {'r': {'r': 0, 'p': -1, 's': 1},
+          'p': {'r': 1, 'p': 0, 's': -1},
+          's': {'r': -1, 'p': 1, 's': 0}}
+
+
+def main(strategy=None):
+    """The game loop; strategy is a started rps_sim strategy playing one game, or None for random moves"""
+    print("ROCK, PAPER, SCISSORS!")
+
+    #Variables to keep track of wins, losses, and ties
+    wins = 0
+    losses = 0
+    ties = 0
+
+    while True: #Main game loop
+        print("%s Wins, %s Losses, %s Ties" % (wins, losses, ties))
+        while True: #player input loop
+            print("Enter your move: r, p, s, or q for quit")
+            playerMove = input()
+            if playerMove == 'q':
+                sys.exit() #quits the program
+            if playerMove in ["r","p","s"]:
+                break
+            print("Type r, p, s, or q")
+
+        #Display player choice
+        print(NAMES[MOVES.index(playerMove)] + " versus...")
+
+        #Display what computer chose
+        if strategy is None:
+            computerMove = MOVES[random.randint(1, 3) - 1]
+        else:
+            computerMove = MOVES[int(strategy.move()[0])]
+            strategy.update([MOVES.index(computerMove)], [MOVES.index(playerMove)])
+        print(NAMES[MOVES.index(computerMove)])
+
+        #Display and record round results
+        result = RESULT[playerMove][computerMove]
+        if result == 0:
+            print('Tie')
+            ties += 1
+        elif result == 1:
+            print("You win!")
+            wins+=1
+        else:
+            print("You lose!")
+            losses += 1
+
+
+if __name__ == "__main__":
+    strategy = None
+    if len(sys.argv) > 1 and sys.argv[1] != 'random':
+        import numpy as np
+        from rps_sim import STRATEGIES
+        if sys.argv[1] not in STRATEGIES:
+            sys.exit("strategies: " + ', '.join(STRATEGIES))
+        strategy = STRATEGIES[sys.argv[1]]()
+        strategy.start(1, np.random.default_rng())
+    main(strategy)
@@ -20,4 +20,5 @@ def zigzag():
             if indent == 0:
                 indentIncreasing = True
 
-zigzag()
+if __name__ == "__main__":
+    zigzag()
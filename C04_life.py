@@ -1,63 +1,210 @@
-#Conway's game of life
-import random, time, copy
-WIDTH = 60
-HEIGHT = 20
-
-#Create a list of list for the cells
-nextCells = []
-for x in range(WIDTH):
-    column = [] #Create new column
-    for y in range(HEIGHT):
-        if random.randint(0, 1) == 0:
-            column.append('#') #add living cell
-        else:
-            column.append(' ') #add a dead cell
-    nextCells.append(column)
-
-while True:
-    print('\n\n\n\n\n') #separate each cell with newlines
-    currentCells = copy.deepcopy(nextCells)
-    #print currentCells on the screen:
-    for y in range(HEIGHT):
-        for x in range(WIDTH):
-            print(currentCells[x][y], end='') #print # or space
-        print() #print a newline at the end of each row
-
-    #calculate the next step's cells based on current step's cells:
-    for x in range(WIDTH):
-        for y in range(HEIGHT):
-            #get neighboring coordinates:
-            # '% WIDTH' ensures leftCoord is always between 0 and WIDTH - 1
-            leftCoord = (x - 1) % WIDTH
-            rightCoord = (x + 1) % WIDTH
-            aboveCoord = (y - 1) % HEIGHT
-            belowCoord = (y + 1) % HEIGHT
-
-            #count number of living neighbors
+"""Conway's game of life on a wrapping (toroidal) grid, with NumPy.
+
+The grid is a (height, width) bool array, grid[y, x] alive or dead; the
+edges wrap around like the original % WIDTH / % HEIGHT version. Life keeps
+a grid and its scratch buffers, so a generation allocates nothing:
+
+    life = Life.random(60, 20, seed=1)
+    life.step(10)
+    print(life)
+
+Pattern files and checkpoints are in life_io.py; for huge or unbounded
+patterns run far ahead see life_hashlife.py.
+
+    python C04_life.py [width height] [--delay S] [--seed N] [--pattern FILE]
+                       [--checkpoint FILE [--every N]] [--resume FILE]
+    python C04_life.py --benchmark [max_side]        #cell updates/s per grid size
+"""
+import argparse, random, sys, time
+
+import numpy as np
+
+ALIVE = '#'
+DEAD = ' '
+
+
+def _wrap_sum(cells, axis, out):
+    """out = each cell plus its two neighbours along axis, wrapping at the edges"""
+    a = np.moveaxis(cells, axis, 0)
+    o = np.moveaxis(out, axis, 0)
+    np.copyto(o, a)
+    o[1:] += a[:-1]
+    o[0] += a[-1]
+    o[:-1] += a[1:]
+    o[-1] += a[0]
+    return out
+
+
+def step_into(grid, out, rows, counts):
+    """Write the next generation of grid into out; rows and counts are uint8 scratch arrays of its shape"""
+    #3x3 block sums in two passes, the cell itself included, then take it back out
+    _wrap_sum(grid.view(np.uint8), 1, rows)
+    _wrap_sum(rows, 0, counts)
+    counts -= grid
+    #alive next: 3 neighbours, or 2 and alive now, i.e. neighbours | alive == 3
+    counts |= grid
+    np.equal(counts, 3, out=out)
+    return out
+
+
+def step(grid):
+    """Return the next generation of a bool grid"""
+    grid = np.asarray(grid, dtype=bool)
+    return step_into(grid, np.empty_like(grid), np.empty(grid.shape, np.uint8), np.empty(grid.shape, np.uint8))
+
+
+class Life:
+    """A grid that steps in place, flipping between two buffers"""
+
+    def __init__(self, grid):
+        self.grid = np.array(grid, dtype=bool)
+        self._next = np.empty_like(self.grid)
+        self._rows = np.empty(self.grid.shape, np.uint8)
+        self._counts = np.empty(self.grid.shape, np.uint8)
+        self.generation = 0
+
+    @classmethod
+    def random(cls, width, height, seed=None, density=0.5):
+        rng = np.random.default_rng(seed)
+        return cls(rng.random((height, width), dtype=np.float32) < density)
+
+    @classmethod
+    def from_text(cls, text):
+        """Grid from lines of ALIVE characters and anything else for dead cells"""
+        lines = text.splitlines()
+        width = max(map(len, lines), default=0)
+        return cls([[char == ALIVE for char in line.ljust(width)] for line in lines])
+
+    @property
+    def width(self):
+        return self.grid.shape[1]
+
+    @property
+    def height(self):
+        return self.grid.shape[0]
+
+    @property
+    def population(self):
+        return int(np.count_nonzero(self.grid))
+
+    def step(self, generations=1):
+        for _ in range(generations):
+            step_into(self.grid, self._next, self._rows, self._counts)
+            self.grid, self._next = self._next, self.grid
+            self.generation += 1
+        return self
+
+    def __str__(self):
+        chars = np.where(self.grid, ALIVE, DEAD)
+        return '\n'.join(''.join(row) for row in chars)
+
+
+def reference_step(cells):
+    """The original per-cell rules on a list of columns of ALIVE/DEAD strings, to check step against"""
+    width, height = len(cells), len(cells[0])
+    nextCells = [[DEAD] * height for _ in range(width)]
+    for x in range(width):
+        for y in range(height):
             numNeighbors = 0
-            if currentCells[leftCoord][aboveCoord] == '#':
-                numNeighbors += 1 #top left neighbor alive
-            if currentCells[x][aboveCoord] == '#':
-                numNeighbors += 1
-            if currentCells[rightCoord][aboveCoord] == '#':
-                numNeighbors += 1
-            if currentCells[leftCoord][y] == '#':
-                numNeighbors += 1
-            if currentCells[rightCoord][y] == '#':
-                numNeighbors += 1
-            if currentCells[leftCoord][belowCoord] == '#':
-                numNeighbors += 1
-            if currentCells[x][belowCoord] == '#':
-                numNeighbors += 1
-            if currentCells[rightCoord][belowCoord] == '#':
-                numNeighbors += 1
-
-            # Set cell based on Conway's Game of Life rules:
-            if currentCells[x][y] == '#' and (numNeighbors == 2 or numNeighbors == 3):
-                nextCells[x][y] = '#' # Stay alive.
-            elif currentCells[x][y] == ' ' and numNeighbors == 3:
-                nextCells[x][y] = '#' # Become alive.
-            else:
-                nextCells[x][y] = ' ' # Die or stay dead.
-
-    time.sleep(0.2) #one second pause to prevent flickering
\ No newline at end of file
+            for dx in (-1, 0, 1):
+                for dy in (-1, 0, 1):
+                    if (dx or dy) and cells[(x + dx) % width][(y + dy) % height] == ALIVE:
+                        numNeighbors += 1
+            if cells[x][y] == ALIVE and numNeighbors in (2, 3):
+                nextCells[x][y] = ALIVE #stay alive
+            elif cells[x][y] == DEAD and numNeighbors == 3:
+                nextCells[x][y] = ALIVE #become alive
+    return nextCells
+
+
+def check(generations=20, seed=0):
+    """Compare step with reference_step on random grids, including the 1 and 2 wide edge cases"""
+    rng = random.Random(seed)
+    for width, height in ((60, 20), (7, 5), (1, 4), (2, 2), (3, 1)):
+        columns = [[rng.choice((ALIVE, DEAD)) for _ in range(height)] for _ in range(width)]
+        life = Life([[columns[x][y] == ALIVE for x in range(width)] for y in range(height)])
+        for generation in range(generations):
+            columns = reference_step(columns)
+            life.step()
+            expected = np.array([[columns[x][y] == ALIVE for x in range(width)] for y in range(height)])
+            if not np.array_equal(life.grid, expected):
+                raise AssertionError(f"{width}x{height} differs from the reference at generation {generation + 1}")
+    print("vectorized step matches the per-cell rules")
+
+
+def benchmark(max_side=10000, seconds=1.0):
+    """Print cell updates per second for grid sizes from 60x20 up to max_side squared"""
+    sizes = [(60, 20)] + [(side, side) for side in (256, 1024, 4096, 10000) if side <= max_side]
+    columns = [[random.choice((ALIVE, DEAD)) for _ in range(20)] for _ in range(60)]
+    begin = time.perf_counter()
+    runs = 0
+    while time.perf_counter() - begin < seconds:
+        columns = reference_step(columns)
+        runs += 1
+    print(f"{'per-cell python 60x20':<24}{runs * 60 * 20 / (time.perf_counter() - begin):>16,.0f} cell updates/s")
+    for width, height in sizes:
+        life = Life.random(width, height, seed=1)
+        life.step() #first touch of the buffers
+        begin = time.perf_counter()
+        generations = 0
+        while generations < 3 or time.perf_counter() - begin < seconds:
+            life.step()
+            generations += 1
+        rate = width * height * generations / (time.perf_counter() - begin)
+        print(f"{f'numpy {width}x{height}':<24}{rate:>16,.0f} cell updates/s")
+
+
+def main(width=60, height=20, delay=0.2, seed=None, pattern=None, checkpoint=None, every=100, resume=None):
+    """Animate a grid: a checkpoint to resume, a pattern file in the middle of the grid, or a seeded random one"""
+    import life_io
+    if resume:
+        life = life_io.resume(resume)
+        checkpoint = checkpoint or resume
+    elif pattern:
+        cells, rule = life_io.read_pattern(pattern)
+        if rule != life_io.RULE:
+            raise ValueError(f"{pattern} is for rule {rule}, only {life_io.RULE} is supported")
+        if cells.shape[0] > height or cells.shape[1] > width:
+            raise ValueError(f"{pattern} is {cells.shape[1]}x{cells.shape[0]}, bigger than {width}x{height}")
+        grid = np.zeros((height, width), dtype=bool)
+        top, left = (height - cells.shape[0]) // 2, (width - cells.shape[1]) // 2
+        grid[top:top + cells.shape[0], left:left + cells.shape[1]] = cells
+        life = Life(grid)
+    else:
+        life = Life.random(width, height, seed)
+    try:
+        while True:
+            print('\n\n\n\n\n') #separate each generation with newlines
+            print(life)
+            life.step()
+            if checkpoint and life.generation % every == 0:
+                life_io.save_checkpoint(checkpoint, life.grid, life.generation)
+            time.sleep(delay) #pause to prevent flickering
+    finally:
+        if checkpoint:
+            life_io.save_checkpoint(checkpoint, life.grid, life.generation)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Conway's game of life")
+    parser.add_argument('size', type=int, nargs='*', default=[60, 20], metavar='WIDTH HEIGHT')
+    parser.add_argument('--delay', type=float, default=0.2)
+    parser.add_argument('--seed', type=int, help="seed of the random grid")
+    parser.add_argument('--pattern', help="start from an .rle or plaintext pattern file")
+    parser.add_argument('--checkpoint', help="save the grid here every --every generations and on exit")
+    parser.add_argument('--every', type=int, default=100)
+    parser.add_argument('--resume', help="continue from a checkpoint file, saving back to it")
+    parser.add_argument('--benchmark', type=int, nargs='?', const=10000, metavar='MAX_SIDE')
+    parser.add_argument('--check', action='store_true', help="compare with the per-cell rules")
+    args = parser.parse_args()
+    if args.check:
+        check()
+    elif args.benchmark:
+        benchmark(args.benchmark)
+    else:
+        if len(args.size) != 2:
+            parser.error("give both width and height")
+        try:
+            main(*args.size, args.delay, args.seed, args.pattern, args.checkpoint, args.every, args.resume)
+        except KeyboardInterrupt:
+            sys.exit()
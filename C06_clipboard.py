@@ -1,18 +1,85 @@
+"""Multi-clipboard: copy the text saved under a keyphrase.
+
+    python C06_clipboard.py KEYPHRASE                 #copy its text
+    python C06_clipboard.py --prefix PREFIX           #list keyphrases starting with PREFIX
+    python C06_clipboard.py --fuzzy WORDS             #list keyphrases like WORDS
+    python C06_clipboard.py --add KEYPHRASE [TEXT]    #save TEXT, or stdin, under KEYPHRASE
+    python C06_clipboard.py --import PHRASES.json     #save a {keyphrase: text} file
+
+The phrases live in the clipboard_phrases store at $MCLIP_DB, by default
+~/.mclip.db. The store is only opened when the file exists, and pyperclip
+is only imported when a text is actually copied. TEXT holds the built-in
+phrases, which the store overrides.
+"""
+import argparse, json, os, sys
+
 TEXT = {
     'agree':"""Yes, I agree. That sounds fine to me.""",
     'busy':"""Sorry, can we do this later this week or next week?""",
     'excuse':"""Apologies for the delay—our project's scalar waveform orthogonality index\n encountered an unforeseen phase-transient recursion within the hyperconductive mesh buffer,\n causing a cascade of stochastic eigenvalue realignments\n across the core multiplexing fabric. This led to a temporal desynchronization in\n the quantum-inverted feedback loop, which, despite extensive entropic normalization,\n failed to converge before system level watchdog protocols\n initiated a full-spectrum recalibration. We're currently rerouting the nanosecond-scale\n flux coefficients through a secondary subraster to restore nominal throughput."""
 }
 
-import sys, pyperclip
-if len(sys.argv) < 2:
-    print('Usage: py mclip.py [keyphrase] - copy phrase text')
-    sys.exit()
+DB = os.environ.get('MCLIP_DB') or os.path.join(os.path.expanduser('~'), '.mclip.db')
+
+
+def open_store(create=False):
+    """The phrase store, or None if there is none and create is false"""
+    if not create and not os.path.exists(DB):
+        return None
+    from clipboard_phrases import PhraseStore
+    return PhraseStore(DB)
+
 
-keyphrase = sys.argv[1]
+def lookup(keyphrase, store):
+    text = store and store.get(keyphrase)
+    return TEXT.get(keyphrase) if text is None else text
 
-if keyphrase in TEXT:
-    pyperclip.copy(TEXT[keyphrase])
+
+def copy(keyphrase, text):
+    import pyperclip
+    pyperclip.copy(text)
     print(f'Text for {keyphrase} copied to clipboard.')
-else:
-    print('There is no text for ' + keyphrase)
\ No newline at end of file
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="copy phrase text", usage='py mclip.py [keyphrase] - copy phrase text')
+    parser.add_argument('keyphrase', nargs='?')
+    parser.add_argument('text', nargs='?', help="with --add, the text to save instead of stdin")
+    parser.add_argument('--prefix', action='store_true', help="list keyphrases starting with keyphrase")
+    parser.add_argument('--fuzzy', action='store_true', help="list keyphrases like keyphrase")
+    parser.add_argument('--add', action='store_true', help="save text under keyphrase")
+    parser.add_argument('--import', dest='phrases', metavar='FILE', help="save the phrases of a JSON object")
+    args = parser.parse_args()
+
+    if args.phrases:
+        with open(args.phrases, encoding='utf-8') as file, open_store(create=True) as store:
+            phrases = json.load(file)
+            store.add(phrases)
+            print(f'Saved {len(phrases)} phrases, {len(store)} in {DB}.')
+        sys.exit()
+    if args.keyphrase is None:
+        parser.print_usage()
+        sys.exit()
+
+    keyphrase = args.keyphrase
+    store = open_store(create=args.add)
+    if args.add:
+        with store:
+            store.add({keyphrase: sys.stdin.read() if args.text is None else args.text})
+        print(f'Saved text for {keyphrase}.')
+    elif args.prefix:
+        keys = sorted({key for key in TEXT if key.startswith(keyphrase)} | set(store.prefix(keyphrase) if store else ()))
+        print('\n'.join(keys) if keys else 'No keyphrase starts with ' + keyphrase)
+    elif args.fuzzy:
+        keys = [key for _, key in store.fuzzy(keyphrase)] if store else []
+        keys += [key for key in TEXT if key not in keys and keyphrase.lower() in key]
+        print('\n'.join(keys) if keys else 'No keyphrase is like ' + keyphrase)
+    else:
+        text = lookup(keyphrase, store)
+        if text is not None:
+            copy(keyphrase, text)
+        else:
+            print('There is no text for ' + keyphrase)
+            similar = [key for _, key in store.fuzzy(keyphrase, 3)] if store else []
+            if similar:
+                print('Did you mean: ' + ', '.join(similar))
@@ -1,4 +1,24 @@
-import pyperclip, re
+"""Find phone numbers and email addresses in the clipboard, or in files.
+
+    python C07_dataExtr.py                          #clipboard in, clipboard out
+    python C07_dataExtr.py PATH... [-o out.jsonl]   #files, directories or - for stdin
+
+scan_matches() finds both kinds in one pass, only running the patterns
+where NumPy shows a match can start.
+
+Bulk mode memory-maps each file and cuts it into chunks that are scanned on
+a process pool. A chunk is scanned with OVERLAP bytes of its neighbours on
+both sides but only keeps matches that start inside it, so a match across
+a chunk boundary is found exactly once. Each chunk's normalized matches are
+counted and written to a sorted run file; the runs are merged into one
+JSONL or CSV record per distinct match (type, normalized value, count), so
+memory stays bounded by the chunk size however big the input is.
+"""
+import argparse, csv, heapq, json, mmap, os, re, sys, tempfile, time
+from collections import Counter, namedtuple
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
 
 phoneRegex = re.compile(r"""(
                 (\d{3}|\(\d{3}\))? #area code
@@ -16,24 +36,284 @@ emailRegex = re.compile(r"""(
                 (\.[a-zA-Z]{2,4}) #com/net/etc.
                         )""", re.VERBOSE)
 
-#find matches in clipboard text
+#the same patterns for scanning bytes from files
+phoneBytesRegex = re.compile(phoneRegex.pattern.encode(), re.VERBOSE)
+emailBytesRegex = re.compile(emailRegex.pattern.encode(), re.VERBOSE)
+
+CHUNK_SIZE = 64 << 20
+#longest match expected across a chunk boundary
+OVERLAP = 4096
+#run files merged at once
+MAX_RUNS = 256
 
-text = str(pyperclip.paste())
 
-matches = []
-for groups in phoneRegex.findall(text):
-    phoneNum = '-'.join(groups[1], groups[3], groups[5])
+def phone_number(groups):
+    """Normalize the findall groups of a phoneRegex match: 415-555-1234 x12"""
+    area = groups[1].strip('()')
+    phoneNum = '-'.join(part for part in (area, groups[3], groups[5]) if part)
     if groups[8] != '':
         phoneNum += ' x' + groups[8]
-    matches.append(phoneNum)
-
-for groups in emailRegex.findall(text):
-    matches.append(groups[0])
-
-#copy results to clipboard
-if len(matches) > 0:
-    pyperclip.copy('\n'.join(matches))
-    print('Copied to clipboard:')
-    print('\n.join(matches)')
-else:
-    print('No phone number or email addresses found.')
+    return phoneNum
+
+
+def extract(text):
+    """Phone numbers then email addresses in text, in order, repeats included"""
+    matches = [phone_number(groups) for groups in phoneRegex.findall(text)]
+    matches += [groups[0] for groups in emailRegex.findall(text)]
+    return matches
+
+
+Match = namedtuple('Match', 'start end kind value')
+
+#byte classes: phone number digits and separators, where a phone match can start, email usernames
+_DIGIT = np.zeros(256, dtype=bool)
+_DIGIT[list(b'0123456789')] = True
+_SEPARATOR = np.zeros(256, dtype=bool)
+_SEPARATOR[list(b' \t\n\r\f\v-.')] = True
+_PHONE_LEAD = _DIGIT | _SEPARATOR
+_PHONE_LEAD[ord('(')] = True
+_USERNAME = np.zeros(256, dtype=bool)
+_USERNAME[list(b'abcdefghijklmnopqrstuvwxyzABCDEFGHIJKLMNOPQRSTUVWXYZ0123456789._%+-')] = True
+#a phone match has its 'ddd-dddd' core this many bytes after its start: no area code, a separator,
+#'ddd', 'ddd' and a separator or '(ddd)', '(ddd)' and a separator
+_CORE_OFFSETS = (0, 1, 3, 4, 5, 6)
+_BLOCK = 1 << 20
+
+
+def _phone_starts(array, low, high):
+    """Yield in order the positions in [low, high) where a phoneRegex match could start"""
+    lookahead = _CORE_OFFSETS[-1] + 8
+    for begin in range(low, high, _BLOCK):
+        end = min(begin + _BLOCK, high)
+        window = array[begin:min(end + lookahead, high)]
+        digit = _DIGIT[window]
+        #core[i]: window[i:i + 8] is three digits, a separator and four digits
+        core = np.zeros(end - begin + lookahead, dtype=bool)
+        cores = len(window) - 7
+        if cores > 0:
+            core[:cores] = digit[:cores] & digit[1:cores + 1] & digit[2:cores + 2] & _SEPARATOR[window[3:cores + 3]]
+            for k in range(4, 8):
+                core[:cores] &= digit[k:cores + k]
+        candidates = np.zeros(end - begin, dtype=bool)
+        for offset in _CORE_OFFSETS:
+            candidates |= core[offset:offset + end - begin]
+        candidates &= _PHONE_LEAD[window[:end - begin]]
+        yield from (begin + np.flatnonzero(candidates)).tolist()
+
+
+def _phones(data, array, low, high):
+    last_end = low
+    for start in _phone_starts(array, low, high):
+        if start < last_end:
+            continue
+        match = phoneBytesRegex.match(data, start, high)
+        if match:
+            last_end = match.end()
+            area, first, last, extension = match.group(2, 4, 6, 9)
+            value = '-'.join(part.decode('latin-1') for part in (area and area.strip(b'()'), first, last) if part)
+            if extension:
+                value += ' x' + extension.decode('latin-1')
+            yield Match(start, last_end, 'phone', value)
+
+
+def _emails(data, array, low, high):
+    last_end = low
+    for begin in range(low, high, _BLOCK):
+        end = min(begin + _BLOCK, high)
+        window = array[begin:end]
+        ats = np.flatnonzero(window == ord('@'))
+        if not len(ats):
+            continue
+        #run_start[i]: where the run of username bytes ending at i - 1 starts
+        positions = np.arange(1, len(window) + 1)
+        run_start = np.maximum.accumulate(np.where(_USERNAME[window], 0, positions))
+        starts = run_start[np.maximum(ats - 1, 0)] * (ats > 0) + begin
+        for at, start in zip((ats + begin).tolist(), starts.tolist()):
+            if at < last_end:
+                continue
+            if start == begin:
+                #the run may go on into the previous block
+                while start > low and _USERNAME[array[start - 1]]:
+                    start -= 1
+            #only the start of the username bytes before an @ can reach it, the rest of the run fails the same way
+            start = max(start, last_end)
+            match = emailBytesRegex.match(data, start, high) if start < at else None
+            if match:
+                last_end = match.end()
+                yield Match(start, last_end, 'email', match.group().decode('latin-1'))
+
+
+def scan_matches(data, low=0, high=None):
+    """Phone numbers and emails in bytes or an mmap in one pass, as Match(start, end, kind, value) by start.
+
+    Gives the same matches as phoneBytesRegex.finditer(data, low, high)
+    and emailBytesRegex.finditer(data, low, high), but the patterns only
+    run where a match can start: NumPy finds the 'ddd-dddd' cores a phone
+    number needs and the @ of an email.
+    """
+    high = len(data) if high is None else high
+    array = np.frombuffer(data, dtype=np.uint8)
+    return heapq.merge(_phones(data, array, low, high), _emails(data, array, low, high))
+
+
+def scan(data, start=0, end=None):
+    """Count normalized ('phone' | 'email', value) matches in bytes or an mmap that start in data[start:end].
+
+    The scan reads up to OVERLAP bytes on either side, so matches that
+    start inside but end outside are complete and earlier ones are skipped
+    over the way a scan of the whole data would.
+    """
+    end = len(data) if end is None else end
+    found = Counter()
+    for match in scan_matches(data, max(start - OVERLAP, 0), min(end + OVERLAP, len(data))):
+        if start <= match.start < end:
+            found[match.kind, match.value.lower() if match.kind == 'email' else match.value] += 1
+    return found
+
+
+def _write_run(found, directory):
+    """Write counted matches sorted as 'kind\tvalue\tcount' lines, return the file name"""
+    with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.run', delete=False) as run:
+        for (kind, value), count in sorted(found.items()):
+            run.write(f"{kind}\t{value}\t{count}\n")
+    return run.name
+
+
+def _scan_task(source, start, end, directory):
+    """Scan one chunk of a file (source is its path) or of stdin (source is the bytes); return (run, matches)"""
+    if isinstance(source, bytes):
+        found = scan(source, start, end)
+    else:
+        with open(source, 'rb') as file, mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ) as data:
+            found = scan(data, start, end)
+    return _write_run(found, directory), sum(found.values())
+
+
+def _file_chunks(paths, chunk_size):
+    """Yield (path, start, end) chunks of the files under paths"""
+    for path in paths:
+        if os.path.isdir(path):
+            files = sorted(os.path.join(root, name) for root, _, names in os.walk(path) for name in names)
+        else:
+            files = [path]
+        for file in files:
+            size = os.path.getsize(file)
+            for start in range(0, size, chunk_size):
+                yield file, start, min(start + chunk_size, size)
+
+
+def _stdin_chunks(stream, chunk_size):
+    """Yield (bytes, start, end) chunks of a binary stream, each with OVERLAP bytes of context on both sides"""
+    previous = b''
+    current = stream.read(chunk_size)
+    while current:
+        following = stream.read(chunk_size)
+        yield previous[-OVERLAP:] + current + following[:OVERLAP], len(previous[-OVERLAP:]), \
+            len(previous[-OVERLAP:]) + len(current)
+        previous, current = current, following
+
+
+def _compact(runs, directory):
+    """Merge run files into one, so no more than MAX_RUNS are ever open"""
+    with tempfile.NamedTemporaryFile('w', dir=directory, suffix='.run', delete=False) as merged:
+        for kind, value, count in merge_runs(runs):
+            merged.write(f"{kind}\t{value}\t{count}\n")
+    for run in runs:
+        os.remove(run)
+    return merged.name
+
+
+def merge_runs(runs):
+    """Merge sorted run files, yield (kind, value, count) once per distinct match"""
+    files = [open(run) for run in runs]
+    try:
+        records = heapq.merge(*(map(lambda line: line.rstrip('\n').split('\t'), file) for file in files))
+        last = None
+        for kind, value, count in records:
+            if last and last[0] == kind and last[1] == value:
+                last[2] += int(count)
+                continue
+            if last:
+                yield tuple(last)
+            last = [kind, value, int(count)]
+        if last:
+            yield tuple(last)
+    finally:
+        for file in files:
+            file.close()
+
+
+def extract_bulk(paths, out, fmt='jsonl', workers=None, chunk_size=CHUNK_SIZE):
+    """Extract from files, directories and '-' (stdin) into out as JSONL or CSV; return (matches, distinct, bytes)"""
+    workers = workers or os.cpu_count() or 1
+    total = scanned = 0
+    with tempfile.TemporaryDirectory() as directory, ProcessPoolExecutor(workers) as pool:
+        tasks = (task for path in paths for task in
+                 (_stdin_chunks(sys.stdin.buffer, chunk_size) if path == '-' else _file_chunks([path], chunk_size)))
+        runs = []
+        pending = []
+        #a bounded window of chunks in flight, stdin chunks are held in memory until scanned
+        for source, start, end in tasks:
+            pending.append(pool.submit(_scan_task, source, start, end, directory))
+            scanned += end - start
+            if len(pending) >= 2 * workers:
+                run, matches = pending.pop(0).result()
+                runs.append(run)
+                total += matches
+                if len(runs) >= MAX_RUNS:
+                    runs = [_compact(runs, directory)]
+        for future in pending:
+            run, matches = future.result()
+            runs.append(run)
+            total += matches
+
+        distinct = 0
+        writer = csv.writer(out) if fmt == 'csv' else None
+        if writer:
+            writer.writerow(['type', 'value', 'count'])
+        for kind, value, count in merge_runs(runs):
+            if writer:
+                writer.writerow([kind, value, count])
+            else:
+                out.write(json.dumps({'type': kind, 'value': value, 'count': count}) + '\n')
+            distinct += 1
+    return total, distinct, scanned
+
+
+def clipboard():
+    import pyperclip
+    #find matches in clipboard text
+    text = str(pyperclip.paste())
+    matches = extract(text)
+
+    #copy results to clipboard
+    if len(matches) > 0:
+        pyperclip.copy('\n'.join(matches))
+        print('Copied to clipboard:')
+        print('\n'.join(matches))
+    else:
+        print('No phone number or email addresses found.')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Find phone numbers and email addresses")
+    parser.add_argument('paths', nargs='*', help="files, directories or - for stdin; none for the clipboard")
+    parser.add_argument('-o', '--out', help="output file, .csv for CSV, otherwise JSONL; stdout if not given")
+    parser.add_argument('--format', choices=('jsonl', 'csv'))
+    parser.add_argument('--workers', type=int)
+    parser.add_argument('--chunk-mb', type=int, default=CHUNK_SIZE >> 20)
+    args = parser.parse_args()
+    if not args.paths:
+        clipboard()
+    else:
+        fmt = args.format or ('csv' if args.out and args.out.endswith('.csv') else 'jsonl')
+        out = open(args.out, 'w', newline='') if args.out else sys.stdout
+        begin = time.perf_counter()
+        try:
+            total, distinct, scanned = extract_bulk(args.paths, out, fmt, args.workers, args.chunk_mb << 20)
+        finally:
+            if args.out:
+                out.close()
+        elapsed = time.perf_counter() - begin
+        print(f"{total:,} matches, {distinct:,} distinct in {scanned / 2 ** 20:,.1f} MB, {elapsed:.1f}s "
+              f"({scanned / 2 ** 20 / max(elapsed, 1e-9):,.1f} MB/s)", file=sys.stderr)
@@ -1,20 +1,65 @@
+from array import array
+
 import numpy as np
-import matplotlib.pyplot as plt
-from matplotlib.colors import ListedColormap
+
+from chess_attacks import (WHITE, BLACK, ROOK_DIRS, BISHOP_DIRS, KNIGHT_TARGETS, KING_TARGETS,
+                           PAWN_TARGETS, RAY_SQUARES, KNIGHT_ATTACKS, KING_ATTACKS, ROOK_MASKS,
+                           BISHOP_MASKS, BETWEEN_SQUARES)
+
+from chess_zobrist import PIECE_KEYS, SIDE_KEY, EP_FILE_KEYS, CASTLING_KEYS
+
+PROMOTION_PIECES = 'qrbn'
+#nibble codes used by ChessGame.to_bytes and the undo records
+PIECE_CODES = '.PNBRQKpnbrqk'
+PIECE_CODE = {piece: code for code, piece in enumerate(PIECE_CODES)}
+#(row, col) of each square, shared so restoring state doesn't build new tuples
+SQUARES = [divmod(sq, 8) for sq in range(64)]
+
+#bits of ChessGame.moved, set once a king or rook has left its home square
+WHITE_KING_MOVED, WHITE_QROOK_MOVED, WHITE_KROOK_MOVED = 1, 2, 4
+BLACK_KING_MOVED, BLACK_QROOK_MOVED, BLACK_KROOK_MOVED = 8, 16, 32
+#moving from or onto a home square sets its bit
+TOUCH_MASK = [0] * 64
+TOUCH_MASK[4], TOUCH_MASK[0], TOUCH_MASK[7] = WHITE_KING_MOVED, WHITE_QROOK_MOVED, WHITE_KROOK_MOVED
+TOUCH_MASK[60], TOUCH_MASK[56], TOUCH_MASK[63] = BLACK_KING_MOVED, BLACK_QROOK_MOVED, BLACK_KROOK_MOVED
+#castling rights (1 = K, 2 = Q, 4 = k, 8 = q) left for each moved mask
+CASTLING_RIGHTS = [(not m & (WHITE_KING_MOVED | WHITE_KROOK_MOVED))
+                   | (not m & (WHITE_KING_MOVED | WHITE_QROOK_MOVED)) << 1
+                   | (not m & (BLACK_KING_MOVED | BLACK_KROOK_MOVED)) << 2
+                   | (not m & (BLACK_KING_MOVED | BLACK_QROOK_MOVED)) << 3 for m in range(64)]
+
+
+def pack_move(move):
+    """Pack a (start, end, promotion) move into 15 bits: from, to and promotion piece (0 = none)"""
+    (start_row, start_col), (end_row, end_col), promotion = move
+    code = (start_row * 8 + start_col) | (end_row * 8 + end_col) << 6
+    if promotion:
+        code |= (PROMOTION_PIECES.index(promotion.lower()) + 1) << 12
+    return code
+
+
+def unpack_move(code):
+    """Inverse of pack_move"""
+    promotion = code >> 12
+    return divmod(code & 63, 8), divmod(code >> 6 & 63, 8), PROMOTION_PIECES[promotion - 1] if promotion else None
+
 
 class ChessGame:
     def __init__(self):
         #Initialize the board wiwth standard chess setup using 2D array.
         #Uppercase letters represent white pieces, lowercase is black. Empty squares are '.'
-        self.board = np.full((8,8),'.',dtype=str)
+        board = np.full((8,8),'.',dtype=str)
 
-        self.board[1,:] = 'P' #white pawns
-        self.board[6,:] = 'p' #black pawns
+        board[1,:] = 'P' #white pawns
+        board[6,:] = 'p' #black pawns
 
         #white pieces (bottom row)
-        self.board[0,:] = ['R','N','B','Q','K','B','N','R']
+        board[0,:] = ['R','N','B','Q','K','B','N','R']
         #black pieces (top row)
-        self.board[7,:] = ['r','n','b','q','k','b','n','r']
+        board[7,:] = ['r','n','b','q','k','b','n','r']
+
+        #backends that don't keep an array convert it in their board setter
+        self.board = board
 
         #game state variables
         self.current_player = 'white'
@@ -24,69 +69,38 @@ class ChessGame:
         #track en passant
         self.en_passant_target = None
 
-        #movement tracking
-        self.white_king_moved = False
-        self.black_king_moved = False
-        self.white_rooks_moved = [False,False] #[queenside, kingside]
-        self.black_rooks_moved = [False,False]
+        #movement tracking: mask of the *_MOVED bits for kings and rooks that left home
+        self.moved = 0
+
+        #FEN clocks: plies since the last capture or pawn move, and plies played
+        #before the first one on the move stack (fullmove_number counts from it)
+        self.halfmove_clock = 0
+        self.start_ply = 0
 
         #Position tracking for kings (for check detection)
         self.white_king_pos = (0,4)
         self.black_king_pos = (7,4)
 
-        self.move_history = []
-
-    def display_board(self):
-        """Display chessboard using matplotlib"""
-        #Terminal display
-        print("\n    a   b   c   d   e   f   g   h")
-        print("  +---+---+---+---+---+---+---+---+")
-        #print rows starting from top/black side
-        for i in range(7, -1, -1):
-            print(f"{i+1} |", end="")
-            for j in range(8):
-                piece = self.board[i][j]
-                #display the piece (or space for empty square)
-                piece_symbol = " " if piece == "." else piece
-                print(f" {piece_symbol} |", end="")
-            print("\n  +---+---+---+---+---+---+---+---+")
-
-        print(f"\n{self.current_player.capitalize()}'s turn")
-
-        #matplotlib display
-        plt.figure(figsize=(8,8))
-
-        #create chessboard pattern
-        cmap = ListedColormap(['#f0d9b5','#b58863'])
-        board_img = np.zeros((8,8))
-        for i in range(8):
-            for j in range(8):
-                board_img[i,j]=(i+j)%2
-
-        plt.imshow(board_img, cmap=cmap, origin='lower')
-
-        # Define the Unicode chess symbols dictionary
-        unicode_pieces = {
-            'K': '♔', 'Q': '♕', 'R': '♖', 'B': '♗', 'N': '♘', 'P': '♙',
-            'k': '♚', 'q': '♛', 'r': '♜', 'b': '♝', 'n': '♞', 'p': '♟'
-        }
-
-        #place pieces on the board
-        for i in range(8):
-            for j in range(8):
-                piece = self.board[i][j]
-                if piece != '.':
-                    plt.text(j,i,unicode_pieces[piece],
-                             fontsize=28,ha='center',va='center',
-                             color='black' if piece.isupper() else 'darkred')
-        
-        plt.xticks(np.arange(8), ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'])
-        plt.yticks(np.arange(8), ['1', '2', '3', '4', '5', '6', '7', '8'])
+        self._reset_history()
+
+    def piece_at(self, row, col):
+        """Return the piece on a square, '.' if it is empty"""
+        return self.board[row, col]
+
+    def _set_square(self, row, col, piece):
+        """Put a piece (or '.') on a square"""
+        self.board[row, col] = piece
 
-        plt.title(f"{self.current_player.capitalize()}'s turn")
+    def display_board(self, headless=False):
+        """Print the board and draw it in a matplotlib window that is reused from move to move.
 
-        plt.tight_layout()
-        plt.pause(0.1)
+        headless=True only prints, without importing matplotlib.
+        """
+        renderer = getattr(self, '_renderer', None)
+        if renderer is None or (renderer.mode == 'text') != headless:
+            from chess_render import BoardRenderer
+            renderer = self._renderer = BoardRenderer('text' if headless else 'window')
+        renderer.draw(self)
 
     def algebraic_to_index(self, algebraic):
         """Convert algebraic notation to board indices"""
@@ -122,7 +136,7 @@ class ChessGame:
             return False
         
         #check if the piece belongs to the current player
-        if (self.current_player == 'white' and not piece.isupper()) or (self.current_player == 'white' and piece.isupper()):
+        if (self.current_player == 'white') != piece.isupper():
             return False
         
         end_piece = self.board[end_row][end_col]
@@ -165,7 +179,7 @@ class ChessGame:
                 return True
             
             #first move can be two squares
-            if (piece.isupper() and start_row == 1 and end_row == 3) or (piece.isupper() and start_row == 6 and end_row == 4):
+            if (piece.isupper() and start_row == 1 and end_row == 3) or (piece.islower() and start_row == 6 and end_row == 4):
                 #check if the path is clear
                 if self.board[start_row + direction][start_col] == '.':
                     return True
@@ -185,7 +199,7 @@ class ChessGame:
         end_row, end_col = end
 
         #Rooks can only move in straight lines
-        if start_row != end_row and start_col != end_col:
+        if not ROOK_MASKS[start_row * 8 + start_col] >> (end_row * 8 + end_col) & 1:
             return False
         
         return self.is_path_clear(start, end)
@@ -200,11 +214,8 @@ class ChessGame:
         #Hop hop, and to the side, is how they go!
         #In the shape of an L is how they flow!
 
-        row_diff = abs(start_row - end_row)
-        col_diff = abs(start_col - end_col)
-
         #No check for clear path because knights can jump over other pieces
-        return (row_diff == 2 and col_diff == 1) or (row_diff == 1 and col_diff == 2)
+        return bool(KNIGHT_ATTACKS[start_row * 8 + start_col] >> (end_row * 8 + end_col) & 1)
     
     def is_valid_bishop_move(self, start, end):
         """Check if a bishop move is valid"""
@@ -212,7 +223,7 @@ class ChessGame:
         end_row, end_col = end
 
         #Diagonal movement
-        if abs(start_row - end_row) != abs(start_col - end_col):
+        if not BISHOP_MASKS[start_row * 8 + start_col] >> (end_row * 8 + end_col) & 1:
             return False
         
         return self.is_path_clear(start, end)
@@ -227,38 +238,193 @@ class ChessGame:
         start_row, start_col = start
         end_row, end_col = end
 
-        #Kings move one square in any direction
-        row_diff = abs(start_row - end_row)
-        col_diff = abs(start_col - end_col)
-
-        #normal king move
-        if row_diff <= 1 and col_diff <= 1:
+        #normal king move: one square in any direction
+        if KING_ATTACKS[start_row * 8 + start_col] >> (end_row * 8 + end_col) & 1:
             return True
 
-        #TODO: Castling
+        #castling: the king moves two squares towards a rook on its home row
+        if start_row == end_row and abs(start_col - end_col) == 2 and start_col == 4 and start_row in (0, 7):
+            return self.can_castle(start_row == 0, end_col > start_col)
 
         return False
 
-    def is_path_clear(self, start, end):
-        """Check if the path between start and end is clear of pieces"""
-        start_row, start_col = start
-        end_row, end_col = end
+    def can_castle(self, white, kingside):
+        """Check if a side may castle right now (rights, empty path, no check on the way)"""
+        row = 0 if white else 7
+        right = (1 if kingside else 2) << (0 if white else 2)
+        if not CASTLING_RIGHTS[self.moved] & right:
+            return False
+
+        squares = self.flat_board()
+        king, rook = ('K', 'R') if white else ('k', 'r')
+        if squares[row * 8 + 4] != king or squares[row * 8 + (7 if kingside else 0)] != rook:
+            return False
 
-        #Determine the direction of movement
-        row_step = 0 if start_row == end_row else (1 if start_row < end_row else -1)
-        col_step = 0 if start_col == end_col else (1 if start_col < end_col else -1)
+        #every square between king and rook must be empty
+        between = (5, 6) if kingside else (1, 2, 3)
+        if any(squares[row * 8 + col] != '.' for col in between):
+            return False
 
+        #the king may not castle out of, through or into check
+        enemy = 'black' if white else 'white'
+        for col in ((4, 5, 6) if kingside else (4, 3, 2)):
+            if self.is_square_attacked((row, col), enemy):
+                return False
+        return True
+
+    def is_path_clear(self, start, end):
+        """Check if the path between start and end is clear of pieces"""
         #Check each square along the path (excluding start and end)
-        row, col = start_row + row_step, start_col + col_step
-        while (row, col) != (end_row, end_col):
-            if self.board[row][col] != '.':
+        for sq in BETWEEN_SQUARES[start[0] * 8 + start[1]][end[0] * 8 + end[1]]:
+            if self.board[sq >> 3, sq & 7] != '.':
                 return False
-            row += row_step
-            col += col_step
 
         return True
-    
-    def make_move(self, start_pos, end_pos):
+
+    def flat_board(self):
+        """Return the board as a flat list of 64 pieces, a1 first"""
+        return self.board.ravel().tolist()
+
+    def is_square_attacked(self, square, by_color):
+        """Check if a (row, col) square is attacked by 'white' or 'black' pieces"""
+        sq = square[0] * 8 + square[1]
+        squares = self.flat_board()
+        if by_color == 'white':
+            pawn, knight, bishop, rook, queen, king = 'PNBRQK'
+            #an attacking white pawn stands where a black pawn on sq would capture
+            pawn_sources = PAWN_TARGETS[BLACK][sq]
+        else:
+            pawn, knight, bishop, rook, queen, king = 'pnbrqk'
+            pawn_sources = PAWN_TARGETS[WHITE][sq]
+
+        for s in pawn_sources:
+            if squares[s] == pawn:
+                return True
+        for s in KNIGHT_TARGETS[sq]:
+            if squares[s] == knight:
+                return True
+        for s in KING_TARGETS[sq]:
+            if squares[s] == king:
+                return True
+
+        #sliders: the first piece met along each ray decides
+        rays = RAY_SQUARES[sq]
+        for directions, slider in ((ROOK_DIRS, rook), (BISHOP_DIRS, bishop)):
+            for d in directions:
+                for s in rays[d]:
+                    piece = squares[s]
+                    if piece != '.':
+                        if piece == slider or piece == queen:
+                            return True
+                        break
+
+        return False
+
+    def is_in_check(self, color=None):
+        """Check if a side's king (the current player's by default) is attacked"""
+        color = color or self.current_player
+        if color == 'white':
+            return self.is_square_attacked(self.white_king_pos, 'black')
+        return self.is_square_attacked(self.black_king_pos, 'white')
+
+    def has_legal_moves(self):
+        """Check if the current player has at least one legal move"""
+        return next(self.legal_moves(), None) is not None
+
+    def is_checkmate(self):
+        return self.is_in_check() and not self.has_legal_moves()
+
+    def is_stalemate(self):
+        return not self.is_in_check() and not self.has_legal_moves()
+
+    def pseudo_legal_moves(self):
+        """Yield (start, end, promotion) for every move the pieces allow, ignoring checks"""
+        squares = self.flat_board()
+        white = self.current_player == 'white'
+        own = str.isupper if white else str.islower
+
+        for sq, piece in enumerate(squares):
+            if piece == '.' or not own(piece):
+                continue
+            start = divmod(sq, 8)
+            piece_type = piece.lower()
+
+            if piece_type == 'p':
+                yield from self._pawn_moves(squares, sq, white)
+            elif piece_type == 'n' or piece_type == 'k':
+                for s in (KNIGHT_TARGETS[sq] if piece_type == 'n' else KING_TARGETS[sq]):
+                    target = squares[s]
+                    if target == '.' or not own(target):
+                        yield start, divmod(s, 8), None
+                if piece_type == 'k' and sq == (4 if white else 60):
+                    for kingside in (True, False):
+                        if self.can_castle(white, kingside):
+                            yield start, (start[0], 6 if kingside else 2), None
+            else:
+                if piece_type == 'r':
+                    directions = ROOK_DIRS
+                elif piece_type == 'b':
+                    directions = BISHOP_DIRS
+                else:
+                    directions = ROOK_DIRS + BISHOP_DIRS
+                rays = RAY_SQUARES[sq]
+                for d in directions:
+                    for s in rays[d]:
+                        target = squares[s]
+                        if target != '.':
+                            if not own(target):
+                                yield start, divmod(s, 8), None
+                            break
+                        yield start, divmod(s, 8), None
+
+    def _pawn_moves(self, squares, sq, white):
+        """Yield pawn pushes, captures, en passant and promotions from one square"""
+        step = 8 if white else -8
+        home_row, last_row = (1, 7) if white else (6, 0)
+        enemy = str.islower if white else str.isupper
+        start = divmod(sq, 8)
+        ep = self.en_passant_target
+        ep_sq = ep[0] * 8 + ep[1] if ep else -1
+
+        targets = []
+        if squares[sq + step] == '.':
+            targets.append(sq + step)
+            if start[0] == home_row and squares[sq + 2 * step] == '.':
+                targets.append(sq + 2 * step)
+        for s in PAWN_TARGETS[WHITE if white else BLACK][sq]:
+            target = squares[s]
+            if (target != '.' and enemy(target)) or s == ep_sq:
+                targets.append(s)
+
+        for s in targets:
+            end = divmod(s, 8)
+            if end[0] == last_row:
+                for promotion in PROMOTION_PIECES:
+                    yield start, end, promotion
+            else:
+                yield start, end, None
+
+    def legal_moves(self):
+        """Yield (start, end, promotion) for every legal move of the current player"""
+        color = self.current_player
+        for move in list(self.pseudo_legal_moves()):
+            self.push_move(*move)
+            illegal = self.is_in_check(color)
+            self.undo_move()
+            if not illegal:
+                yield move
+
+    def is_legal_move(self, start, end):
+        """Check if a move is valid and doesn't leave the mover's own king in check"""
+        if not self.is_valid_move(start, end):
+            return False
+        color = self.current_player
+        self.push_move(start, end)
+        illegal = self.is_in_check(color)
+        self.undo_move()
+        return not illegal
+
+    def make_move(self, start_pos, end_pos, promotion=None):
         """Make a move from start_pos to end_pos if valid"""
         #Convert algebraic notation to board indices
         if isinstance(start_pos, str):
@@ -276,145 +442,460 @@ class ChessGame:
         else:
             end = end_pos
 
-        #Save the current state for undoing
-        moved_piece = self.board[start[0]][start[1]]
-        captured_piece = self.board[end[0]][end[1]]
-        self.move_history.append((start, end, moved_piece, captured_piece))
+        if promotion is not None and promotion.lower() not in PROMOTION_PIECES:
+            return False, "Invalid promotion piece"
+
+        if not self.is_legal_move(start, end):
+            return False, "Illegal move"
+
+        mover = self.current_player
+        self.push_move(start, end, promotion)
+
+        #Check for game ending conditions: no legal reply is mate if in check, else stalemate
+        if not self.has_legal_moves():
+            self.game_over = True
+            self.winner = mover if self.is_in_check() else None
+            return True, "Checkmate" if self.winner else "Stalemate"
+        if self.is_threefold_repetition():
+            self.game_over = True
+            self.winner = None
+            return True, "Draw by threefold repetition"
 
+        return True, "Move successful"
+
+    def push_move(self, start, end, promotion=None):
+        """Play a move given as index tuples without validating it.
+
+        Handles castling, en passant and promotion (to a queen unless another
+        piece letter is given). Everything undo_move needs is packed into one
+        int on a preallocated stack, so no tuples or lists are built per move.
+        """
         start_row, start_col = start
         end_row, end_col = end
+        start_sq = start_row * 8 + start_col
+        end_sq = end_row * 8 + end_col
+
+        moved_piece = self.piece_at(start_row, start_col)
+        captured_piece = self.piece_at(end_row, end_col)
+        piece_type = moved_piece.lower()
+        white = moved_piece.isupper()
+        moved = self.moved
+
+        #Save the irreversible state: squares, pieces, en passant square + 1, the moved mask and the halfmove clock
+        ep = self.en_passant_target
+        if self.ply == len(self._undo_stack):
+            self._grow_stacks()
+        self._undo_stack[self.ply] = (start_sq | end_sq << 6 | PIECE_CODE[moved_piece] << 12
+                                      | PIECE_CODE[captured_piece] << 16
+                                      | (ep[0] * 8 + ep[1] + 1 if ep else 0) << 20 | moved << 27
+                                      | min(self.halfmove_clock, 1023) << 33)
+        if piece_type == 'p' or captured_piece != '.':
+            self.halfmove_clock = 0
+        else:
+            self.halfmove_clock += 1
+
+        #Update the Zobrist key: side, castling and en passant are xored out here and back in below
+        key = self.zobrist_key ^ SIDE_KEY ^ CASTLING_KEYS[CASTLING_RIGHTS[moved]]
+        if ep:
+            ep_file = self.en_passant_file()
+            if ep_file is not None:
+                key ^= EP_FILE_KEYS[ep_file]
+        key ^= PIECE_KEYS[moved_piece][start_sq] ^ PIECE_KEYS[moved_piece][end_sq]
+        if captured_piece != '.':
+            key ^= PIECE_KEYS[captured_piece][end_sq]
 
-        #En passant
-        if moved_piece.lower() == 'p':
-            direction = 1 if moved_piece.isupper() else -1
-            if abs(end_row - start_row) == 2:
-                self.en_passant_target = (start_row + direction, start_col)
+        #make the move
+        self._set_square(end_row, end_col, moved_piece)
+        self._set_square(start_row, start_col, '.')
+
+        if piece_type == 'p':
+            #En passant capture: the captured pawn sits beside the start square
+            if start_col != end_col and captured_piece == '.':
+                self._set_square(start_row, end_col, '.')
+                key ^= PIECE_KEYS['p' if white else 'P'][start_row * 8 + end_col]
+            #Promotion
+            if end_row == 7 or end_row == 0:
+                new_piece = promotion or 'q'
+                new_piece = new_piece.upper() if white else new_piece.lower()
+                self._set_square(end_row, end_col, new_piece)
+                key ^= PIECE_KEYS[moved_piece][end_sq] ^ PIECE_KEYS[new_piece][end_sq]
+            #a double step leaves an en passant target behind
+            if end_sq - start_sq == 16 or start_sq - end_sq == 16:
+                self.en_passant_target = SQUARES[(start_sq + end_sq) >> 1]
             else:
                 self.en_passant_target = None
         else:
             self.en_passant_target = None
 
         #Update king position if king is moved
-        if moved_piece.lower() == 'k':
-            if moved_piece.isupper(): #white king
+        if piece_type == 'k':
+            if white: #white king
                 self.white_king_pos = end
-                self.white_rooks_moved = True
             else: #black king
                 self.black_king_pos = end
-                self.black_king_moved = True
-
-        #Update rook moved status for castling
-        if moved_piece.lower() == 'r':
-            if start[0] == 0: #white rooks
-                if start[1] == 0: #queenside
-                    self.white_rooks_moved[0] = True
-                elif start[1] == 7: #kingside
-                    self.white_rooks_moved[1] = True
-            elif start[0] == 7: #black rooks
-                if start[1] == 0: #queenside
-                    self.black_rooks_moved[0] = True
-                elif start[1] == 7: #kingside
-                    self.black_rooks_moved[1] = True
-
-        #make the move
-        self.board[end[0]][end[1]] = self.board[start[0]][start[1]]
-        self.board[start[0]][start[1]] = '.'
-
-        #TODO: Handle special moves like castling, en passant, and promotion
-
-        #Check for game ending conditions
-        #TODO: implement check, checkmate, and stalemate detection
+            #Castling also moves the rook
+            if end_col - start_col == 2 or start_col - end_col == 2:
+                rook_from, rook_to = (7, 5) if end_col == 6 else (0, 3)
+                rook = self.piece_at(end_row, rook_from)
+                self._set_square(end_row, rook_to, rook)
+                self._set_square(end_row, rook_from, '.')
+                key ^= PIECE_KEYS[rook][end_row * 8 + rook_from] ^ PIECE_KEYS[rook][end_row * 8 + rook_to]
+
+        #anything leaving or landing on a king or rook home square ends that castling right
+        moved |= TOUCH_MASK[start_sq] | TOUCH_MASK[end_sq]
+        self.moved = moved
 
         #Switch the current player
-        self.current_player = 'black' if self.current_player == 'white' else 'white'
+        self.current_player = 'black' if white else 'white'
+
+        key ^= CASTLING_KEYS[CASTLING_RIGHTS[moved]]
+        if self.en_passant_target:
+            ep_file = self.en_passant_file()
+            if ep_file is not None:
+                key ^= EP_FILE_KEYS[ep_file]
+        self.zobrist_key = key
+        self.ply += 1
+        self._key_stack[self.ply] = key
+        self.key_counts[key] = self.key_counts.get(key, 0) + 1
 
-        return True, "Move successful"
-    
     def undo_move(self):
         """Undo the last move"""
-        if not self.move_history:
+        if not self.ply:
             return False, "No moves to undo"
-        
-        #Get the last move
-        start, end, moved_piece, captured_piece = self.move_history.pop()
+
+        self.key_counts[self.zobrist_key] -= 1
+        self.ply -= 1
+        #the previous key is still on the key stack
+        self.zobrist_key = self._key_stack[self.ply]
+
+        #Unpack the undo record
+        record = self._undo_stack[self.ply]
+        start_sq = record & 63
+        end_sq = record >> 6 & 63
+        moved_piece = PIECE_CODES[record >> 12 & 15]
+        captured_piece = PIECE_CODES[record >> 16 & 15]
+        ep = record >> 20 & 127
+        self.en_passant_target = SQUARES[ep - 1] if ep else None
+        self.moved = record >> 27 & 63
+        self.halfmove_clock = record >> 33
+
+        start_row, start_col = start_sq >> 3, start_sq & 7
+        end_row, end_col = end_sq >> 3, end_sq & 7
 
         #Restore the board state
-        self.board[start[0]][start[1]] = moved_piece
-        self.board[end[0]][end[1]] = captured_piece
+        self._set_square(start_row, start_col, moved_piece)
+        self._set_square(end_row, end_col, captured_piece)
+
+        if moved_piece == 'P' or moved_piece == 'p':
+            if start_col != end_col and captured_piece == '.':
+                #put back the pawn taken en passant
+                self._set_square(start_row, end_col, 'p' if moved_piece == 'P' else 'P')
 
         #Update king position if king was moved
-        if moved_piece.lower() == 'k':
-            if moved_piece.isupper(): #white king
-                self.white_king_pos = start
-                #Reset king moved status if this was the first king move
-                if not self.move_history or all(m[2].lower() != 'k' or not m[2].isupper() for m in self.move_history):
-                    self.white_king_moved = False
+        elif moved_piece == 'K' or moved_piece == 'k':
+            if moved_piece == 'K': #white king
+                self.white_king_pos = SQUARES[start_sq]
             else: #black king
-                self.black_king_pos = start
-                #reset king moved status if this was the first king move
-                if not self.move_history or all(m[2].lower() != 'k' or m[2].isupper() for m in self.move_history):
-                    self.black_king_moved = False
+                self.black_king_pos = SQUARES[start_sq]
+            #put the castled rook back in its corner
+            if end_col - start_col == 2 or start_col - end_col == 2:
+                rook_from, rook_to = (7, 5) if end_col == 6 else (0, 3)
+                self._set_square(end_row, rook_from, self.piece_at(end_row, rook_to))
+                self._set_square(end_row, rook_to, '.')
 
         #switch the current player back
-        self.current_player = 'black' if self.current_player == 'white' else 'white'
+        self.current_player = 'white' if moved_piece.isupper() else 'black'
+        self.game_over = False
+        self.winner = None
 
         return True, "Move undone"
-    
-def play_chess():
-    """Main game function to play chess"""
+
+    @property
+    def move_history(self):
+        """Decoded (start, end, moved_piece, captured_piece) of every move played, oldest first"""
+        history = []
+        for record in self._undo_stack[:self.ply]:
+            history.append((SQUARES[record & 63], SQUARES[record >> 6 & 63],
+                            PIECE_CODES[record >> 12 & 15], PIECE_CODES[record >> 16 & 15]))
+        return history
+
+    @property
+    def key_history(self):
+        """Zobrist keys of every position so far, the current one last"""
+        return self._key_stack[:self.ply + 1].tolist()
+
+    def _grow_stacks(self):
+        """Double the preallocated undo and key stacks"""
+        extra = array('Q', bytes(8 * len(self._undo_stack)))
+        self._undo_stack.extend(extra)
+        self._key_stack.extend(extra)
+
+    #castling flags in their original form, backed by the moved mask
+    @property
+    def white_king_moved(self):
+        return bool(self.moved & WHITE_KING_MOVED)
+
+    @property
+    def black_king_moved(self):
+        return bool(self.moved & BLACK_KING_MOVED)
+
+    @property
+    def white_rooks_moved(self):
+        """[queenside, kingside]"""
+        return [bool(self.moved & WHITE_QROOK_MOVED), bool(self.moved & WHITE_KROOK_MOVED)]
+
+    @property
+    def black_rooks_moved(self):
+        """[queenside, kingside]"""
+        return [bool(self.moved & BLACK_QROOK_MOVED), bool(self.moved & BLACK_KROOK_MOVED)]
+
+    def load_fen(self, fen):
+        """Set up the position described by a FEN string"""
+        fields = fen.split()
+        placement = fields[0]
+        side = fields[1] if len(fields) > 1 else 'w'
+        castling = fields[2] if len(fields) > 2 else '-'
+        en_passant = fields[3] if len(fields) > 3 else '-'
+
+        ranks = placement.split('/')
+        if len(ranks) != 8:
+            raise ValueError(f"FEN needs 8 ranks: {fen!r}")
+        board = np.full((8,8),'.',dtype=str)
+        for i, rank in enumerate(ranks):
+            row, col = 7 - i, 0
+            for char in rank:
+                if char.isdigit():
+                    col += int(char)
+                elif char in 'PNBRQKpnbrqk' and col < 8:
+                    board[row, col] = char
+                    col += 1
+                else:
+                    raise ValueError(f"Bad FEN rank {rank!r}")
+            if col != 8:
+                raise ValueError(f"Bad FEN rank {rank!r}")
+
+        rights = sum(1 << i for i, char in enumerate('KQkq') if char in castling)
+        ep = None if en_passant == '-' else self.algebraic_to_index(en_passant)
+        halfmove = int(fields[4]) if len(fields) > 4 else 0
+        fullmove = int(fields[5]) if len(fields) > 5 else 1
+        self._setup(board, 'white' if side == 'w' else 'black', rights, ep, halfmove, fullmove)
+
+    def to_fen(self):
+        """Return the FEN string of the current position"""
+        squares = self.flat_board()
+        ranks = []
+        for row in range(7, -1, -1):
+            rank, empty = '', 0
+            for piece in squares[row * 8:row * 8 + 8]:
+                if piece == '.':
+                    empty += 1
+                    continue
+                if empty:
+                    rank += str(empty)
+                    empty = 0
+                rank += piece
+            ranks.append(rank + (str(empty) if empty else ''))
+
+        rights = self.castling_rights()
+        castling = ''.join(char for i, char in enumerate('KQkq') if rights >> i & 1) or '-'
+        ep = self.en_passant_target
+        en_passant = self.index_to_algebraic(*ep) if ep else '-'
+        return (f"{'/'.join(ranks)} {self.current_player[0]} {castling} {en_passant} "
+                f"{self.halfmove_clock} {self.fullmove_number}")
+
+    @property
+    def fullmove_number(self):
+        """FEN move number: starts at 1 and goes up after each black move"""
+        return (self.start_ply + self.ply) // 2 + 1
+
+    def to_bytes(self):
+        """Pack the position into 34 bytes: a nibble per square, then side/castling and en passant"""
+        codes = [PIECE_CODES.index(piece) for piece in self.flat_board()]
+        data = bytearray(codes[i] | codes[i + 1] << 4 for i in range(0, 64, 2))
+        data.append((self.current_player == 'black') | self.castling_rights() << 1)
+        ep = self.en_passant_target
+        data.append(ep[0] * 8 + ep[1] if ep else 0xFF)
+        return bytes(data)
+
+    def load_bytes(self, data):
+        """Set up the position packed by to_bytes"""
+        pieces = []
+        for byte in data[:32]:
+            pieces.append(PIECE_CODES[byte & 0xF])
+            pieces.append(PIECE_CODES[byte >> 4])
+        board = np.array(pieces, dtype=str).reshape(8, 8)
+        ep = None if data[33] == 0xFF else divmod(data[33], 8)
+        self._setup(board, 'black' if data[32] & 1 else 'white', data[32] >> 1, ep)
+
+    def _setup(self, board, player, rights, en_passant_target, halfmove_clock=0, fullmove_number=1):
+        """Install a position: board array, side to move, castling mask (as castling_rights), en passant and clocks"""
+        #check before touching any state, so a rejected position leaves the game as it was
+        white_king = np.argwhere(board == 'K')
+        black_king = np.argwhere(board == 'k')
+        if len(white_king) != 1 or len(black_king) != 1:
+            raise ValueError("A position needs exactly one king per side")
+
+        self.board = board
+        self.current_player = player
+        self.halfmove_clock = halfmove_clock
+        self.start_ply = 2 * (fullmove_number - 1) + (player == 'black')
+        self.game_over = False
+        self.winner = None
+        self.en_passant_target = en_passant_target
+
+        #castling rights map back onto the moved mask
+        self.moved = 0
+        for right, pieces in ((1, WHITE_KROOK_MOVED), (2, WHITE_QROOK_MOVED), (3, WHITE_KING_MOVED),
+                              (4, BLACK_KROOK_MOVED), (8, BLACK_QROOK_MOVED), (12, BLACK_KING_MOVED)):
+            if not rights & right:
+                self.moved |= pieces
+
+        self.white_king_pos = tuple(int(i) for i in white_king[0])
+        self.black_king_pos = tuple(int(i) for i in black_king[0])
+
+        self._reset_history()
+
+    def _reset_history(self):
+        """Start a fresh move history with the current position as its first key"""
+        #ply indexes both preallocated stacks: undo records of the moves played and
+        #the keys of every position so far, the current one at [ply]
+        self.ply = 0
+        self._undo_stack = array('Q', bytes(8 * 256))
+        self._key_stack = array('Q', bytes(8 * 257))
+        self.zobrist_key = self.compute_zobrist_key()
+        self._key_stack[0] = self.zobrist_key
+        #how often each key occurred, for repetition detection
+        self.key_counts = {self.zobrist_key: 1}
+
+    def castling_rights(self):
+        """Return the castling rights as a mask: 1 = K, 2 = Q, 4 = k, 8 = q"""
+        return CASTLING_RIGHTS[self.moved]
+
+    def en_passant_file(self):
+        """Return the en passant column if the current player has a pawn that can use it, else None"""
+        if self.en_passant_target is None:
+            return None
+        row, col = self.en_passant_target
+        if self.current_player == 'white':
+            pawn, pawn_row = 'P', row - 1
+        else:
+            pawn, pawn_row = 'p', row + 1
+        for c in (col - 1, col + 1):
+            if 0 <= c < 8 and self.piece_at(pawn_row, c) == pawn:
+                return col
+        return None
+
+    def compute_zobrist_key(self):
+        """Compute the 64-bit Zobrist key of the position from scratch"""
+        key = 0
+        for sq, piece in enumerate(self.flat_board()):
+            if piece != '.':
+                key ^= PIECE_KEYS[piece][sq]
+        if self.current_player == 'black':
+            key ^= SIDE_KEY
+        key ^= CASTLING_KEYS[self.castling_rights()]
+        ep_file = self.en_passant_file()
+        if ep_file is not None:
+            key ^= EP_FILE_KEYS[ep_file]
+        return key
+
+    def is_threefold_repetition(self):
+        """Check if the current position has occurred three times"""
+        return self.key_counts[self.zobrist_key] >= 3
+
+def play_chess(engine_color=None, think_time=3.0, book_path=None, tablebase_dir=None, headless=False):
+    """Main game function to play chess
+
+    Pass engine_color='white' or 'black' to let the computer play that side,
+    thinking for at most think_time seconds per move. With book_path it plays
+    from that opening book (see chess_book) while the position is in it, and
+    with tablebase_dir it plays the endgames in those tables (see chess_tablebase) perfectly.
+    headless=True plays in the terminal only.
+    """
     game = ChessGame()
+    engine = None
+    book = None
+    if engine_color:
+        from chess_engine import Engine, move_to_string
+        tablebases = None
+        if tablebase_dir:
+            from chess_tablebase import Tablebases
+            tablebases = Tablebases(tablebase_dir)
+        engine = Engine(tablebases=tablebases)
+        if book_path:
+            from chess_book import OpeningBook
+            book = OpeningBook(book_path)
 
     print("Welcome to Python Chess!")
-    print("Enter moves in algebraic notation, e.g., 'e2 e4'")
+    print("Enter moves in algebraic notation, e.g., 'e2 e4' (add q, r, b or n to promote)")
     print("Type 'quit' to exit, 'undo' to undo the last move")
 
-    try:
-        plt.ion() #Turn on interactive mode with matplotlib
-    except:
-        pass
-
     #display initial board
-    game.display_board()
+    game.display_board(headless)
 
     while not game.game_over:
+        if game.current_player == engine_color:
+            move = book.random_move(game) if book else None
+            if move:
+                print(f"Computer plays {move_to_string(game, move)} (book)")
+            else:
+                move, score = engine.search(game, time_limit=think_time, info=None)
+                print(f"Computer plays {move_to_string(game, move)} (score {score})")
+            success, message = game.make_move(*move)
+            game.display_board(headless)
+            continue
+
         #get player input
         move_input = input(f"{game.current_player.capitalize()}'s move:")
 
         #process commands
         if move_input.lower() == 'quit':
             break
-        elif move_input.lower == 'undo':
+        elif move_input.lower() == 'undo':
             success, message = game.undo_move()
+            if engine and success:
+                #take back the computer's reply too so it's the player's turn again
+                game.undo_move()
             print(message)
             #display updated board after undoing
-            game.display_board()
+            game.display_board(headless)
             continue
 
         #parse the move input
         try:
-            start_pos, end_pos = move_input.split()
-            success, message = game.make_move(start_pos, end_pos)
+            start_pos, end_pos, *promotion = move_input.split()
+            if len(promotion) > 1:
+                raise ValueError
+            success, message = game.make_move(start_pos, end_pos, *promotion)
             if not success:
                 print(message)
             else:
                 #clear screen in terminal
                 print("\033[H\033[J]]", end="")
                 #display the updated board after a successful move
-                game.display_board()
+                game.display_board(headless)
         except ValueError:
             print("Invalid input format. Use 'start_pos end_pos', e.g., 'e2 e4'")
 
     #Game over
-    if game.game_over:
-        print(f"Game over! {game.winner} wins!")
+    if game.game_over and game.winner:
+        print(f"Game over! {game.winner.capitalize()} wins!")
+    elif game.game_over:
+        print("Game over! It's a draw.")
     else:
         print("Thanks for playing!")
 
-    try:
-        plt.ioff() #Turn off interactive mode
-    except:
-        pass
+    if book:
+        book.close()
 
 #Run the game when the script is executed
 if __name__ == "__main__":
-    play_chess()
\ No newline at end of file
+    import argparse
+    parser = argparse.ArgumentParser(description="Play chess in the terminal and a matplotlib window")
+    parser.add_argument('--engine', choices=['white', 'black'], help="let the computer play this side")
+    parser.add_argument('--time', type=float, default=3.0, help="computer thinking time per move in seconds")
+    parser.add_argument('--book', help="opening book file for the computer (see chess_book.py)")
+    parser.add_argument('--tablebases', help="directory of endgame tables (see chess_tablebase.py)")
+    parser.add_argument('--headless', action='store_true', help="terminal board only, no matplotlib window")
+    args = parser.parse_args()
+    play_chess(args.engine, args.time, args.book, args.tablebases, args.headless)
\ No newline at end of file
@@ -0,0 +1,97 @@
+"""Precomputed attack tables shared by the ChessGame backends.
+
+Squares are numbered row*8 + col (a1 = 0, h8 = 63). Each table exists twice:
+as 64-bit masks for the bitboard backend and as square lists for the array
+backend, which walks them instead of stepping rows and columns by hand.
+"""
+
+WHITE, BLACK = 0, 1
+
+#ray directions as (row_step, col_step); the first four increase the square number
+DIRECTIONS = [(1,0),(0,1),(1,1),(1,-1),(-1,0),(0,-1),(-1,-1),(-1,1)]
+ROOK_DIRS = (0, 1, 4, 5)
+BISHOP_DIRS = (2, 3, 6, 7)
+
+KNIGHT_OFFSETS = [(2,1),(1,2),(-1,2),(-2,1),(-2,-1),(-1,-2),(1,-2),(2,-1)]
+KING_OFFSETS = [(1,0),(1,1),(0,1),(-1,1),(-1,0),(-1,-1),(0,-1),(1,-1)]
+
+
+def _targets(sq, offsets):
+    """Squares reached from sq by each (row, col) offset that stays on the board"""
+    row, col = divmod(sq, 8)
+    return [(row + r) * 8 + col + c for r, c in offsets if 0 <= row + r < 8 and 0 <= col + c < 8]
+
+
+def _ray(sq, direction):
+    """Squares from sq (exclusive) to the edge of the board in one direction"""
+    row_step, col_step = direction
+    row, col = divmod(sq, 8)
+    squares = []
+    row, col = row + row_step, col + col_step
+    while 0 <= row < 8 and 0 <= col < 8:
+        squares.append(row * 8 + col)
+        row, col = row + row_step, col + col_step
+    return squares
+
+
+def _mask(squares):
+    mask = 0
+    for sq in squares:
+        mask |= 1 << sq
+    return mask
+
+
+KNIGHT_TARGETS = [_targets(sq, KNIGHT_OFFSETS) for sq in range(64)]
+KING_TARGETS = [_targets(sq, KING_OFFSETS) for sq in range(64)]
+#PAWN_TARGETS[color][sq]: the squares a pawn of that color on sq captures on
+PAWN_TARGETS = [[_targets(sq, [(1,-1),(1,1)]) for sq in range(64)],
+                [_targets(sq, [(-1,-1),(-1,1)]) for sq in range(64)]]
+#RAY_SQUARES[sq][direction]: squares along a ray, nearest first
+RAY_SQUARES = [[_ray(sq, d) for d in DIRECTIONS] for sq in range(64)]
+
+KNIGHT_ATTACKS = [_mask(t) for t in KNIGHT_TARGETS]
+KING_ATTACKS = [_mask(t) for t in KING_TARGETS]
+PAWN_ATTACKS = [[_mask(t) for t in PAWN_TARGETS[color]] for color in (WHITE, BLACK)]
+#RAYS[direction][sq]: ray mask on an empty board
+RAYS = [[_mask(RAY_SQUARES[sq][d]) for sq in range(64)] for d in range(8)]
+ROOK_MASKS = [RAYS[0][sq] | RAYS[1][sq] | RAYS[4][sq] | RAYS[5][sq] for sq in range(64)]
+BISHOP_MASKS = [RAYS[2][sq] | RAYS[3][sq] | RAYS[6][sq] | RAYS[7][sq] for sq in range(64)]
+
+#BETWEEN_SQUARES[a][b] / BETWEEN[a][b]: squares strictly between two squares on a line, else empty
+BETWEEN_SQUARES = [[() for _ in range(64)] for _ in range(64)]
+for _sq in range(64):
+    for _d in range(8):
+        _line = RAY_SQUARES[_sq][_d]
+        for _i, _end in enumerate(_line):
+            BETWEEN_SQUARES[_sq][_end] = tuple(_line[:_i])
+BETWEEN = [[_mask(squares) for squares in row] for row in BETWEEN_SQUARES]
+del _sq, _d, _line, _i, _end
+
+
+def slider_attacks(sq, occupied, directions):
+    """Attack mask of a slider on sq along the given directions, stopping at blockers"""
+    attacks = 0
+    for d in directions:
+        ray = RAYS[d][sq]
+        blockers = ray & occupied
+        if blockers:
+            #the nearest blocker is the lowest bit on increasing rays, the highest otherwise
+            if d < 4:
+                first = (blockers & -blockers).bit_length() - 1
+            else:
+                first = blockers.bit_length() - 1
+            ray ^= RAYS[d][first]
+        attacks |= ray
+    return attacks
+
+
+def rook_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, ROOK_DIRS)
+
+
+def bishop_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, BISHOP_DIRS)
+
+
+def queen_attacks(sq, occupied):
+    return slider_attacks(sq, occupied, range(8))
@@ -0,0 +1,86 @@
+"""Throughput benchmark for the ChessGame board backends.
+
+Run with: python chess_benchmark.py [seconds per measurement]
+"""
+import sys, time
+
+from chess import ChessGame
+from chess_bitboard import BitboardChessGame
+from chess_engine import Engine
+
+BACKENDS = {'array': ChessGame, 'bitboard': BitboardChessGame}
+
+#a short opening so the benchmark also sees open lines and captures
+OPENING = [('e2', 'e4'), ('e7', 'e5'), ('g1', 'f3'), ('b8', 'c6'),
+           ('f1', 'c4'), ('f8', 'c5'), ('d2', 'd3'), ('d7', 'd6')]
+
+ALL_SQUARES = [(row, col) for row in range(8) for col in range(8)]
+
+
+def setup(backend):
+    """Return a game of the given backend with the opening played"""
+    game = BACKENDS[backend]()
+    for start, end in OPENING:
+        game.make_move(start, end)
+    return game
+
+
+def validations_per_second(game, seconds):
+    """Call is_valid_move on every (start, end) pair until time runs out"""
+    calls = 0
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < seconds:
+        for start in ALL_SQUARES:
+            for end in ALL_SQUARES:
+                game.is_valid_move(start, end)
+        calls += 64 * 64
+    return calls / (time.perf_counter() - begin)
+
+
+def moves_per_second(game, seconds):
+    """Push and undo every legal move of the position until time runs out"""
+    moves = list(game.legal_moves())
+    count = 0
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < seconds:
+        for move in moves:
+            game.push_move(*move)
+            game.undo_move()
+        count += len(moves)
+    return count / (time.perf_counter() - begin)
+
+
+def attack_tests_per_second(game, seconds):
+    """Ask is_square_attacked about every square for both colors until time runs out"""
+    count = 0
+    begin = time.perf_counter()
+    while time.perf_counter() - begin < seconds:
+        for square in ALL_SQUARES:
+            game.is_square_attacked(square, 'white')
+            game.is_square_attacked(square, 'black')
+        count += 128
+    return count / (time.perf_counter() - begin)
+
+
+def search_nodes_per_second(game, seconds):
+    """Let the engine search the position for the given time, return its nodes/sec"""
+    engine = Engine()
+    begin = time.perf_counter()
+    engine.search(game, time_limit=seconds, info=None)
+    return engine.nodes / (time.perf_counter() - begin)
+
+
+def run(seconds=1.0):
+    """Print a table of validations/sec, moves/sec, attack tests/sec and search nodes/sec per backend"""
+    print(f"{'backend':<10}{'validations/s':>16}{'push+undo/s':>16}{'attack tests/s':>16}{'search nodes/s':>16}")
+    for backend in BACKENDS:
+        game = setup(backend)
+        validations = validations_per_second(game, seconds)
+        moves = moves_per_second(game, seconds)
+        attacks = attack_tests_per_second(game, seconds)
+        nodes = search_nodes_per_second(game, seconds)
+        print(f"{backend:<10}{validations:>16,.0f}{moves:>16,.0f}{attacks:>16,.0f}{nodes:>16,.0f}")
+
+
+if __name__ == "__main__":
+    run(float(sys.argv[1]) if len(sys.argv) > 1 else 1.0)
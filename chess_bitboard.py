@@ -0,0 +1,212 @@
+import numpy as np
+
+from chess import ChessGame, PROMOTION_PIECES
+from chess_attacks import (WHITE, BLACK, KNIGHT_ATTACKS, KING_ATTACKS, PAWN_ATTACKS, ROOK_MASKS,
+                           BISHOP_MASKS, BETWEEN, rook_attacks, bishop_attacks, queen_attacks)
+
+PIECES = 'PNBRQKpnbrqk'
+FULL = (1 << 64) - 1
+RANK_2 = 0xFF << 8
+RANK_7 = 0xFF << 48
+PROMOTION_RANKS = 0xFF | 0xFF << 56
+
+
+class BitboardChessGame(ChessGame):
+    """ChessGame backend that stores the position as 64-bit bitboards.
+
+    Square (row, col) is bit row*8 + col, so a1 is bit 0 and h8 is bit 63.
+    There is one bitboard per piece type and color plus an occupancy mask per
+    color and one for the whole board. A 64-entry mailbox mirrors the
+    bitboards so piece_at() is a single list lookup.
+    """
+
+    @property
+    def board(self):
+        """8x8 array snapshot of the position (read only, for display)"""
+        return np.array(self.squares, dtype=str).reshape(8, 8)
+
+    @board.setter
+    def board(self, board):
+        self.bitboards = dict.fromkeys(PIECES, 0)
+        self.occupancy = [0, 0] #[white, black]
+        self.occupied = 0
+        self.squares = ['.'] * 64
+        for row in range(8):
+            for col in range(8):
+                piece = str(board[row, col])
+                if piece != '.':
+                    self._set_square(row, col, piece)
+
+    def piece_at(self, row, col):
+        """Return the piece on a square, '.' if it is empty"""
+        return self.squares[row * 8 + col]
+
+    def _set_square(self, row, col, piece):
+        """Put a piece (or '.') on a square, keeping every mask in sync"""
+        sq = row * 8 + col
+        bit = 1 << sq
+        old = self.squares[sq]
+        if old != '.':
+            self.bitboards[old] ^= bit
+            self.occupancy[WHITE if old.isupper() else BLACK] ^= bit
+            self.occupied ^= bit
+        if piece != '.':
+            self.bitboards[piece] |= bit
+            self.occupancy[WHITE if piece.isupper() else BLACK] |= bit
+            self.occupied |= bit
+        self.squares[sq] = piece
+
+    def flat_board(self):
+        """Return the mailbox, a flat list of 64 pieces with a1 first"""
+        return self.squares
+
+    def is_valid_move(self, start, end):
+        """Check if a move from start to end is valid"""
+        start_row, start_col = start
+        end_row, end_col = end
+
+        #basic checks
+        if not (0 <= start_row < 8 and 0 <= start_col < 8 and 0 <= end_row < 8 and 0 <= end_col < 8):
+            return False
+
+        start_bit = 1 << (start_row * 8 + start_col)
+        end_bit = 1 << (end_row * 8 + end_col)
+
+        #the piece must belong to the current player, the target must not
+        own = self.occupancy[WHITE if self.current_player == 'white' else BLACK]
+        if not own & start_bit or own & end_bit:
+            return False
+
+        piece_type = self.squares[start_row * 8 + start_col].lower()
+        if piece_type == 'p': #Pawn
+            return self.is_valid_pawn_move(start, end)
+        elif piece_type == 'r': #rook
+            return self.is_valid_rook_move(start, end)
+        elif piece_type == 'n': #knight
+            return self.is_valid_knight_move(start, end)
+        elif piece_type == 'b': #bishop
+            return self.is_valid_bishop_move(start, end)
+        elif piece_type == 'q': #queen
+            return self.is_valid_queen_move(start, end)
+        elif piece_type == 'k': #king
+            return self.is_valid_king_move(start, end)
+
+        return False
+
+    def is_valid_pawn_move(self, start, end):
+        """Check if a pawn move is valid"""
+        start_row, start_col = start
+        end_row, end_col = end
+        start_bit = 1 << (start_row * 8 + start_col)
+        end_bit = 1 << (end_row * 8 + end_col)
+
+        #direction depends on color
+        white = bool(self.occupancy[WHITE] & start_bit)
+        direction = 1 if white else -1
+
+        #normal move (one square forward)
+        if start_col == end_col and not self.occupied & end_bit:
+            if end_row == start_row + direction:
+                return True
+
+            #first move can be two squares, over an empty square
+            if (white and start_row == 1 and end_row == 3) or (not white and start_row == 6 and end_row == 4):
+                return not self.occupied & (1 << ((start_row + direction) * 8 + start_col))
+
+        #capture move (diagonal)
+        if abs(start_col - end_col) == 1 and end_row == start_row + direction:
+            if self.occupancy[BLACK if white else WHITE] & end_bit:
+                return True
+            return not self.occupied & end_bit and (end_row, end_col) == self.en_passant_target
+
+        return False
+
+    def is_path_clear(self, start, end):
+        """Check if the path between start and end is clear of pieces"""
+        return not BETWEEN[start[0] * 8 + start[1]][end[0] * 8 + end[1]] & self.occupied
+
+    def is_square_attacked(self, square, by_color):
+        """Check if a (row, col) square is attacked by 'white' or 'black' pieces"""
+        sq = square[0] * 8 + square[1]
+        bb = self.bitboards
+        if by_color == 'white':
+            pawn, knight, bishop, rook, queen, king = 'PNBRQK'
+            defender = BLACK
+        else:
+            pawn, knight, bishop, rook, queen, king = 'pnbrqk'
+            defender = WHITE
+
+        if KNIGHT_ATTACKS[sq] & bb[knight] or KING_ATTACKS[sq] & bb[king]:
+            return True
+        #a pawn of the defending color on sq would capture exactly where attacking pawns stand
+        if PAWN_ATTACKS[defender][sq] & bb[pawn]:
+            return True
+        rooks = bb[rook] | bb[queen]
+        if rooks & ROOK_MASKS[sq] and rook_attacks(sq, self.occupied) & rooks:
+            return True
+        bishops = bb[bishop] | bb[queen]
+        return bool(bishops & BISHOP_MASKS[sq] and bishop_attacks(sq, self.occupied) & bishops)
+
+    def pseudo_legal_moves(self):
+        """Yield (start, end, promotion) for every move the pieces allow, ignoring checks"""
+        white = self.current_player == 'white'
+        us, them = (WHITE, BLACK) if white else (BLACK, WHITE)
+        pawn, knight, bishop, rook, queen, king = 'PNBRQK' if white else 'pnbrqk'
+        bb = self.bitboards
+        occupied = self.occupied
+        not_own = ~self.occupancy[us]
+
+        yield from self._pawn_moves_bb(bb[pawn], white, self.occupancy[them])
+
+        for piece, attacks in ((knight, None), (bishop, bishop_attacks), (rook, rook_attacks),
+                               (queen, queen_attacks), (king, None)):
+            pieces = bb[piece]
+            while pieces:
+                low = pieces & -pieces
+                pieces ^= low
+                sq = low.bit_length() - 1
+                if attacks is not None:
+                    targets = attacks(sq, occupied) & not_own
+                elif piece == knight:
+                    targets = KNIGHT_ATTACKS[sq] & not_own
+                else:
+                    targets = KING_ATTACKS[sq] & not_own
+                start = divmod(sq, 8)
+                while targets:
+                    low = targets & -targets
+                    targets ^= low
+                    yield start, divmod(low.bit_length() - 1, 8), None
+
+        if bb[king] & (1 << (4 if white else 60)):
+            row = 0 if white else 7
+            for kingside in (True, False):
+                if self.can_castle(white, kingside):
+                    yield (row, 4), (row, 6 if kingside else 2), None
+
+    def _pawn_moves_bb(self, pawns, white, enemies):
+        """Yield pawn pushes, captures, en passant and promotions for a whole pawn bitboard"""
+        empty = ~self.occupied & FULL
+        ep = self.en_passant_target
+        if ep:
+            enemies |= 1 << (ep[0] * 8 + ep[1])
+        home = RANK_2 if white else RANK_7
+        color = WHITE if white else BLACK
+
+        while pawns:
+            low = pawns & -pawns
+            pawns ^= low
+            sq = low.bit_length() - 1
+            one = (low << 8 if white else low >> 8) & empty
+            targets = one | PAWN_ATTACKS[color][sq] & enemies
+            if one and low & home:
+                targets |= (one << 8 if white else one >> 8) & empty
+            start = divmod(sq, 8)
+            while targets:
+                low = targets & -targets
+                targets ^= low
+                end = divmod(low.bit_length() - 1, 8)
+                if low & PROMOTION_RANKS:
+                    for promotion in PROMOTION_PIECES:
+                        yield start, end, promotion
+                else:
+                    yield start, end, None
@@ -0,0 +1,226 @@
+"""Binary opening book for ChessGame positions.
+
+A book file is an 8-byte magic followed by fixed-width records of
+(Zobrist key u64, packed move u16, weight u16), big-endian and sorted by key
+then move. OpeningBook reads it through mmap and finds a position's moves by
+binary search, so opening a book of millions of entries costs nothing and
+only the pages a lookup touches are read.
+
+    python chess_book.py build book.bin games.pgn [more.pgn ...] [--plies 20]
+    python chess_book.py probe book.bin [FEN]
+    python chess_book.py bench book.bin
+"""
+import argparse, heapq, mmap, os, random, struct, tempfile, time
+
+from chess import pack_move, unpack_move
+from chess_bitboard import BitboardChessGame
+from chess_pgn import START_FEN, move_to_san, parse_san, read_games
+
+MAGIC = b'CGBOOK1\0'
+RECORD = struct.Struct('>QHH')
+KEY = struct.Struct('>Q')
+#points for the side that played the move
+RESULT_WEIGHTS = {'1-0': (2, 0), '0-1': (0, 2), '1/2-1/2': (1, 1)}
+
+
+class OpeningBook:
+    """Read-only view of a book file. Use as a context manager or call close()."""
+
+    def __init__(self, path):
+        self._file = open(path, 'rb')
+        self._map = mmap.mmap(self._file.fileno(), 0, access=mmap.ACCESS_READ)
+        if self._map[:len(MAGIC)] != MAGIC:
+            self.close()
+            raise ValueError(f"{path} is not an opening book")
+        self.count = (len(self._map) - len(MAGIC)) // RECORD.size
+
+    def __len__(self):
+        return self.count
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self._map.close()
+        self._file.close()
+
+    def _key_at(self, i):
+        return KEY.unpack_from(self._map, len(MAGIC) + i * RECORD.size)[0]
+
+    def entries(self, key):
+        """Return [(packed move, weight)] stored for a Zobrist key"""
+        lo, hi = 0, self.count
+        while lo < hi:
+            mid = (lo + hi) >> 1
+            if self._key_at(mid) < key:
+                lo = mid + 1
+            else:
+                hi = mid
+        found = []
+        offset = len(MAGIC) + lo * RECORD.size
+        while lo < self.count:
+            record_key, move, weight = RECORD.unpack_from(self._map, offset)
+            if record_key != key:
+                break
+            found.append((move, weight))
+            lo += 1
+            offset += RECORD.size
+        return found
+
+    def moves(self, game):
+        """Return [(move, weight)] of the book moves legal in the game's position, best first"""
+        found = self.entries(game.zobrist_key)
+        if not found:
+            return []
+        #a key collision could name a move that doesn't exist here
+        legal = {pack_move(move) for move in game.legal_moves()}
+        moves = [(unpack_move(code), weight) for code, weight in found if code in legal and weight]
+        moves.sort(key=lambda entry: -entry[1])
+        return moves
+
+    def best_move(self, game):
+        """Return the most played book move, or None out of book"""
+        moves = self.moves(game)
+        return moves[0][0] if moves else None
+
+    def random_move(self, game, rng=random):
+        """Return a book move picked with probability proportional to its weight, or None"""
+        moves = self.moves(game)
+        if not moves:
+            return None
+        return rng.choices([move for move, _ in moves], weights=[weight for _, weight in moves])[0]
+
+
+def _write_run(counts, directory):
+    """Write counted (key, move) pairs to a sorted temporary run file, return its path"""
+    fd, path = tempfile.mkstemp(suffix='.run', dir=directory)
+    with os.fdopen(fd, 'wb') as out:
+        for (key, move), weight in sorted(counts.items()):
+            out.write(RECORD.pack(key, move, min(weight, 0xFFFF)))
+    return path
+
+
+def _read_run(path):
+    with open(path, 'rb') as run:
+        while True:
+            data = run.read(RECORD.size * 4096)
+            if not data:
+                return
+            yield from RECORD.iter_unpack(data)
+
+
+def build_book(pgn_paths, book_path, max_plies=20, run_size=1 << 20):
+    """Build a book from the first max_plies moves of every game in the PGN files.
+
+    A move's weight is 2 for each game its side won and 1 for each draw.
+    Counts are flushed to sorted run files every run_size distinct entries
+    and merged at the end, so memory stays bounded for any amount of input.
+    Returns (games, entries written).
+    """
+    game = BitboardChessGame()
+    counts = {}
+    runs = []
+    games = 0
+    directory = os.path.dirname(os.path.abspath(book_path))
+    try:
+        for path in pgn_paths:
+            with open(path, encoding='utf-8', errors='replace') as stream:
+                for pgn in read_games(stream):
+                    points = RESULT_WEIGHTS.get(pgn.headers.get('Result'))
+                    if not points:
+                        continue
+                    games += 1
+                    try:
+                        game.load_fen(pgn.headers.get('FEN', START_FEN))
+                        for ply, san in enumerate(pgn.sans()):
+                            if ply >= max_plies:
+                                break
+                            #the entry belongs to the position the move is played from
+                            key = game.zobrist_key
+                            move = parse_san(game, san)
+                            game.push_move(*move)
+                            entry = (key, pack_move(move))
+                            weight = points[(game.start_ply + ply) & 1]
+                            if weight:
+                                counts[entry] = counts.get(entry, 0) + weight
+                    except ValueError:
+                        pass #keep the moves read before a bad one
+                    if len(counts) >= run_size:
+                        runs.append(_write_run(counts, directory))
+                        counts = {}
+        runs.append(_write_run(counts, directory))
+
+        #merge the runs, adding up the weights of entries found in several of them
+        written = 0
+        with open(book_path, 'wb') as out:
+            out.write(MAGIC)
+            last, total = None, 0
+            for key, move, weight in heapq.merge(*(_read_run(run) for run in runs)):
+                if (key, move) != last:
+                    if last:
+                        out.write(RECORD.pack(*last, min(total, 0xFFFF)))
+                        written += 1
+                    last, total = (key, move), 0
+                total += weight
+            if last:
+                out.write(RECORD.pack(*last, min(total, 0xFFFF)))
+                written += 1
+    finally:
+        for run in runs:
+            os.remove(run)
+    return games, written
+
+
+def bench(book_path, lookups=100000, seed=0):
+    """Print the time to open a book and lookups per second for keys in and out of it"""
+    begin = time.perf_counter()
+    book = OpeningBook(book_path)
+    opened = time.perf_counter() - begin
+    with book:
+        rng = random.Random(seed)
+        #every other key is one from the book, the rest are (almost surely) misses
+        keys = [rng.getrandbits(64) for _ in range(lookups)]
+        if len(book):
+            keys[::2] = [book._key_at(rng.randrange(len(book))) for _ in keys[::2]]
+        begin = time.perf_counter()
+        for key in keys:
+            book.entries(key)
+        elapsed = time.perf_counter() - begin
+    print(f"{len(book):,} entries, opened in {opened * 1000:.2f} ms, "
+          f"{lookups / elapsed:,.0f} lookups/s ({elapsed / lookups * 1e6:.1f} us each)")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Build, probe or benchmark an opening book")
+    commands = parser.add_subparsers(dest='command', required=True)
+    build = commands.add_parser('build', help="build a book from PGN files")
+    build.add_argument('book')
+    build.add_argument('pgn', nargs='+')
+    build.add_argument('--plies', type=int, default=20, help="moves per game to take into the book")
+    probe = commands.add_parser('probe', help="list the book moves of a position")
+    probe.add_argument('book')
+    probe.add_argument('fen', nargs='*', help="position, the start position if left out")
+    timing = commands.add_parser('bench', help="time opening the book and looking up keys")
+    timing.add_argument('book')
+    args = parser.parse_args()
+
+    if args.command == 'build':
+        begin = time.perf_counter()
+        games, written = build_book(args.pgn, args.book, args.plies)
+        print(f"{games} games, {written} entries written in {time.perf_counter() - begin:.1f}s")
+    elif args.command == 'probe':
+        game = BitboardChessGame()
+        if args.fen:
+            game.load_fen(' '.join(args.fen))
+        with OpeningBook(args.book) as book:
+            moves = book.moves(game)
+            total = sum(weight for _, weight in moves)
+            for move, weight in moves:
+                print(f"{move_to_san(game, move):<8}{weight:>8}{100 * weight / total:>7.1f}%")
+            if not moves:
+                print("out of book")
+    else:
+        bench(args.book)
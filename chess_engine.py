@@ -0,0 +1,395 @@
+"""Alpha-beta search engine for ChessGame positions.
+
+Negamax with iterative deepening, a fixed-size transposition table, move
+ordering (TT move, MVV-LVA captures, killers, history) and a quiescence
+search, all under a hard time limit per move.
+"""
+import time
+
+PIECE_VALUES = {'p': 100, 'n': 320, 'b': 330, 'r': 500, 'q': 900, 'k': 0}
+MATE = 100000
+INFINITY = 10 * MATE
+
+EXACT, LOWER, UPPER = 0, 1, 2
+
+
+def _pst(rows):
+    """Turn a table written rank 8 first (as seen from white) into a flat a1-first list"""
+    return [value for row in reversed(rows) for value in row]
+
+
+#piece-square tables from white's point of view, black squares are mirrored with sq ^ 56
+PIECE_SQUARE_TABLES = {
+    'p': _pst([[0, 0, 0, 0, 0, 0, 0, 0],
+               [50, 50, 50, 50, 50, 50, 50, 50],
+               [10, 10, 20, 30, 30, 20, 10, 10],
+               [5, 5, 10, 25, 25, 10, 5, 5],
+               [0, 0, 0, 20, 20, 0, 0, 0],
+               [5, -5, -10, 0, 0, -10, -5, 5],
+               [5, 10, 10, -20, -20, 10, 10, 5],
+               [0, 0, 0, 0, 0, 0, 0, 0]]),
+    'n': _pst([[-50, -40, -30, -30, -30, -30, -40, -50],
+               [-40, -20, 0, 0, 0, 0, -20, -40],
+               [-30, 0, 10, 15, 15, 10, 0, -30],
+               [-30, 5, 15, 20, 20, 15, 5, -30],
+               [-30, 0, 15, 20, 20, 15, 0, -30],
+               [-30, 5, 10, 15, 15, 10, 5, -30],
+               [-40, -20, 0, 5, 5, 0, -20, -40],
+               [-50, -40, -30, -30, -30, -30, -40, -50]]),
+    'b': _pst([[-20, -10, -10, -10, -10, -10, -10, -20],
+               [-10, 0, 0, 0, 0, 0, 0, -10],
+               [-10, 0, 5, 10, 10, 5, 0, -10],
+               [-10, 5, 5, 10, 10, 5, 5, -10],
+               [-10, 0, 10, 10, 10, 10, 0, -10],
+               [-10, 10, 10, 10, 10, 10, 10, -10],
+               [-10, 5, 0, 0, 0, 0, 5, -10],
+               [-20, -10, -10, -10, -10, -10, -10, -20]]),
+    'r': _pst([[0, 0, 0, 0, 0, 0, 0, 0],
+               [5, 10, 10, 10, 10, 10, 10, 5],
+               [-5, 0, 0, 0, 0, 0, 0, -5],
+               [-5, 0, 0, 0, 0, 0, 0, -5],
+               [-5, 0, 0, 0, 0, 0, 0, -5],
+               [-5, 0, 0, 0, 0, 0, 0, -5],
+               [-5, 0, 0, 0, 0, 0, 0, -5],
+               [0, 0, 0, 5, 5, 0, 0, 0]]),
+    'q': _pst([[-20, -10, -10, -5, -5, -10, -10, -20],
+               [-10, 0, 0, 0, 0, 0, 0, -10],
+               [-10, 0, 5, 5, 5, 5, 0, -10],
+               [-5, 0, 5, 5, 5, 5, 0, -5],
+               [0, 0, 5, 5, 5, 5, 0, -5],
+               [-10, 5, 5, 5, 5, 5, 0, -10],
+               [-10, 0, 5, 0, 0, 0, 0, -10],
+               [-20, -10, -10, -5, -5, -10, -10, -20]]),
+    'k': _pst([[-30, -40, -40, -50, -50, -40, -40, -30],
+               [-30, -40, -40, -50, -50, -40, -40, -30],
+               [-30, -40, -40, -50, -50, -40, -40, -30],
+               [-30, -40, -40, -50, -50, -40, -40, -30],
+               [-20, -30, -30, -40, -40, -30, -30, -20],
+               [-10, -20, -20, -20, -20, -20, -20, -10],
+               [20, 20, 0, 0, 0, 0, 20, 20],
+               [20, 30, 10, 0, 0, 10, 30, 20]]),
+}
+
+#value plus square bonus per (piece, square), black pieces already negated
+_SQUARE_SCORES = {}
+for _piece, _table in PIECE_SQUARE_TABLES.items():
+    _SQUARE_SCORES[_piece.upper()] = [PIECE_VALUES[_piece] + _table[sq] for sq in range(64)]
+    _SQUARE_SCORES[_piece] = [-PIECE_VALUES[_piece] - _table[sq ^ 56] for sq in range(64)]
+del _piece, _table
+
+
+def evaluate(game):
+    """Static evaluation in centipawns from the side to move's point of view"""
+    score = 0
+    for sq, piece in enumerate(game.flat_board()):
+        if piece != '.':
+            score += _SQUARE_SCORES[piece][sq]
+    return score if game.current_player == 'white' else -score
+
+
+def move_to_string(game, move):
+    """Coordinate notation for a (start, end, promotion) move, e.g. e7e8q"""
+    start, end, promotion = move
+    return game.index_to_algebraic(*start) + game.index_to_algebraic(*end) + (promotion or '')
+
+
+def print_info(info):
+    """Default one-line report of a finished iteration"""
+    print(f"depth {info['depth']} score {info['score']} nodes {info['nodes']} "
+          f"nps {info['nps']} time {info['time']:.2f}s pv {' '.join(info['pv'])}")
+
+
+class SearchTimeout(Exception):
+    """Raised inside the search when the hard time limit has passed"""
+
+
+class TranspositionTable:
+    """Fixed-size table of search results indexed by the low bits of the Zobrist key.
+
+    Replacement policy: a slot is overwritten when it is empty, holds the same
+    position, comes from an older search, or holds a shallower result than the
+    new one. Deep results of the current search are kept.
+    """
+
+    def __init__(self, size=1 << 18):
+        size = 1 << max(size - 1, 1).bit_length() #round up to a power of two
+        self.mask = size - 1
+        self.keys = [0] * size
+        self.entries = [None] * size #(depth, score, flag, move, age)
+        self.age = 0
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self):
+        return self.mask + 1
+
+    def new_search(self):
+        """Age the stored entries so the next search may replace them"""
+        self.age += 1
+
+    def clear(self):
+        self.keys = [0] * len(self)
+        self.entries = [None] * len(self)
+
+    def probe(self, key):
+        """Return (depth, score, flag, move, age) for key, or None"""
+        self.probes += 1
+        i = key & self.mask
+        if self.keys[i] == key:
+            self.hits += 1
+            return self.entries[i]
+        return None
+
+    def store(self, key, depth, score, flag, move):
+        i = key & self.mask
+        old = self.entries[i]
+        if old is None or self.keys[i] == key or old[4] != self.age or depth >= old[0]:
+            self.keys[i] = key
+            self.entries[i] = (depth, score, flag, move, self.age)
+
+
+class Engine:
+    """Iterative deepening negamax searcher working on a ChessGame in place"""
+
+    def __init__(self, tt_size=1 << 18, max_depth=64, tt=None, tablebases=None):
+        #tt lets several engines share one table (see chess_parallel)
+        self.tt = tt if tt is not None else TranspositionTable(tt_size)
+        #chess_tablebase.Tablebases answering positions with few pieces left
+        self.tablebases = tablebases
+        self.max_depth = max_depth
+        self.nodes = 0
+        #beta cutoffs, and how many of them came from the first move tried (move ordering quality)
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.depth = 0
+        self.stopped = False
+        #helpers in a parallel search rotate their root move order by this much
+        self.helper_id = 0
+
+    def search(self, game, time_limit=5.0, depth=None, info=print_info, stop=None, root_moves=None):
+        """Search the position and return (best_move, score in centipawns).
+
+        Stops at the hard time_limit (seconds) or after depth plies, whichever
+        comes first. info is called with a dict per finished iteration (depth,
+        score, nodes, nps, time, pv as coordinate strings); pass None to stay
+        quiet. The game is left exactly as it was given.
+
+        stop is an optional callable polled with the clock; a true result ends
+        the search like a timeout. root_moves restricts the search to those
+        root moves. The move is None only when there is no legal move, even
+        if the search is stopped before its first iteration finishes.
+        """
+        max_depth = depth or self.max_depth
+        start = time.perf_counter()
+        self._deadline = start + time_limit if time_limit else float('inf')
+        self._stop = stop
+        self._root_moves = root_moves
+        self.nodes = 0
+        self.cutoffs = 0
+        self.first_move_cutoffs = 0
+        self.depth = 0
+        self.stopped = False
+        self.killers = [[None, None] for _ in range(max_depth + 64)]
+        self.history = {}
+        self.tt.new_search()
+        root_ply = game.ply
+
+        #endgames the tables cover are played perfectly without searching
+        if self.tablebases and root_moves is None:
+            result = self.tablebases.probe(game)
+            if result and result[1]:
+                outcome, plies = result
+                return self.tablebases.best_move(game), MATE - plies if outcome > 0 else -MATE + plies
+
+        best_move, best_score = None, 0
+        for d in range(1, max_depth + 1):
+            try:
+                score, move = self._root(game, d)
+            except SearchTimeout:
+                self.stopped = True
+                #unwind whatever the interrupted iteration left on the board
+                while game.ply > root_ply:
+                    game.undo_move()
+                break
+            best_move, best_score = move, score
+            self.depth = d
+            elapsed = time.perf_counter() - start
+            if info:
+                info({'depth': d, 'score': score, 'nodes': self.nodes, 'time': elapsed,
+                      'nps': int(self.nodes / elapsed) if elapsed else 0,
+                      'pv': [move_to_string(game, m) for m in self.principal_variation(game, d)]})
+            if move is None or abs(score) > MATE - 1000:
+                break #no legal moves, or a forced mate was found
+            #a new iteration takes several times longer than the last one, don't start what can't finish
+            if time_limit and elapsed > time_limit / 2:
+                break
+        if best_move is None and self.stopped:
+            #stopped inside the first iteration: the table move if it has one for this position, else any legal move
+            moves = root_moves if root_moves is not None else list(game.legal_moves())
+            entry = self.tt.probe(game.zobrist_key)
+            best_move = entry[3] if entry and entry[3] in moves else next(iter(moves), None)
+        return best_move, best_score
+
+    def _root(self, game, depth):
+        """Search all root moves to depth, return (score, best move)"""
+        alpha, beta = -INFINITY, INFINITY
+        entry = self.tt.probe(game.zobrist_key)
+        moves = self._root_moves if self._root_moves is not None else list(game.legal_moves())
+        moves = self._ordered(game, moves, entry[3] if entry else None, 0)
+        if not moves:
+            return (-MATE if game.is_in_check() else 0), None
+        if self.helper_id:
+            shift = self.helper_id % len(moves)
+            moves = moves[shift:] + moves[:shift]
+        best_move = moves[0]
+        for move in moves:
+            game.push_move(*move)
+            score = -self._negamax(game, depth - 1, -beta, -alpha, 1)
+            game.undo_move()
+            if score > alpha:
+                alpha, best_move = score, move
+        self.tt.store(game.zobrist_key, depth, alpha, EXACT, best_move)
+        return alpha, best_move
+
+    def _negamax(self, game, depth, alpha, beta, ply):
+        self.nodes += 1
+        if not self.nodes & 1023 and (time.perf_counter() > self._deadline or self._stop and self._stop()):
+            raise SearchTimeout()
+
+        key = game.zobrist_key
+        #any repetition inside the tree is scored as a draw
+        if game.key_counts[key] > 1:
+            return 0
+
+        tt_move = None
+        entry = self.tt.probe(key)
+        if entry is not None:
+            entry_depth, score, flag, tt_move, _ = entry
+            if entry_depth >= depth:
+                #mate scores are stored relative to the node, convert back to the root
+                if score > MATE - 1000:
+                    score -= ply
+                elif score < -MATE + 1000:
+                    score += ply
+                if flag == EXACT:
+                    return score
+                if flag == LOWER and score >= beta:
+                    return score
+                if flag == UPPER and score <= alpha:
+                    return score
+
+        mover = game.current_player
+        in_check = game.is_in_check(mover)
+        if in_check:
+            depth += 1 #check extension
+        if depth <= 0:
+            return self._quiesce(game, alpha, beta, ply)
+
+        alpha_start = alpha
+        best_score, best_move = -INFINITY, None
+        for move in self._ordered(game, list(game.pseudo_legal_moves()), tt_move, ply):
+            game.push_move(*move)
+            if game.is_in_check(mover):
+                game.undo_move()
+                continue
+            score = -self._negamax(game, depth - 1, -beta, -alpha, ply + 1)
+            game.undo_move()
+
+            if score > best_score:
+                first = best_move is None
+                best_score, best_move = score, move
+                if score > alpha:
+                    alpha = score
+                    if alpha >= beta:
+                        self.cutoffs += 1
+                        self.first_move_cutoffs += first
+                        if game.piece_at(*move[1]) == '.' and move[2] is None and ply < len(self.killers):
+                            killers = self.killers[ply]
+                            if killers[0] != move:
+                                killers[1], killers[0] = killers[0], move
+                            self.history[move[:2]] = self.history.get(move[:2], 0) + depth * depth
+                        break
+
+        if best_move is None:
+            #no legal move: checkmate or stalemate
+            return -MATE + ply if in_check else 0
+
+        if best_score >= beta:
+            flag = LOWER
+        elif best_score > alpha_start:
+            flag = EXACT
+        else:
+            flag = UPPER
+        stored = best_score
+        if stored > MATE - 1000:
+            stored += ply
+        elif stored < -MATE + 1000:
+            stored -= ply
+        self.tt.store(key, depth, stored, flag, best_move)
+        return best_score
+
+    def _quiesce(self, game, alpha, beta, ply):
+        """Search captures and promotions only, until the position is quiet"""
+        self.nodes += 1
+        if not self.nodes & 1023 and (time.perf_counter() > self._deadline or self._stop and self._stop()):
+            raise SearchTimeout()
+
+        stand_pat = evaluate(game)
+        if stand_pat >= beta:
+            return stand_pat
+        if stand_pat > alpha:
+            alpha = stand_pat
+
+        mover = game.current_player
+        piece_at = game.piece_at
+        ep = game.en_passant_target
+        captures = [m for m in game.pseudo_legal_moves()
+                    if piece_at(*m[1]) != '.' or m[2] == 'q' or (m[1] == ep and piece_at(*m[0]) in 'Pp')]
+        for move in self._ordered(game, captures, None, ply):
+            game.push_move(*move)
+            if game.is_in_check(mover):
+                game.undo_move()
+                continue
+            score = -self._quiesce(game, -beta, -alpha, ply + 1)
+            game.undo_move()
+            if score >= beta:
+                return score
+            if score > alpha:
+                alpha = score
+        return alpha
+
+    def _ordered(self, game, moves, tt_move, ply):
+        """Sort moves: TT move, captures by MVV-LVA, promotions, killers, then history score"""
+        piece_at = game.piece_at
+        killers = self.killers[ply] if ply < len(self.killers) else ()
+        history = self.history
+        scored = []
+        for move in moves:
+            if move == tt_move:
+                score = 1 << 30
+            else:
+                victim = piece_at(*move[1])
+                if victim != '.':
+                    score = (1 << 24) + 10 * PIECE_VALUES[victim.lower()] - PIECE_VALUES[piece_at(*move[0]).lower()]
+                elif move[2] is not None:
+                    score = (1 << 24) + PIECE_VALUES[move[2]]
+                elif move in killers:
+                    score = 1 << 20
+                else:
+                    score = history.get(move[:2], 0)
+            scored.append((score, move))
+        scored.sort(key=lambda item: item[0], reverse=True)
+        return [move for _, move in scored]
+
+    def principal_variation(self, game, depth):
+        """Follow the TT moves from the current position, as a list of moves"""
+        pv = []
+        for _ in range(depth):
+            entry = self.tt.probe(game.zobrist_key)
+            if entry is None or entry[3] is None or entry[3] not in game.legal_moves():
+                break
+            pv.append(entry[3])
+            game.push_move(*entry[3])
+        for _ in pv:
+            game.undo_move()
+        return pv
@@ -0,0 +1,251 @@
+"""Static evaluation of many ChessGame positions at once with NumPy.
+
+Positions are stacked either as (N, 12) uint64 bitboards in PLANES order
+(bit row*8 + col, as BitboardChessGame keeps them, see bitboard_array()) or
+as (N, 12, 8, 8) planes with [row, col] indexing like ChessGame.board (see
+stack_planes()). evaluate_bitboards() and evaluate_batch() score the whole
+stack with array operations: shifts and popcounts on the bitboards. evaluate() is the same evaluation written per square in plain
+Python, for a single position and as the reference the batch path is
+checked against.
+
+Terms, in centipawns from white's point of view:
+- material and piece-square tables (those of chess_engine),
+- mobility: squares each knight, bishop, rook and queen can move to,
+- pawn structure: doubled and isolated pawns, passed pawns by rank.
+
+    python chess_eval.py [positions]
+
+compares both paths over a range of batch sizes.
+"""
+import random, sys, time
+
+import numpy as np
+
+from chess_attacks import KNIGHT_TARGETS, RAY_SQUARES, ROOK_DIRS, BISHOP_DIRS, DIRECTIONS
+from chess_engine import PIECE_VALUES, PIECE_SQUARE_TABLES
+
+PLANES = 'PNBRQKpnbrqk'
+PLANE = {piece: i for i, piece in enumerate(PLANES)}
+#centipawns per reachable square
+MOBILITY = {'n': 4, 'b': 5, 'r': 2, 'q': 1}
+DOUBLED_PAWN = -10 #per pawn beyond the first on a file
+ISOLATED_PAWN = -15
+#passed pawn bonus by rank counted from its own side, rank 2 first
+PASSED_PAWN = [0, 5, 10, 20, 35, 60, 100, 0]
+
+#material plus square bonus of every piece on every square, black negated and mirrored
+SQUARE_WEIGHTS = np.zeros((12, 8, 8), dtype=np.float32)
+for _piece, _table in PIECE_SQUARE_TABLES.items():
+    for _sq in range(64):
+        SQUARE_WEIGHTS[PLANE[_piece.upper()], _sq >> 3, _sq & 7] = PIECE_VALUES[_piece] + _table[_sq]
+        SQUARE_WEIGHTS[PLANE[_piece], _sq >> 3, _sq & 7] = -PIECE_VALUES[_piece] - _table[_sq ^ 56]
+del _piece, _table, _sq
+
+
+def evaluate(game):
+    """Evaluate one position square by square, in centipawns from the side to move's point of view"""
+    squares = game.flat_board()
+    score = 0
+    for sq, piece in enumerate(squares):
+        if piece == '.':
+            continue
+        score += int(SQUARE_WEIGHTS[PLANE[piece], sq >> 3, sq & 7])
+        kind = piece.lower()
+        if kind in MOBILITY:
+            own = str.isupper if piece.isupper() else str.islower
+            if kind == 'n':
+                reach = sum(1 for s in KNIGHT_TARGETS[sq] if squares[s] == '.' or not own(squares[s]))
+            else:
+                directions = ROOK_DIRS if kind == 'r' else BISHOP_DIRS if kind == 'b' else ROOK_DIRS + BISHOP_DIRS
+                reach = 0
+                for d in directions:
+                    for s in RAY_SQUARES[sq][d]:
+                        if squares[s] == '.':
+                            reach += 1
+                            continue
+                        if not own(squares[s]):
+                            reach += 1
+                        break
+            score += MOBILITY[kind] * reach if piece.isupper() else -MOBILITY[kind] * reach
+
+    white_pawns = [divmod(sq, 8) for sq, piece in enumerate(squares) if piece == 'P']
+    black_pawns = [divmod(sq, 8) for sq, piece in enumerate(squares) if piece == 'p']
+    #black's pawns are scored on the mirrored board, so both sides use the white rules
+    score += (_pawn_score(white_pawns, black_pawns)
+              - _pawn_score([(7 - r, c) for r, c in black_pawns], [(7 - r, c) for r, c in white_pawns]))
+    return score if game.current_player == 'white' else -score
+
+
+def _pawn_score(pawns, enemies):
+    """Pawn structure of (row, col) pawns moving up the board, enemy pawns given the same way"""
+    files = [0] * 8
+    for _, col in pawns:
+        files[col] += 1
+    score = DOUBLED_PAWN * sum(max(count - 1, 0) for count in files)
+    for row, col in pawns:
+        if not any(files[c] for c in (col - 1, col + 1) if 0 <= c < 8):
+            score += ISOLATED_PAWN
+        if not any(enemy_row > row and abs(enemy_col - col) <= 1 for enemy_row, enemy_col in enemies):
+            score += PASSED_PAWN[row - 1]
+    return score
+
+
+def to_planes(game):
+    """Return the (12, 8, 8) uint8 planes of a game's position"""
+    planes = np.zeros((12, 8, 8), dtype=np.uint8)
+    for sq, piece in enumerate(game.flat_board()):
+        if piece != '.':
+            planes[PLANE[piece], sq >> 3, sq & 7] = 1
+    return planes
+
+
+def stack_planes(games):
+    """Stack the planes of several games into an (N, 12, 8, 8) array"""
+    return np.stack([to_planes(game) for game in games]) if games else np.zeros((0, 12, 8, 8), np.uint8)
+
+
+def bitboard_array(games):
+    """Return the (N, 12) uint64 bitboards of BitboardChessGames, in PLANES order"""
+    return np.array([[game.bitboards[piece] for piece in PLANES] for game in games], dtype=np.uint64)
+
+
+def planes_from_bitboards(bitboards):
+    """Unpack (N, 12) uint64 bitboards (bit row*8 + col) into (N, 12, 8, 8) planes"""
+    #little-endian words: byte j holds row j, bit i of it column i
+    data = np.ascontiguousarray(bitboards, dtype='<u8').view(np.uint8).reshape(-1, 12, 8)
+    return np.unpackbits(data, axis=2, bitorder='little').reshape(-1, 12, 8, 8)
+
+
+def planes_to_bitboards(planes):
+    """Pack (N, 12, 8, 8) planes into (N, 12) uint64 bitboards, the inverse of planes_from_bitboards"""
+    data = np.packbits(np.asarray(planes, dtype=np.uint8).reshape(-1, 12, 8, 8), axis=3, bitorder='little')
+    return np.ascontiguousarray(data.reshape(-1, 12, 8)).view('<u8').reshape(-1, 12)
+
+
+_FILES = [np.uint64(0x0101010101010101 << col) for col in range(8)]
+_RANKS = [np.uint64(0xFF << (8 * row)) for row in range(8)]
+#masks keeping the squares a shift by cols can land on without wrapping around the board
+_COLUMN_MASKS = {cols: np.uint64(sum(0x0101010101010101 << col for col in range(8) if 0 <= col - cols < 8))
+                 for cols in range(-2, 3)}
+
+
+def _shift(boards, rows, cols):
+    """Move uint64 bitboards by rows and cols, dropping what leaves the board"""
+    amount = rows * 8 + cols
+    boards = boards << np.uint64(amount) if amount > 0 else boards >> np.uint64(-amount)
+    return boards & _COLUMN_MASKS[cols]
+
+
+def _mobility(pieces, own, empty, kind):
+    """Total number of squares the pieces (uint64 bitboards) of one kind can move to"""
+    free = ~own
+    reach = np.zeros(len(pieces), dtype=np.int32)
+    if kind == 'n':
+        for s in ((2, 1), (1, 2), (-1, 2), (-2, 1), (-2, -1), (-1, -2), (1, -2), (2, -1)):
+            reach += np.bitwise_count(_shift(pieces, *s) & free)
+        return reach
+    directions = ROOK_DIRS if kind == 'r' else BISHOP_DIRS if kind == 'b' else ROOK_DIRS + BISHOP_DIRS
+    for d in directions:
+        #one frontier square per piece and direction; it only goes on through empty squares
+        frontier = _shift(pieces, *DIRECTIONS[d])
+        while frontier.any():
+            reach += np.bitwise_count(frontier & free)
+            frontier = _shift(frontier & empty, *DIRECTIONS[d])
+    return reach
+
+
+def _pawn_scores(pawns, enemies):
+    """Vectorized _pawn_score for pawn bitboards moving up the board, enemy pawns given the same way"""
+    files = np.stack([np.bitwise_count(pawns & mask) for mask in _FILES], axis=1).astype(np.int32)
+    score = DOUBLED_PAWN * np.maximum(files - 1, 0).sum(axis=1)
+    neighbours = np.zeros_like(files)
+    neighbours[:, 1:] += files[:, :-1]
+    neighbours[:, :-1] += files[:, 1:]
+    score += ISOLATED_PAWN * (files * (neighbours == 0)).sum(axis=1)
+    #fill the squares below enemy pawns on the same or a neighbouring file
+    near = enemies | _shift(enemies, 0, 1) | _shift(enemies, 0, -1)
+    below = near >> np.uint64(8)
+    for amount in (8, 16, 32):
+        below |= below >> np.uint64(amount)
+    passed = pawns & ~below
+    for row in range(1, 7):
+        score += PASSED_PAWN[row - 1] * np.bitwise_count(passed & _RANKS[row]).astype(np.int32)
+    return score
+
+
+def evaluate_bitboards(bitboards, white_to_move=None):
+    """Evaluate (N, 12) uint64 bitboards in PLANES order, return an int32 array of N scores.
+
+    Scores are from white's point of view, or from the side to move's when a
+    boolean white_to_move array is given.
+    """
+    bitboards = np.asarray(bitboards, dtype=np.uint64)
+    planes = planes_from_bitboards(bitboards)
+    score = np.rint(planes.reshape(len(planes), -1).astype(np.float32) @ SQUARE_WEIGHTS.ravel()).astype(np.int32)
+
+    white = np.bitwise_or.reduce(bitboards[:, :6], axis=1)
+    black = np.bitwise_or.reduce(bitboards[:, 6:], axis=1)
+    empty = ~(white | black)
+    for kind, weight in MOBILITY.items():
+        score += weight * _mobility(bitboards[:, PLANE[kind.upper()]], white, empty, kind)
+        score -= weight * _mobility(bitboards[:, PLANE[kind]], black, empty, kind)
+
+    white_pawns = bitboards[:, PLANE['P']]
+    black_pawns = bitboards[:, PLANE['p']]
+    #byte swapping flips the board vertically
+    score += (_pawn_scores(white_pawns, black_pawns)
+              - _pawn_scores(black_pawns.byteswap(), white_pawns.byteswap()))
+    if white_to_move is not None:
+        score = np.where(white_to_move, score, -score)
+    return score
+
+
+def evaluate_batch(planes, white_to_move=None):
+    """Evaluate (N, 12, 8, 8) planes, see evaluate_bitboards"""
+    return evaluate_bitboards(planes_to_bitboards(planes), white_to_move)
+
+
+def sample_positions(count, seed=0):
+    """Positions from random games, for benchmarks"""
+    from chess_bitboard import BitboardChessGame
+    rng = random.Random(seed)
+    positions = []
+    game = BitboardChessGame()
+    while len(positions) < count:
+        if game.ply >= 80 or not game.has_legal_moves():
+            game = BitboardChessGame()
+        game.push_move(*rng.choice(list(game.legal_moves())))
+        snapshot = BitboardChessGame()
+        snapshot.load_bytes(game.to_bytes())
+        positions.append(snapshot)
+    return positions
+
+
+def benchmark(count=4096, batch_sizes=(1, 16, 256, 4096)):
+    """Print positions/s of evaluate() against evaluate_batch() at several batch sizes"""
+    games = sample_positions(count)
+    white_to_move = np.array([game.current_player == 'white' for game in games])
+
+    begin = time.perf_counter()
+    expected = np.array([evaluate(game) for game in games], dtype=np.int32)
+    python_rate = count / (time.perf_counter() - begin)
+    print(f"{'python':<14}{python_rate:>12,.0f} positions/s")
+
+    bitboards = bitboard_array(games)
+    planes = stack_planes(games)
+    if not np.array_equal(planes_from_bitboards(bitboards), planes):
+        raise AssertionError("bitboard and mailbox planes differ")
+    for name, evaluator, data in (('bitboards', evaluate_bitboards, bitboards), ('planes', evaluate_batch, planes)):
+        for size in batch_sizes:
+            begin = time.perf_counter()
+            scores = np.concatenate([evaluator(data[i:i + size], white_to_move[i:i + size])
+                                     for i in range(0, count, size)])
+            rate = count / (time.perf_counter() - begin)
+            if not np.array_equal(scores, expected):
+                raise AssertionError(f"{name} batch of {size} disagrees with evaluate()")
+            print(f"{name + ' ' + str(size):<14}{rate:>12,.0f} positions/s {rate / python_rate:>7.1f}x")
+
+
+if __name__ == "__main__":
+    count = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+    benchmark(count, tuple(size for size in (1, 16, 256, 4096) if size <= count))
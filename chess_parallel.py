@@ -0,0 +1,228 @@
+"""Multi-process search for ChessGame positions.
+
+Two modes share one transposition table that lives in shared memory:
+
+- 'lazy' (Lazy SMP): every worker searches the whole position, helpers with
+  a rotated root move order, and they speed each other up through the table.
+  The result of worker 0 is used and the helpers are stopped when it ends.
+- 'root': the root moves are split between the workers and the best of
+  their answers is used.
+
+Workers attach to the shared memory once when the pool starts. Each task
+only carries the 34-byte ChessGame.to_bytes() encoding and a few ints.
+
+Run python chess_parallel.py [workers] [depth] [lazy|root] for the speedup
+over a single-process search at equal depth.
+"""
+import os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+from chess import pack_move, unpack_move
+from chess_bitboard import BitboardChessGame
+from chess_engine import Engine
+
+_SCORE_OFFSET = 1 << 20
+
+
+class SharedTranspositionTable:
+    """TranspositionTable with the same interface, stored in a SharedMemory block.
+
+    Each slot is two 64-bit words: the key xored with the data, and the data
+    itself (depth 8 bits, flag 2, age 8, score 21, packed move 15). A slot torn
+    by two processes writing at once fails the key check instead of returning
+    garbage, so no locks are needed.
+    """
+
+    def __init__(self, size=1 << 18, name=None):
+        size = 1 << max(size - 1, 1).bit_length()
+        self.mask = size - 1
+        if name is None:
+            #two words per slot plus one header word holding the search age
+            self.shm = shared_memory.SharedMemory(create=True, size=(2 * size + 1) * 8)
+            self.shm.buf[:] = bytes(len(self.shm.buf))
+        else:
+            self.shm = shared_memory.SharedMemory(name=name)
+        self.name = self.shm.name
+        self.table = self.shm.buf.cast('Q')
+        self.probes = 0
+        self.hits = 0
+
+    def __len__(self):
+        return self.mask + 1
+
+    @property
+    def age(self):
+        return self.table[-1] & 0xFF
+
+    def new_search(self):
+        """Engines call this per search; the shared age only moves with advance_age()"""
+
+    def advance_age(self):
+        self.table[-1] = self.table[-1] + 1
+
+    def clear(self):
+        self.shm.buf[:16 * len(self)] = bytes(16 * len(self))
+
+    def probe(self, key):
+        """Return (depth, score, flag, move, age) for key, or None"""
+        self.probes += 1
+        i = (key & self.mask) << 1
+        data = self.table[i + 1]
+        if self.table[i] ^ data != key or not data:
+            return None
+        self.hits += 1
+        move = data >> 39
+        return (data & 0xFF, (data >> 18 & 0x1FFFFF) - _SCORE_OFFSET, data >> 8 & 3,
+                unpack_move(move) if move else None, data >> 10 & 0xFF)
+
+    def store(self, key, depth, score, flag, move):
+        i = (key & self.mask) << 1
+        old = self.table[i + 1]
+        age = self.age
+        if old and self.table[i] ^ old != key and (old >> 10 & 0xFF) == age and depth < (old & 0xFF):
+            return
+        data = (min(depth, 255) | flag << 8 | age << 10 | (score + _SCORE_OFFSET) << 18
+                | (pack_move(move) if move else 0) << 39)
+        self.table[i] = key ^ data
+        self.table[i + 1] = data
+
+    def close(self, unlink=False):
+        self.table.release()
+        self.shm.close()
+        if unlink:
+            self.shm.unlink()
+
+
+#per-process state of a pool worker, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(tt_name, tt_size, stop_name):
+    tt = SharedTranspositionTable(tt_size, name=tt_name)
+    stop = shared_memory.SharedMemory(name=stop_name)
+    _worker['tt'] = tt
+    _worker['stop'] = stop
+    _worker['engine'] = Engine(tt=tt)
+    _worker['game'] = BitboardChessGame()
+
+
+def _search_task(position, depth, time_limit, helper_id, root_moves):
+    """Search a packed position in a worker, return (packed move, score, nodes, depth reached)"""
+    game = _worker['game']
+    game.load_bytes(position)
+    engine = _worker['engine']
+    engine.helper_id = helper_id
+    stop_flag = _worker['stop'].buf
+    moves = [unpack_move(code) for code in root_moves] if root_moves else None
+    move, score = engine.search(game, time_limit, depth, info=None, stop=lambda: stop_flag[0], root_moves=moves)
+    return (pack_move(move) if move else None), score, engine.nodes, engine.depth
+
+
+class ParallelSearcher:
+    """Process pool of search workers sharing one transposition table.
+
+    Use as a context manager so the pool and shared memory are released:
+
+        with ParallelSearcher(workers=4) as searcher:
+            move, score = searcher.search(game, depth=5)
+    """
+
+    def __init__(self, workers=None, tt_size=1 << 18, mode='lazy'):
+        if mode not in ('lazy', 'root'):
+            raise ValueError(f"Unknown parallel search mode {mode!r}")
+        self.workers = workers or os.cpu_count() or 1
+        self.mode = mode
+        self.tt = SharedTranspositionTable(tt_size)
+        self._stop = shared_memory.SharedMemory(create=True, size=1)
+        self._stop.buf[0] = 0
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker,
+                                        initargs=(self.tt.name, tt_size, self._stop.name))
+        self.nodes = 0
+        self.depth = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+        self.tt.close(unlink=True)
+        self._stop.close()
+        self._stop.unlink()
+
+    def search(self, game, time_limit=None, depth=None):
+        """Search the position on all workers, return (best_move, score).
+
+        nodes and depth hold the total node count and the depth of the
+        returned result afterwards.
+        """
+        position = game.to_bytes()
+        self.tt.advance_age()
+        self._stop.buf[0] = 0
+
+        if self.mode == 'lazy':
+            futures = [self.pool.submit(_search_task, position, depth, time_limit, helper, None)
+                       for helper in range(self.workers)]
+            move, score, _, self.depth = futures[0].result()
+            #the main worker is done, tell the helpers to stop
+            self._stop.buf[0] = 1
+            results = [future.result() for future in futures]
+        else:
+            moves = [pack_move(move) for move in game.legal_moves()]
+            shares = [moves[i::self.workers] for i in range(self.workers)]
+            futures = [self.pool.submit(_search_task, position, depth, time_limit, 0, share)
+                       for share in shares if share]
+            results = [future.result() for future in futures]
+            if not results:
+                return None, 0
+            #every share was searched with a full window, so the best answer is the root value
+            self.depth = min(result[3] for result in results)
+            move, score, _, _ = max(results, key=lambda result: result[1])
+
+        self.nodes = sum(result[2] for result in results)
+        return (unpack_move(move) if move is not None else None), score
+
+
+BENCHMARK_FENS = [
+    'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+    'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+    'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+]
+
+
+def benchmark(workers=None, depth=4, mode='lazy', fens=BENCHMARK_FENS):
+    """Print single-process and parallel search times at equal depth and the speedup"""
+    with ParallelSearcher(workers, mode=mode) as searcher:
+        print(f"{searcher.workers} workers, mode {mode}, depth {depth}")
+        print(f"{'position':<10}{'1 proc s':>10}{'nodes':>10}{'N proc s':>10}{'nodes':>10}{'speedup':>9}")
+        total_single = total_parallel = 0.0
+        for i, fen in enumerate(fens):
+            game = BitboardChessGame()
+            game.load_fen(fen)
+
+            engine = Engine()
+            begin = time.perf_counter()
+            engine.search(game, None, depth, info=None)
+            single = time.perf_counter() - begin
+
+            searcher.tt.clear()
+            begin = time.perf_counter()
+            searcher.search(game, depth=depth)
+            parallel = time.perf_counter() - begin
+
+            total_single += single
+            total_parallel += parallel
+            print(f"{i + 1:<10}{single:>10.2f}{engine.nodes:>10}{parallel:>10.2f}{searcher.nodes:>10}"
+                  f"{single / parallel:>9.2f}")
+        print(f"{'total':<10}{total_single:>10.2f}{'':>10}{total_parallel:>10.2f}{'':>10}"
+              f"{total_single / total_parallel:>9.2f}")
+
+
+if __name__ == "__main__":
+    workers = int(sys.argv[1]) if len(sys.argv) > 1 else None
+    depth = int(sys.argv[2]) if len(sys.argv) > 2 else 4
+    mode = sys.argv[3] if len(sys.argv) > 3 else 'lazy'
+    benchmark(workers, depth, mode)
@@ -0,0 +1,92 @@
+"""Perft suite: count the leaf nodes of the legal move tree of reference positions.
+
+The node counts are the published reference numbers, so any mismatch means
+the move generator or make/undo is wrong. With --check-hash every node also
+compares the incrementally updated Zobrist key with one computed from scratch.
+Run with:
+
+    python chess_perft.py [depth] [array|bitboard] [--check-hash]
+"""
+import sys, time
+
+from chess import ChessGame
+from chess_bitboard import BitboardChessGame
+
+BACKENDS = {'array': ChessGame, 'bitboard': BitboardChessGame}
+
+#(name, fen, node counts for depth 1, 2, 3, ...)
+POSITIONS = [
+    ('startpos', 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1',
+     [20, 400, 8902, 197281]),
+    ('kiwipete', 'r3k2r/p1ppqpb1/bn2pnp1/3PN3/1p2P3/2N2Q1p/PPPBBPPP/R3K2R w KQkq - 0 1',
+     [48, 2039, 97862]),
+    ('position3', '8/2p5/3p4/KP5r/1R3p1k/8/4P1P1/8 w - - 0 1',
+     [14, 191, 2812, 43238]),
+    ('position4', 'r3k2r/Pppp1ppp/1b3nbN/nP6/BBP1P3/q4N2/Pp1P2PP/R2Q1RK1 w kq - 0 1',
+     [6, 264, 9467]),
+    ('position5', 'rnbq1k1r/pp1Pbppp/2p5/8/2B5/8/PPP1NnPP/RNBQK2R w KQ - 1 8',
+     [44, 1486, 62379]),
+    ('position6', 'r4rk1/1pp1qppp/p1np1n2/2b1p1B1/2B1P1b1/P1NP1N2/1PP1QPPP/R4RK1 w - - 0 10',
+     [46, 2079, 89890]),
+]
+
+
+def perft(game, depth, check_hash=False):
+    """Count the leaf nodes of the legal move tree below the current position"""
+    if check_hash and game.zobrist_key != game.compute_zobrist_key():
+        moves = ' '.join(game.index_to_algebraic(*m[0]) + game.index_to_algebraic(*m[1]) for m in game.move_history)
+        raise AssertionError(f"incremental Zobrist key differs from recomputed key after: {moves}")
+    if depth == 0:
+        return 1
+    moves = list(game.legal_moves())
+    if depth == 1 and not check_hash:
+        return len(moves)
+    nodes = 0
+    for move in moves:
+        game.push_move(*move)
+        nodes += perft(game, depth - 1, check_hash)
+        game.undo_move()
+    return nodes
+
+
+def divide(game, depth):
+    """Return {move in coordinate notation: node count} for each root move"""
+    counts = {}
+    for start, end, promotion in list(game.legal_moves()):
+        game.push_move(start, end, promotion)
+        name = game.index_to_algebraic(*start) + game.index_to_algebraic(*end) + (promotion or '')
+        counts[name] = perft(game, depth - 1)
+        game.undo_move()
+    return counts
+
+
+def run_suite(depth=3, backend='array', check_hash=False):
+    """Run every reference position to depth (or its deepest known count), print nodes/sec.
+
+    Returns True when all node counts match.
+    """
+    ok = True
+    total_nodes = 0
+    total_time = 0.0
+    print(f"{'position':<12}{'depth':>6}{'nodes':>12}{'expected':>12}{'nodes/s':>12}")
+    for name, fen, expected in POSITIONS:
+        d = min(depth, len(expected))
+        game = BACKENDS[backend]()
+        game.load_fen(fen)
+        begin = time.perf_counter()
+        nodes = perft(game, d, check_hash)
+        elapsed = time.perf_counter() - begin
+        total_nodes += nodes
+        total_time += elapsed
+        status = '' if nodes == expected[d - 1] else '  MISMATCH'
+        ok = ok and not status
+        print(f"{name:<12}{d:>6}{nodes:>12,}{expected[d - 1]:>12,}{nodes / elapsed:>12,.0f}{status}")
+    print(f"{'total':<12}{'':>6}{total_nodes:>12,}{'':>12}{total_nodes / total_time:>12,.0f}")
+    return ok
+
+
+if __name__ == "__main__":
+    args = [arg for arg in sys.argv[1:] if not arg.startswith('--')]
+    depth = int(args[0]) if args else 3
+    backend = args[1] if len(args) > 1 else 'array'
+    sys.exit(0 if run_suite(depth, backend, '--check-hash' in sys.argv) else 1)
@@ -0,0 +1,305 @@
+"""Streaming PGN reader, SAN moves and bulk game replay for ChessGame.
+
+read_games() yields one game at a time from a text stream, so a file of any
+size is read in constant memory, and a game's moves are only parsed and
+played when PgnGame.replay() is iterated. Run
+
+    python chess_pgn.py games.pgn [--workers N]
+
+to replay every game of a file on a process pool and report games/s and the
+games with illegal or unreadable moves, or
+
+    python chess_pgn.py games.pgn --generate 1000
+
+to write that many random games (through move_to_san) to try it on.
+"""
+import argparse, os, random, re, time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from chess_bitboard import BitboardChessGame
+
+START_FEN = 'rnbqkbnr/pppppppp/8/8/8/8/PPPPPPPP/RNBQKBNR w KQkq - 0 1'
+
+TAG_RE = re.compile(r'\[\s*(\w+)\s+"((?:[^"\\]|\\.)*)"\s*\]')
+#comments, variation brackets, NAGs, move numbers and results, then anything else is a move
+TOKEN_RE = re.compile(r'\{[^}]*\}|;[^\n]*|[()]|\$\d+|1-0|0-1|1/2-1/2|\*|\d+\.+|[^\s(){};$]+')
+SAN_RE = re.compile(r'([NBRQK])?([a-h])?([1-8])?x?([a-h][1-8])(?:=?([NBRQnbrq]))?')
+CASTLES = {'O-O': True, '0-0': True, 'O-O-O': False, '0-0-0': False}
+
+
+class IllegalMoveError(ValueError):
+    """A SAN move that doesn't name exactly one legal move in the position"""
+
+    def __init__(self, san, reason, ply=None):
+        self.san = san
+        self.reason = reason
+        self.ply = ply
+        where = f"ply {ply}: " if ply is not None else ''
+        super().__init__(f"{where}{san!r} {reason}")
+
+
+class PgnGame:
+    """One game of a PGN file: its tag pairs and still unparsed movetext"""
+
+    def __init__(self, headers, movetext, number=1):
+        self.headers = headers
+        self.movetext = movetext
+        self.number = number
+
+    def __repr__(self):
+        return (f"<PgnGame {self.number}: {self.headers.get('White', '?')} - "
+                f"{self.headers.get('Black', '?')} {self.headers.get('Result', '*')}>")
+
+    def sans(self):
+        """Yield the SAN moves of the main line"""
+        depth = 0
+        for token in TOKEN_RE.findall(self.movetext):
+            first = token[0]
+            if first == '(':
+                depth += 1
+            elif first == ')':
+                depth -= 1
+            elif depth or first in '{;$*' or token[-1] == '.' or token in ('1-0', '0-1', '1/2-1/2'):
+                continue
+            else:
+                yield token
+
+    def replay(self, game=None):
+        """Play the main line move by move, yielding (game, move) after each one is pushed.
+
+        game is set up from the FEN tag (or the start position) first; a
+        BitboardChessGame is made if none is given. Raises IllegalMoveError at
+        the first move that can't be played.
+        """
+        game = game or BitboardChessGame()
+        game.load_fen(self.headers.get('FEN', START_FEN))
+        for ply, san in enumerate(self.sans(), 1):
+            try:
+                move = parse_san(game, san)
+            except IllegalMoveError as error:
+                raise IllegalMoveError(san, error.reason, ply) from None
+            game.push_move(*move)
+            yield game, move
+
+
+def read_games(stream):
+    """Yield a PgnGame for each game in a text stream of PGN, reading it line by line"""
+    headers, lines = {}, []
+    number = 1
+    comment = 0 #brace balance, so a '[' line inside a comment stays movetext
+    for line in stream:
+        line = line.strip()
+        if not comment and line.startswith('['):
+            #a tag after movetext starts the next game
+            if lines:
+                yield PgnGame(headers, ' '.join(lines), number)
+                headers, lines = {}, []
+                number += 1
+            match = TAG_RE.match(line)
+            if match:
+                headers[match[1]] = match[2].replace('\\"', '"').replace('\\\\', '\\')
+        elif line and not line.startswith('%'):
+            lines.append(line)
+            comment += line.count('{') - line.count('}')
+    if headers or lines:
+        yield PgnGame(headers, ' '.join(lines), number)
+
+
+def parse_san(game, san):
+    """Return the legal (start, end, promotion) move that SAN text names in the game's position"""
+    text = san.rstrip('+#!?')
+    white = game.current_player == 'white'
+    if text in CASTLES:
+        row = 0 if white else 7
+        piece, from_file, from_rank = 'k', 4, row
+        target = (row, 6 if CASTLES[text] else 2)
+        promotion = None
+    else:
+        match = SAN_RE.fullmatch(text)
+        if not match:
+            raise IllegalMoveError(san, "is not a SAN move")
+        piece = (match[1] or 'P').lower()
+        from_file = ord(match[2]) - ord('a') if match[2] else None
+        from_rank = int(match[3]) - 1 if match[3] else None
+        target = game.algebraic_to_index(match[4])
+        promotion = match[5].lower() if match[5] else None
+
+    color = game.current_player
+    candidates = []
+    for move in list(game.pseudo_legal_moves()):
+        start, end, move_promotion = move
+        if (end != target or move_promotion != promotion or game.piece_at(*start).lower() != piece
+                or (from_file is not None and start[1] != from_file)
+                or (from_rank is not None and start[0] != from_rank)):
+            continue
+        #only the few candidates are tested for leaving the king in check
+        game.push_move(*move)
+        illegal = game.is_in_check(color)
+        game.undo_move()
+        if not illegal:
+            candidates.append(move)
+
+    if not candidates:
+        if piece == 'p' and promotion is None and target[0] in (0, 7):
+            raise IllegalMoveError(san, "needs a promotion piece")
+        raise IllegalMoveError(san, "is illegal")
+    if len(candidates) > 1:
+        raise IllegalMoveError(san, "is ambiguous")
+    return candidates[0]
+
+
+def move_to_san(game, move, legal=None):
+    """Return the SAN of a legal move in the game's position.
+
+    legal can pass the position's legal moves when they are known already.
+    """
+    start, end, promotion = move
+    piece = game.piece_at(*start).upper()
+    if piece == 'K' and abs(end[1] - start[1]) == 2:
+        san = 'O-O' if end[1] == 6 else 'O-O-O'
+    else:
+        capture = game.piece_at(*end) != '.' or (piece == 'P' and start[1] != end[1])
+        square = game.index_to_algebraic(*end)
+        if piece == 'P':
+            san = (game.index_to_algebraic(*start)[0] + 'x' if capture else '') + square
+            if end[0] in (0, 7):
+                san += '=' + (promotion or 'q').upper()
+        else:
+            #name the start file, rank or square when another piece of the kind can go there too
+            others = [s for s, e, _ in (game.legal_moves() if legal is None else legal)
+                      if e == end and s != start and game.piece_at(*s).upper() == piece]
+            prefix = ''
+            if others:
+                if all(s[1] != start[1] for s in others):
+                    prefix = game.index_to_algebraic(*start)[0]
+                elif all(s[0] != start[0] for s in others):
+                    prefix = game.index_to_algebraic(*start)[1]
+                else:
+                    prefix = game.index_to_algebraic(*start)
+            san = piece + prefix + ('x' if capture else '') + square
+
+    game.push_move(start, end, promotion)
+    if game.is_in_check():
+        san += '+' if game.has_legal_moves() else '#'
+    game.undo_move()
+    return san
+
+
+#per-process game reused by _replay_chunk
+_worker = {}
+
+
+def _replay_chunk(games):
+    """Replay PgnGames, return (number, plies, error message or None) for each"""
+    game = _worker.setdefault('game', BitboardChessGame())
+    results = []
+    for pgn in games:
+        plies = 0
+        error = None
+        try:
+            for _ in pgn.replay(game):
+                plies += 1
+        #one bad game (illegal move, broken FEN tag, ...) must not stop the batch
+        except Exception as exc:
+            error = str(exc)
+        results.append((pgn.number, plies, error))
+    return results
+
+
+def _chunks(games, size):
+    chunk = []
+    for pgn in games:
+        chunk.append(pgn)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+
+def replay_file(path, workers=None, chunk_size=32):
+    """Replay every game of a PGN file on a process pool.
+
+    Returns (games, plies, errors, seconds) with errors a list of
+    (game number, message). At most two chunks per worker are in flight, so
+    memory stays flat however large the file is. workers=0 replays in this
+    process.
+    """
+    workers = os.cpu_count() or 1 if workers is None else workers
+    games = plies = 0
+    errors = []
+
+    def collect(results):
+        nonlocal games, plies
+        for number, count, error in results:
+            games += 1
+            plies += count
+            if error:
+                errors.append((number, error))
+
+    begin = time.perf_counter()
+    with open(path, encoding='utf-8', errors='replace') as stream:
+        chunks = _chunks(read_games(stream), chunk_size)
+        if not workers:
+            for chunk in chunks:
+                collect(_replay_chunk(chunk))
+        else:
+            with ProcessPoolExecutor(workers) as pool:
+                pending = set()
+                for chunk in chunks:
+                    if len(pending) >= 2 * workers:
+                        done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                        for future in done:
+                            collect(future.result())
+                    pending.add(pool.submit(_replay_chunk, chunk))
+                for future in pending:
+                    collect(future.result())
+    errors.sort()
+    return games, plies, errors, time.perf_counter() - begin
+
+
+def write_random_games(path, count, seed=0, max_plies=120):
+    """Write count random legal games to a PGN file"""
+    rng = random.Random(seed)
+    game = BitboardChessGame()
+    with open(path, 'w') as out:
+        for number in range(1, count + 1):
+            game.load_fen(START_FEN)
+            sans = []
+            result = '*'
+            while game.ply < max_plies:
+                legal = list(game.legal_moves())
+                if not legal:
+                    result = ('0-1' if game.current_player == 'white' else '1-0') if game.is_in_check() else '1/2-1/2'
+                    break
+                move = rng.choice(legal)
+                san = move_to_san(game, move, legal)
+                sans.append(f"{game.fullmove_number}. {san}" if game.current_player == 'white' else san)
+                game.push_move(*move)
+            out.write(f'[Event "Random game {number}"]\n[White "random"]\n[Black "random"]\n'
+                      f'[Result "{result}"]\n\n')
+            #wrap the movetext at 80 columns like most PGN writers
+            line = ''
+            for token in sans + [result]:
+                if len(line) + len(token) >= 80:
+                    out.write(line.rstrip() + '\n')
+                    line = ''
+                line += token + ' '
+            out.write(line.rstrip() + '\n\n')
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Replay the games of a PGN file")
+    parser.add_argument('path')
+    parser.add_argument('--workers', type=int, default=None, help="processes, 0 to replay in this one")
+    parser.add_argument('--generate', type=int, metavar='N', help="write N random games to path first")
+    args = parser.parse_args()
+
+    if args.generate:
+        write_random_games(args.path, args.generate)
+    games, plies, errors, seconds = replay_file(args.path, args.workers)
+    print(f"{games} games, {plies} plies in {seconds:.2f}s: "
+          f"{games / seconds:,.1f} games/s, {plies / seconds:,.0f} plies/s")
+    for number, error in errors:
+        print(f"game {number}: {error}")
+    print(f"{len(errors)} games with errors")
@@ -0,0 +1,270 @@
+"""Board rendering for ChessGame positions.
+
+BoardRenderer keeps one figure with a text artist per square. The empty
+board is drawn once and cached per square; each draw restores and repaints
+(and in a window, blits) only the squares whose piece differs from the last
+frame. It has three modes:
+
+- 'window': an interactive matplotlib window, used by display_board,
+- 'offscreen': a Figure on the Agg canvas, no GUI backend or pyplot,
+- 'text': the ASCII board only; matplotlib is never imported.
+
+render_game() writes a game's positions as numbered PNGs and/or an animated
+GIF in offscreen mode. Every draw is timed, see BoardRenderer.frame_stats().
+
+    python chess_render.py game.pgn [--game N] [--out DIR] [--gif FILE]
+    python chess_render.py --benchmark [frames]
+"""
+import argparse, os, random, statistics, time
+
+import numpy as np
+
+UNICODE_PIECES = {
+    'K': '♔', 'Q': '♕', 'R': '♖', 'B': '♗', 'N': '♘', 'P': '♙',
+    'k': '♚', 'q': '♛', 'r': '♜', 'b': '♝', 'n': '♞', 'p': '♟'
+}
+SQUARE_COLORS = ['#f0d9b5', '#b58863']
+MODES = ('window', 'offscreen', 'text')
+RULE = "  +---+---+---+---+---+---+---+---+"
+
+
+def ascii_board(squares, player):
+    """The terminal board for a flat a1-first list of pieces, black side on top"""
+    lines = ["", "    a   b   c   d   e   f   g   h", RULE]
+    for row in range(7, -1, -1):
+        cells = ''.join(f" {' ' if piece == '.' else piece} |" for piece in squares[row * 8:row * 8 + 8])
+        lines.append(f"{row + 1} |{cells}")
+        lines.append(RULE)
+    lines.append(f"\n{player.capitalize()}'s turn")
+    return '\n'.join(lines)
+
+
+class BoardRenderer:
+    """Draws positions into one persistent figure, updating only changed squares"""
+
+    def __init__(self, mode='window', figsize=(8, 8), ascii=True):
+        if mode not in MODES:
+            raise ValueError(f"Unknown render mode {mode!r}, use one of {MODES}")
+        self.mode = mode
+        self.ascii = ascii
+        self.figure = None
+        #what each square showed in the last frame, None before the first
+        self._shown = [None] * 64
+        self.frame_times = []
+        if mode != 'text':
+            self._build(figsize)
+
+    def _build(self, figsize):
+        from matplotlib.colors import ListedColormap
+        if self.mode == 'window':
+            import matplotlib.pyplot as plt
+            self._plt = plt
+            plt.ion()
+            self.figure = plt.figure(figsize=figsize)
+        else:
+            from matplotlib.figure import Figure
+            from matplotlib.backends.backend_agg import FigureCanvasAgg
+            self.figure = Figure(figsize=figsize)
+            FigureCanvasAgg(self.figure)
+
+        axes = self.figure.add_subplot()
+        rows, cols = np.indices((8, 8))
+        axes.imshow((rows + cols) % 2, cmap=ListedColormap(SQUARE_COLORS), origin='lower')
+        axes.set_xticks(np.arange(8), ['a', 'b', 'c', 'd', 'e', 'f', 'g', 'h'])
+        axes.set_yticks(np.arange(8), ['1', '2', '3', '4', '5', '6', '7', '8'])
+        #pieces and title are animated: a full redraw leaves them out and draw() blits them on
+        self._texts = [axes.text(sq & 7, sq >> 3, '', fontsize=28, ha='center', va='center', animated=True)
+                       for sq in range(64)]
+        self._title = axes.set_title(' ', animated=True)
+        self.figure.tight_layout()
+        self._axes = axes
+        self._backgrounds = None
+        self.figure.canvas.mpl_connect('draw_event', self._capture)
+
+    def _boxes(self):
+        """Display-space boxes of the 64 squares and the strip above the board holding the title"""
+        from matplotlib.transforms import Bbox
+        to_display = self._axes.transData.transform
+        boxes = [Bbox(to_display([((sq & 7) - 0.5, (sq >> 3) - 0.5), ((sq & 7) + 0.5, (sq >> 3) + 0.5)]))
+                 for sq in range(64)]
+        top = self._axes.get_window_extent().y1
+        boxes.append(Bbox([[0, top], [self.figure.bbox.width, self.figure.bbox.height]]))
+        return boxes
+
+    def _capture(self, event=None):
+        """After a full redraw: keep the empty squares and title strip, then put the pieces back on"""
+        canvas = self.figure.canvas
+        self._regions = self._boxes()
+        self._backgrounds = [canvas.copy_from_bbox(box) for box in self._regions]
+        for text in self._texts + [self._title]:
+            if text.get_text():
+                self.figure.draw_artist(text)
+
+    def draw(self, game):
+        """Show the game's position"""
+        begin = time.perf_counter()
+        squares = list(game.flat_board())
+        title = f"{game.current_player.capitalize()}'s turn"
+        if self.ascii:
+            print(ascii_board(squares, game.current_player))
+
+        if self.figure is not None:
+            canvas = self.figure.canvas
+            if self._backgrounds is None:
+                if self.mode == 'window':
+                    self._plt.show(block=False)
+                canvas.draw()
+            changed = [sq for sq in range(64) if squares[sq] != self._shown[sq]]
+            for sq in changed:
+                piece = squares[sq]
+                text = self._texts[sq]
+                text.set_text(UNICODE_PIECES.get(piece, ''))
+                text.set_color('black' if piece.isupper() else 'darkred')
+            if title != self._title.get_text():
+                self._title.set_text(title)
+                changed.append(64)
+            #repaint only the changed squares: empty square first, then the new piece
+            for i in changed:
+                canvas.restore_region(self._backgrounds[i])
+                artist = self._texts[i] if i < 64 else self._title
+                if artist.get_text():
+                    self.figure.draw_artist(artist)
+            if self.mode == 'window':
+                for i in changed:
+                    canvas.blit(self._regions[i])
+                canvas.flush_events()
+        self._shown = squares
+        self.frame_times.append(time.perf_counter() - begin)
+
+    def image(self):
+        """The last frame as an (height, width, 4) RGBA array"""
+        return np.asarray(self.figure.canvas.buffer_rgba()).copy()
+
+    def save(self, path):
+        """Write the last frame as a PNG"""
+        from PIL import Image
+        Image.fromarray(self.image()).save(path)
+
+    def frame_stats(self):
+        """Frame count and mean, median and worst draw time in milliseconds"""
+        times = [t * 1000 for t in self.frame_times] or [0.0]
+        return {'frames': len(self.frame_times), 'mean_ms': statistics.fmean(times),
+                'median_ms': statistics.median(times), 'max_ms': max(times)}
+
+    def close(self):
+        if self.mode == 'window' and self.figure is not None:
+            self._plt.close(self.figure)
+        self.figure = None
+
+
+def render_game(positions, out_dir=None, gif=None, frame_seconds=0.6, figsize=(6, 6)):
+    """Render each game state of an iterable offscreen, return the renderer's frame_stats().
+
+    Frames go to out_dir as frame_0000.png, ... and/or into one animated GIF.
+    The iterable may yield the same game object again after each move.
+    """
+    renderer = BoardRenderer('offscreen', figsize, ascii=False)
+    if out_dir:
+        os.makedirs(out_dir, exist_ok=True)
+    frames = []
+    for i, game in enumerate(positions):
+        renderer.draw(game)
+        if out_dir:
+            renderer.save(os.path.join(out_dir, f"frame_{i:04d}.png"))
+        if gif:
+            frames.append(renderer.image())
+    if gif and frames:
+        from PIL import Image
+        images = [Image.fromarray(frame).convert('RGB') for frame in frames]
+        images[0].save(gif, save_all=True, append_images=images[1:], duration=int(frame_seconds * 1000), loop=0)
+    stats = renderer.frame_stats()
+    renderer.close()
+    return stats
+
+
+def pgn_positions(pgn):
+    """Yield the game after its set-up and after every move of a chess_pgn.PgnGame"""
+    from chess_bitboard import BitboardChessGame
+    from chess_pgn import START_FEN
+    game = BitboardChessGame()
+    game.load_fen(pgn.headers.get('FEN', START_FEN))
+    yield game
+    for game, _ in pgn.replay(game):
+        yield game
+
+
+def benchmark(frames=60, seed=0):
+    """Compare drawing a fresh figure per frame, as display_board used to, with incremental updates"""
+    from matplotlib.colors import ListedColormap
+    from matplotlib.figure import Figure
+    from matplotlib.backends.backend_agg import FigureCanvasAgg
+    from chess_bitboard import BitboardChessGame
+
+    rng = random.Random(seed)
+    game = BitboardChessGame()
+    positions = []
+    while len(positions) < frames:
+        moves = list(game.legal_moves())
+        if not moves:
+            game = BitboardChessGame()
+            continue
+        game.push_move(*rng.choice(moves))
+        positions.append(list(game.flat_board()))
+
+    rows, cols = np.indices((8, 8))
+    rebuild = []
+    for squares in positions:
+        begin = time.perf_counter()
+        figure = Figure(figsize=(8, 8))
+        FigureCanvasAgg(figure)
+        axes = figure.add_subplot()
+        axes.imshow((rows + cols) % 2, cmap=ListedColormap(SQUARE_COLORS), origin='lower')
+        for sq, piece in enumerate(squares):
+            if piece != '.':
+                axes.text(sq & 7, sq >> 3, UNICODE_PIECES[piece], fontsize=28, ha='center', va='center',
+                          color='black' if piece.isupper() else 'darkred')
+        figure.tight_layout()
+        figure.canvas.draw()
+        rebuild.append(time.perf_counter() - begin)
+
+    class Snapshot:
+        current_player = 'white'
+
+        def __init__(self, squares):
+            self.squares = squares
+
+        def flat_board(self):
+            return self.squares
+
+    renderer = BoardRenderer('offscreen', ascii=False)
+    for squares in positions:
+        renderer.draw(Snapshot(squares))
+    incremental = renderer.frame_stats()
+    print(f"{frames} frames, offscreen")
+    print(f"{'new figure per frame':<24}{statistics.fmean(rebuild) * 1000:>8.1f} ms/frame")
+    print(f"{'incremental':<24}{incremental['mean_ms']:>8.1f} ms/frame (max {incremental['max_ms']:.1f})")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Render a PGN game to PNG frames or a GIF, offscreen")
+    parser.add_argument('pgn', nargs='?')
+    parser.add_argument('--game', type=int, default=1, help="which game of the file, from 1")
+    parser.add_argument('--out', help="directory for the PNG frames")
+    parser.add_argument('--gif', help="animated GIF file")
+    parser.add_argument('--benchmark', type=int, nargs='?', const=60, metavar='FRAMES',
+                        help="time per-frame figure rebuilds against incremental updates")
+    args = parser.parse_args()
+
+    if args.benchmark:
+        benchmark(args.benchmark)
+    elif args.pgn:
+        from chess_pgn import read_games
+        with open(args.pgn) as stream:
+            pgn = next((g for g in read_games(stream) if g.number == args.game), None)
+        if pgn is None:
+            parser.error(f"no game {args.game} in {args.pgn}")
+        stats = render_game(pgn_positions(pgn), args.out, args.gif)
+        print(f"{stats['frames']} frames, {stats['mean_ms']:.1f} ms mean, {stats['median_ms']:.1f} ms median, "
+              f"{stats['max_ms']:.1f} ms max")
+    else:
+        parser.error("give a PGN file or --benchmark")
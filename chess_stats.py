@@ -0,0 +1,251 @@
+"""Opt-in instrumentation for ChessGame and the search engine.
+
+enable() wraps the hot methods of ChessGame, BitboardChessGame and Engine
+with counting or timing versions and disable() puts the originals back, so
+nothing is paid while it is off. cProfile reports code objects, so a
+profile taken while instrumented charges the wrappers' own time to
+'wrapper' rather than to the wrapped methods; profile with it disabled.
+
+    with instrumented() as stats:
+        game.make_move('e2', 'e4')
+        with stats.timer('my step'):
+            ...
+    stats.dump('stats.json')
+
+Collected:
+- calls of is_valid_move and each is_valid_<piece>_move, is_path_clear,
+  is_square_attacked and the move generators,
+- count, total and worst latency of make_move, push_move and undo_move,
+- per search: nodes, beta cutoffs and the share of them from the first
+  move, transposition table hit rate and the branching factor per iteration.
+
+    python chess_stats.py [--depth N] [--json FILE] [--profile]
+
+runs a fixed workload (perft, validation sweeps and a search) and reports.
+"""
+import argparse, cProfile, functools, json, pstats, sys, time
+from contextlib import contextmanager
+
+from chess import ChessGame
+from chess_bitboard import BitboardChessGame
+from chess_engine import Engine, print_info
+
+COUNTED = ('is_valid_move', 'is_valid_pawn_move', 'is_valid_rook_move', 'is_valid_knight_move',
+           'is_valid_bishop_move', 'is_valid_queen_move', 'is_valid_king_move', 'is_path_clear',
+           'is_square_attacked', 'pseudo_legal_moves', 'legal_moves')
+TIMED = ('make_move', 'push_move', 'undo_move')
+GAME_CLASSES = (ChessGame, BitboardChessGame)
+
+
+class Stats:
+    """Counters, latency totals and search records"""
+
+    def __init__(self):
+        self.counters = {}
+        #name -> [calls, total seconds, worst seconds]
+        self.timings = {}
+        self.searches = []
+
+    def reset(self):
+        self.__init__()
+
+    def count(self, name, amount=1):
+        self.counters[name] = self.counters.get(name, 0) + amount
+
+    def add_time(self, name, seconds):
+        timing = self.timings.get(name)
+        if timing is None:
+            self.timings[name] = [1, seconds, seconds]
+        else:
+            timing[0] += 1
+            timing[1] += seconds
+            if seconds > timing[2]:
+                timing[2] = seconds
+
+    @contextmanager
+    def timer(self, name):
+        """Time a block under name"""
+        begin = time.perf_counter()
+        try:
+            yield
+        finally:
+            self.add_time(name, time.perf_counter() - begin)
+
+    def to_dict(self):
+        return {
+            'counters': dict(sorted(self.counters.items())),
+            'timings': {name: {'calls': calls, 'total_s': round(total, 6), 'mean_us': round(total / calls * 1e6, 3),
+                               'max_us': round(worst * 1e6, 3)}
+                        for name, (calls, total, worst) in sorted(self.timings.items())},
+            'searches': self.searches,
+        }
+
+    def dump(self, path):
+        with open(path, 'w') as out:
+            json.dump(self.to_dict(), out, indent=2)
+
+    def report(self, out=sys.stdout):
+        """Print the counters, timings and searches as tables"""
+        data = self.to_dict()
+        if data['counters']:
+            print(f"{'calls':<28}{'count':>14}", file=out)
+            for name, count in data['counters'].items():
+                print(f"{name:<28}{count:>14,}", file=out)
+        if data['timings']:
+            print(f"\n{'timed':<28}{'calls':>14}{'total s':>10}{'mean us':>10}{'max us':>10}", file=out)
+            for name, t in data['timings'].items():
+                print(f"{name:<28}{t['calls']:>14,}{t['total_s']:>10.3f}{t['mean_us']:>10.2f}{t['max_us']:>10.1f}",
+                      file=out)
+        for search in data['searches']:
+            print(f"\nsearch depth {search['depth']}: {search['nodes']:,} nodes in {search['seconds']:.2f}s, "
+                  f"{search['cutoffs']:,} cutoffs ({search['first_move_cutoff_rate']:.0%} on the first move), "
+                  f"TT hit rate {search['tt_hit_rate']:.0%}, branching {search['branching_factors']}", file=out)
+
+
+def _counted(stats, name, original):
+    counters = stats.counters
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        counters[name] = counters.get(name, 0) + 1
+        return original(*args, **kwargs)
+    return wrapper
+
+
+def _timed(stats, name, original):
+    clock = time.perf_counter
+
+    @functools.wraps(original)
+    def wrapper(*args, **kwargs):
+        begin = clock()
+        try:
+            return original(*args, **kwargs)
+        finally:
+            stats.add_time(name, clock() - begin)
+    return wrapper
+
+
+def _search_recorder(stats, original):
+    @functools.wraps(original)
+    def search(engine, game, time_limit=5.0, depth=None, info=print_info, stop=None, root_moves=None):
+        probes, hits = engine.tt.probes, engine.tt.hits
+        iterations = []
+        root = engine._root
+
+        #the node count after each finished iteration, taken at the root so the
+        #caller's info (and the PV walk it costs) stays as the caller asked
+        def record(*args):
+            result = root(*args)
+            iterations.append(engine.nodes)
+            return result
+
+        begin = time.perf_counter()
+        engine._root = record
+        try:
+            result = original(engine, game, time_limit, depth, info, stop, root_moves)
+        finally:
+            del engine._root
+        #iteration node counts are cumulative, each one's own nodes are the differences
+        own = [b - a for a, b in zip([0] + iterations, iterations)]
+        probed = engine.tt.probes - probes
+        stats.searches.append({
+            'depth': engine.depth, 'nodes': engine.nodes, 'seconds': round(time.perf_counter() - begin, 4),
+            'cutoffs': engine.cutoffs,
+            'first_move_cutoff_rate': engine.first_move_cutoffs / engine.cutoffs if engine.cutoffs else 0.0,
+            'tt_hit_rate': (engine.tt.hits - hits) / probed if probed else 0.0,
+            'branching_factors': [round(b / a, 2) for a, b in zip(own, own[1:]) if a],
+        })
+        return result
+    return search
+
+
+#(owner, name, original) of every method replaced by enable()
+_installed = []
+
+
+def enable(stats=None):
+    """Install the instrumentation, return the Stats it collects into"""
+    if _installed:
+        raise RuntimeError("instrumentation is already enabled")
+    stats = stats or Stats()
+    for owner in GAME_CLASSES:
+        for name in COUNTED + TIMED:
+            #only methods a class defines itself, inherited ones are wrapped on the base
+            if name in owner.__dict__:
+                original = owner.__dict__[name]
+                wrap = _timed if name in TIMED else _counted
+                setattr(owner, name, wrap(stats, name, original))
+                _installed.append((owner, name, original))
+    _installed.append((Engine, 'search', Engine.search))
+    Engine.search = _search_recorder(stats, Engine.search)
+    return stats
+
+
+def disable():
+    """Remove the instrumentation"""
+    while _installed:
+        owner, name, original = _installed.pop()
+        setattr(owner, name, original)
+
+
+@contextmanager
+def instrumented(stats=None):
+    """Collect into a Stats for the duration of a with block"""
+    stats = enable(stats)
+    try:
+        yield stats
+    finally:
+        disable()
+
+
+def profile(func, *args, top=25, sort='cumulative', out=sys.stdout, **kwargs):
+    """Run func under cProfile, print the top entries and return its result"""
+    profiler = cProfile.Profile()
+    result = profiler.runcall(func, *args, **kwargs)
+    pstats.Stats(profiler, stream=out).sort_stats(sort).print_stats(top)
+    return result
+
+
+def workload(depth=4):
+    """A fixed mix of the instrumented paths: perft, validation sweeps, moves with undo and a search"""
+    from chess_perft import perft
+    from chess_parallel import BENCHMARK_FENS
+    for backend in GAME_CLASSES:
+        game = backend()
+        perft(game, 3)
+        for fen in BENCHMARK_FENS:
+            game.load_fen(fen)
+            for start in range(64):
+                for end in range(64):
+                    game.is_valid_move(divmod(start, 8), divmod(end, 8))
+    game = ChessGame()
+    for start, end in (('e2', 'e4'), ('e7', 'e5'), ('g1', 'f3'), ('b8', 'c6'), ('f1', 'b5')):
+        game.make_move(start, end)
+    while game.undo_move()[0]:
+        pass
+    game = BitboardChessGame()
+    game.load_fen(BENCHMARK_FENS[1])
+    Engine().search(game, None, depth, info=None)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run an instrumented workload and report what it did")
+    parser.add_argument('--depth', type=int, default=4, help="search depth of the workload")
+    parser.add_argument('--json', help="write the statistics to this file")
+    parser.add_argument('--profile', action='store_true', help="also profile a separate, uninstrumented run")
+    args = parser.parse_args()
+
+    begin = time.perf_counter()
+    workload(args.depth)
+    plain = time.perf_counter() - begin
+    with instrumented() as stats:
+        with stats.timer('workload'):
+            workload(args.depth)
+    stats.report()
+    print(f"\nworkload {plain:.2f}s plain, {stats.timings['workload'][1]:.2f}s instrumented")
+    if args.profile:
+        #a pass of its own: under the instrumentation cProfile would charge the wrappers
+        print()
+        profile(workload, args.depth)
+    if args.json:
+        stats.dump(args.json)
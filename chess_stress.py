@@ -0,0 +1,82 @@
+"""Make/unmake stress run: random games where every legal move is pushed and
+undone, checking that the complete position state comes back each time.
+
+Run with: python chess_stress.py [round trips] [array|bitboard] [seed]
+"""
+import random, sys, time
+
+from chess import ChessGame
+from chess_bitboard import BitboardChessGame
+from chess_perft import POSITIONS
+
+BACKENDS = {'array': ChessGame, 'bitboard': BitboardChessGame}
+
+
+def state(game):
+    """Everything push_move may change and undo_move must restore"""
+    return (game.to_bytes(), game.moved, game.en_passant_target, game.white_king_pos, game.black_king_pos,
+            game.current_player, game.zobrist_key, game.ply, game.halfmove_clock, tuple(game.flat_board()))
+
+
+def check_consistency(game):
+    """Check derived state against the board: recomputed key and, for bitboards, every mask"""
+    if game.zobrist_key != game.compute_zobrist_key():
+        raise AssertionError("Zobrist key out of sync with the board")
+    if isinstance(game, BitboardChessGame):
+        rebuilt = BitboardChessGame()
+        rebuilt.board = game.board
+        if (rebuilt.bitboards, rebuilt.occupancy, rebuilt.occupied) != (game.bitboards, game.occupancy, game.occupied):
+            raise AssertionError("bitboards out of sync with the mailbox")
+
+
+def stress(round_trips=1000000, backend='bitboard', seed=0, max_plies=200):
+    """Play random games, round-tripping every legal move at each position.
+
+    Every few plies a random number of moves is also taken back at once and
+    replayed. Raises AssertionError on the first state that isn't restored.
+    """
+    rng = random.Random(seed)
+    game = BACKENDS[backend]()
+    line = [] #moves played since the last reset, for taking back and replaying
+    done = 0
+    begin = time.perf_counter()
+    while done < round_trips:
+        if game.ply >= max_plies or not game.has_legal_moves() or game.is_threefold_repetition():
+            game.load_fen(rng.choice(POSITIONS)[1])
+            line = []
+
+        before = state(game)
+        moves = list(game.legal_moves())
+        for move in moves:
+            game.push_move(*move)
+            game.undo_move()
+            if state(game) != before:
+                raise AssertionError(f"state not restored after {move} from {before[0].hex()}")
+        done += len(moves)
+
+        #take back a whole line of moves, then replay it
+        if line and rng.random() < 0.1:
+            depth = rng.randint(1, len(line))
+            for _ in range(depth):
+                game.undo_move()
+            check_consistency(game)
+            for move in line[-depth:]:
+                game.push_move(*move)
+            if state(game) != before:
+                raise AssertionError(f"state not restored after taking back and replaying {depth} moves")
+            done += depth
+
+        move = rng.choice(moves)
+        game.push_move(*move)
+        line.append(move)
+        check_consistency(game)
+
+    elapsed = time.perf_counter() - begin
+    print(f"{backend}: {done:,} round trips in {elapsed:.1f}s ({done / elapsed:,.0f}/s), all restored")
+
+
+if __name__ == "__main__":
+    trips = int(sys.argv[1]) if len(sys.argv) > 1 else 1000000
+    backend = sys.argv[2] if len(sys.argv) > 2 else 'bitboard'
+    seed = int(sys.argv[3]) if len(sys.argv) > 3 else 0
+    stress(trips, backend, seed)
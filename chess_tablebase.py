@@ -0,0 +1,314 @@
+"""Endgame tablebases for king and one piece against a lone king (KQK, KRK, KPK).
+
+Every placement of the three pieces with either side to move gets a dense
+index, (side * 64 + strong king) * 4096 + weak king * 64 + piece. The
+generator builds the move graph over all indices on a process pool (one
+task per side and strong king square) and then solves it backwards from
+the mates, one ply per pass, with NumPy reductions over the graph:
+
+- a position is won in n plies if a move reaches one lost in n - 1,
+- it is lost in n plies if every move reaches a won position, the longest
+  win taking n - 1 plies.
+
+What is never reached is a draw. KPK promotions look their result up in the
+KQK and KRK tables, so those are built first. Each table is stored as
+distance-to-mate codes bit-packed at the smallest width that holds them
+(0 = draw or illegal, else plies to mate + 1), and read back through mmap.
+The tables have white as the side with the piece; positions where black has
+it are probed with the board mirrored.
+
+    python chess_tablebase.py generate DIRECTORY [--workers N]
+    python chess_tablebase.py bench DIRECTORY
+"""
+import argparse, mmap, os, random, struct, time
+from concurrent.futures import ProcessPoolExecutor
+
+import numpy as np
+
+from chess_attacks import (WHITE, KING_TARGETS, KING_ATTACKS, KNIGHT_ATTACKS, PAWN_ATTACKS,
+                           rook_attacks, bishop_attacks, queen_attacks)
+
+SIGNATURES = ('KQK', 'KRK', 'KPK')
+SIZE = 2 * 64 * 64 * 64
+HEADER = struct.Struct('<4s4sBxxxI') #magic, signature, bits per entry, entries
+MAGIC = b'CGTB'
+
+#position status found by the move graph builder
+ILLEGAL, NORMAL, MATED, STALEMATE = 0, 1, 2, 3
+#solver values: plies to mate from the side to move, or one of these
+UNKNOWN, DRAW = -1, -2
+#moves that leave the table (captures, promotions) point past its end at
+#SIZE + value + 2, so they can be gathered from one array with the table
+_FIXED_VALUES = np.arange(DRAW, 256 - 2, dtype=np.int16)
+
+
+def index(white_to_move, strong_king, weak_king, piece):
+    return ((0 if white_to_move else 64) + strong_king) * 4096 + weak_king * 64 + piece
+
+
+def _piece_attacks(piece, sq, occupied):
+    if piece == 'Q':
+        return queen_attacks(sq, occupied)
+    if piece == 'R':
+        return rook_attacks(sq, occupied)
+    if piece == 'B':
+        return bishop_attacks(sq, occupied)
+    if piece == 'N':
+        return KNIGHT_ATTACKS[sq]
+    return PAWN_ATTACKS[WHITE][sq]
+
+
+#per-process solved tables a KPK worker looks promotions up in
+_promotions = {}
+
+
+def _init_worker(promotions):
+    _promotions.update(promotions)
+
+
+def _external(value):
+    return SIZE + int(value) + 2
+
+
+def _build_moves(task):
+    """Return (status, move counts, successor indices) of the 4096 positions of one side and strong king"""
+    signature, black_to_move, wk = task
+    piece = signature[1]
+    status = np.zeros(4096, dtype=np.int8)
+    degree = np.zeros(4096, dtype=np.int32)
+    successors = []
+    wk_bit = 1 << wk
+    for bk in range(64):
+        if bk == wk or KING_ATTACKS[wk] >> bk & 1:
+            continue
+        for xs in range(64):
+            if xs == wk or xs == bk or (piece == 'P' and (xs < 8 or xs >= 56)):
+                continue
+            occupied = wk_bit | 1 << bk | 1 << xs
+            check = _piece_attacks(piece, xs, occupied) >> bk & 1
+            i = bk * 64 + xs
+            count = 0
+            if not black_to_move:
+                if check:
+                    continue #the side not to move can't be in check
+                for s in KING_TARGETS[wk]:
+                    if s != xs and not KING_ATTACKS[bk] >> s & 1:
+                        successors.append(index(False, s, bk, xs))
+                        count += 1
+                if piece != 'P':
+                    targets = _piece_attacks(piece, xs, occupied) & ~occupied
+                    while targets:
+                        s = (targets & -targets).bit_length() - 1
+                        targets &= targets - 1
+                        successors.append(index(False, wk, bk, s))
+                        count += 1
+                elif not occupied >> (xs + 8) & 1:
+                    s = xs + 8
+                    if s >= 56:
+                        for promoted in ('KQK', 'KRK'):
+                            successors.append(_external(_promotions[promoted][index(False, wk, bk, s)]))
+                        successors.append(_external(DRAW)) #bishop and knight can't mate
+                        count += 3
+                    else:
+                        successors.append(index(False, wk, bk, s))
+                        count += 1
+                        if xs < 16 and not occupied >> (s + 8) & 1:
+                            successors.append(index(False, wk, bk, s + 8))
+                            count += 1
+            else:
+                #squares the weak king can't go to; the piece's rays pass through its current square
+                attacked = KING_ATTACKS[wk] | _piece_attacks(piece, xs, wk_bit | 1 << xs)
+                for s in KING_TARGETS[bk]:
+                    if attacked >> s & 1:
+                        continue
+                    #taking the undefended piece leaves two bare kings
+                    successors.append(_external(DRAW) if s == xs else index(True, wk, s, xs))
+                    count += 1
+            degree[i] = count
+            status[i] = NORMAL if count else (MATED if check else STALEMATE)
+    return status, degree, np.array(successors, dtype=np.int32)
+
+
+def solve(signature, workers=None, promotions=None):
+    """Build and solve one table, return its values: plies to mate for the side to move, or DRAW"""
+    tasks = [(signature, black, wk) for black in (False, True) for wk in range(64)]
+    with ProcessPoolExecutor(workers, initializer=_init_worker, initargs=(promotions or {},)) as pool:
+        parts = list(pool.map(_build_moves, tasks, chunksize=4))
+    status = np.concatenate([part[0] for part in parts])
+    degree = np.concatenate([part[1] for part in parts])
+    successors = np.concatenate([part[2] for part in parts])
+
+    values = np.full(SIZE, UNKNOWN, dtype=np.int16)
+    values[status == MATED] = 0
+    values[(status == ILLEGAL) | (status == STALEMATE)] = DRAW
+    has_moves = degree > 0
+    starts = (np.cumsum(degree) - degree)[has_moves]
+    #promotions can lead into long wins, so keep going until past them
+    longest_fixed = int(successors[successors >= SIZE].max()) - SIZE - 2 if (successors >= SIZE).any() else 0
+
+    n = 1
+    quiet = 0
+    while quiet < 2 or n <= longest_fixed + 2:
+        reached = np.concatenate([values, _FIXED_VALUES])[successors]
+        open_positions = values[has_moves] == UNKNOWN
+        if n & 1:
+            #a move to a position lost in n - 1 plies
+            found = np.logical_or.reduceat(reached == n - 1, starts) & open_positions
+        else:
+            #every move goes to a won position, the slowest win taking n - 1 plies
+            won = (reached >= 0) & (reached & 1 == 1)
+            found = (np.logical_and.reduceat(won, starts) & (np.maximum.reduceat(reached, starts) == n - 1)
+                     & open_positions)
+        found_indices = np.flatnonzero(has_moves)[found]
+        values[found_indices] = n
+        quiet = 0 if len(found_indices) else quiet + 1
+        n += 1
+    values[values == UNKNOWN] = DRAW
+    return values
+
+
+def write_table(path, signature, values):
+    """Bit-pack solved values into a table file, return its size in bytes"""
+    codes = np.where(values >= 0, values + 1, 0).astype(np.uint32)
+    width = max(int(codes.max()).bit_length(), 1)
+    bits = (codes[:, None] >> np.arange(width, dtype=np.uint32)) & 1
+    packed = np.packbits(bits.astype(np.uint8).ravel(), bitorder='little')
+    with open(path, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, signature.encode(), width, len(codes)))
+        out.write(packed.tobytes())
+        out.write(bytes(4)) #so a probe can always read 4 bytes
+    return os.path.getsize(path)
+
+
+def generate(directory, workers=None):
+    """Generate every table into directory, printing the time and file size of each"""
+    os.makedirs(directory, exist_ok=True)
+    solved = {}
+    for signature in SIGNATURES:
+        begin = time.perf_counter()
+        promotions = {name: solved[name] for name in ('KQK', 'KRK')} if signature == 'KPK' else None
+        solved[signature] = solve(signature, workers, promotions)
+        path = os.path.join(directory, signature + '.tb')
+        size = write_table(path, signature, solved[signature])
+        values = solved[signature]
+        print(f"{signature}: {time.perf_counter() - begin:.1f}s, {size:,} bytes, "
+              f"{int((values > 0).sum()):,} decisive positions, longest mate {int(values.max())} plies")
+
+
+class Tablebases:
+    """Probe the tables in a directory. Files are mapped when first needed."""
+
+    def __init__(self, directory):
+        self.directory = directory
+        self._tables = {}
+
+    def close(self):
+        for table in self._tables.values():
+            if table:
+                table[2].close()
+                table[3].close()
+        self._tables = {}
+
+    def _table(self, signature):
+        if signature not in self._tables:
+            path = os.path.join(self.directory, signature + '.tb')
+            table = None
+            if os.path.exists(path):
+                file = open(path, 'rb')
+                data = mmap.mmap(file.fileno(), 0, access=mmap.ACCESS_READ)
+                magic, _, width, _ = HEADER.unpack_from(data)
+                if magic != MAGIC:
+                    raise ValueError(f"{path} is not a tablebase file")
+                table = (width, (1 << width) - 1, data, file)
+            self._tables[signature] = table
+        return self._tables[signature]
+
+    def probe(self, game):
+        """Return (result, plies) for the side to move, or None if no table covers the position.
+
+        result is 1 for a win, -1 for a loss and 0 for a draw; plies is the
+        distance to mate (0 for a draw).
+        """
+        pieces = [(sq, piece) for sq, piece in enumerate(game.flat_board()) if piece != '.']
+        if len(pieces) > 3 or game.castling_rights():
+            return None
+        others = [(sq, piece) for sq, piece in pieces if piece not in 'Kk']
+        if not others or others[0][1] in 'BNbn':
+            return 0, 0 #no mating material
+        sq, piece = others[0]
+        kings = {piece: sq for sq, piece in pieces if piece in 'Kk'}
+        white_to_move = game.current_player == 'white'
+        if piece.isupper():
+            i = index(white_to_move, kings['K'], kings['k'], sq)
+        else:
+            #mirror the board so the side with the piece is white
+            i = index(not white_to_move, kings['k'] ^ 56, kings['K'] ^ 56, sq ^ 56)
+        table = self._table('K' + piece.upper() + 'K')
+        if table is None:
+            return None
+        width, mask, data, _ = table
+        bit = i * width
+        code = int.from_bytes(data[HEADER.size + (bit >> 3):HEADER.size + (bit >> 3) + 4], 'little') >> (bit & 7) & mask
+        if not code:
+            return 0, 0
+        plies = code - 1
+        return (1 if plies & 1 else -1), plies
+
+    def best_move(self, game):
+        """Return the move keeping the best result: fastest win, slowest loss. None if not covered."""
+        if self.probe(game) is None:
+            return None
+        best, best_rank = None, None
+        for move in list(game.legal_moves()):
+            game.push_move(*move)
+            #a move leaving the tables (a promotion past KPK) is worth searching, rank it as a draw
+            result, plies = self.probe(game) or (0, 0)
+            game.undo_move()
+            #the opponent's loss is our win: wins first (short), then draws, then losses (long)
+            rank = (-result, -plies if result < 0 else plies)
+            if best_rank is None or rank > best_rank:
+                best, best_rank = move, rank
+        return best
+
+
+def bench(directory, probes=20000, seed=0):
+    """Print file sizes and the probe latency on random legal positions of each table"""
+    from chess_bitboard import BitboardChessGame
+    rng = random.Random(seed)
+    tablebases = Tablebases(directory)
+    for signature in SIGNATURES:
+        path = os.path.join(directory, signature + '.tb')
+        games = []
+        while len(games) < 200:
+            wk, bk, xs = rng.sample(range(64), 3)
+            if KING_ATTACKS[wk] >> bk & 1 or (signature == 'KPK' and not 8 <= xs < 56):
+                continue
+            side = rng.choice('wb')
+            placement = ['.'] * 64
+            placement[wk], placement[bk], placement[xs] = 'K', 'k', signature[1]
+            fen = '/'.join(''.join(placement[row * 8:row * 8 + 8]) for row in range(7, -1, -1))
+            for digit in range(8, 0, -1):
+                fen = fen.replace('.' * digit, str(digit))
+            game = BitboardChessGame()
+            game.load_fen(f"{fen} {side} - - 0 1")
+            if not game.is_in_check('black' if side == 'w' else 'white'):
+                games.append(game)
+
+        begin = time.perf_counter()
+        for i in range(probes):
+            tablebases.probe(games[i % len(games)])
+        elapsed = time.perf_counter() - begin
+        print(f"{signature}: {os.path.getsize(path):,} bytes, {elapsed / probes * 1e6:.1f} us per probe")
+    tablebases.close()
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Generate or benchmark the endgame tablebases")
+    parser.add_argument('command', choices=['generate', 'bench'])
+    parser.add_argument('directory')
+    parser.add_argument('--workers', type=int, default=None, help="processes for generation")
+    args = parser.parse_args()
+    if args.command == 'generate':
+        generate(args.directory, args.workers)
+    else:
+        bench(args.directory)
@@ -0,0 +1,288 @@
+"""Engine-vs-engine matches for ChessGame players.
+
+Each opening is played twice with the colours swapped, games run in
+parallel on a process pool, and every finished game is written to a JSONL
+file with its result, timing and node counts. The match ends after the given
+number of games or earlier when the SPRT between two Elo hypotheses decides.
+
+Players are given as specs:
+
+    random        a uniformly random legal move
+    depth:N       the search engine to N plies
+    time:S        the search engine with S seconds per move
+
+    python chess_tournament.py depth:3 random --games 200 --out games.jsonl
+    python chess_tournament.py time:0.2 depth:2 --sprt 0 50 --openings openings.txt
+    python chess_tournament.py --check
+
+An openings file holds one start position per line, either a FEN or
+coordinate moves from the start position (e2e4 e7e5).
+"""
+import argparse, json, math, os, random, time
+from concurrent.futures import ProcessPoolExecutor, wait, FIRST_COMPLETED
+
+from chess_bitboard import BitboardChessGame
+from chess_engine import Engine
+from chess_pgn import START_FEN
+
+OPENINGS = ['', 'e2e4 e7e5', 'd2d4 d7d5', 'c2c4 e7e5', 'e2e4 c7c5', 'd2d4 g8f6', 'g1f3 d7d5',
+            'e2e4 e7e6', 'e2e4 c7c6', 'd2d4 g8f6 c2c4 e7e6', 'e2e4 e7e5 g1f3 b8c6', 'e2e4 d7d5']
+
+
+def parse_player(spec):
+    """Check a player spec and return it as (kind, amount)"""
+    kind, _, amount = spec.partition(':')
+    if kind == 'random' and not amount:
+        return kind, None
+    if kind == 'depth' and amount.isdigit():
+        return kind, int(amount)
+    if kind == 'time':
+        return kind, float(amount)
+    raise ValueError(f"Unknown player {spec!r}, use random, depth:N or time:S")
+
+
+def setup_opening(game, opening):
+    """Set up an opening line: a FEN or coordinate moves from the start position"""
+    if '/' in opening:
+        game.load_fen(opening)
+        return
+    game.load_fen(START_FEN)
+    for text in opening.split():
+        move = (game.algebraic_to_index(text[:2]), game.algebraic_to_index(text[2:4]), text[4:] or None)
+        if move not in list(game.legal_moves()):
+            raise ValueError(f"Illegal opening move {text} in {opening!r}")
+        game.push_move(*move)
+
+
+def insufficient_material(game):
+    """Only kings, or kings and one minor piece, are left"""
+    pieces = [piece for piece in game.flat_board() if piece != '.' and piece not in 'Kk']
+    return not pieces or (len(pieces) == 1 and pieces[0] in 'BNbn')
+
+
+def game_end(game, moves):
+    """(result, reason) if the game is over in this position with these legal moves, else None"""
+    if not moves:
+        if game.is_in_check():
+            return ('0-1' if game.current_player == 'white' else '1-0'), 'checkmate'
+        return '1/2-1/2', 'stalemate'
+    if game.is_threefold_repetition():
+        return '1/2-1/2', 'threefold repetition'
+    if game.halfmove_clock >= 100:
+        return '1/2-1/2', 'fifty moves'
+    if insufficient_material(game):
+        return '1/2-1/2', 'insufficient material'
+    return None
+
+
+def play_game(task):
+    """Play one game and return its record as a dict"""
+    number, opening, white, black, max_plies = task
+    game = BitboardChessGame()
+    setup_opening(game, opening)
+    rng = random.Random(number)
+    specs = {'white': white, 'black': black}
+    engines = {color: Engine() for color in specs if parse_player(specs[color])[0] != 'random'}
+    stats = {color: {'time': 0.0, 'nodes': 0, 'moves': 0} for color in specs}
+
+    begin = time.perf_counter()
+    result, reason = '1/2-1/2', 'max plies'
+    #one check more than plies, so a game ended by the last move is scored by how it ended
+    for ply in range(max_plies + 1):
+        color = game.current_player
+        moves = list(game.legal_moves())
+        ending = game_end(game, moves)
+        if ending:
+            result, reason = ending
+            break
+        if ply == max_plies:
+            break
+
+        kind, amount = parse_player(specs[color])
+        started = time.perf_counter()
+        if kind == 'random':
+            move = rng.choice(moves)
+        else:
+            engine = engines[color]
+            move, _ = engine.search(game, amount if kind == 'time' else None,
+                                    amount if kind == 'depth' else None, info=None)
+            stats[color]['nodes'] += engine.nodes
+        stats[color]['time'] += time.perf_counter() - started
+        stats[color]['moves'] += 1
+        game.push_move(*move)
+
+    return {'game': number, 'opening': opening, 'white': white, 'black': black, 'result': result,
+            'reason': reason, 'plies': game.ply, 'seconds': round(time.perf_counter() - begin, 3),
+            'stats': {color: {'time': round(s['time'], 3), 'nodes': s['nodes'], 'moves': s['moves']}
+                      for color, s in stats.items()},
+            'fen': game.to_fen()}
+
+
+def expected_score(elo):
+    return 1 / (1 + 10 ** (-elo / 400))
+
+
+def elo_from_score(score):
+    score = min(max(score, 1e-6), 1 - 1e-6)
+    return -400 * math.log10(1 / score - 1)
+
+
+class Match:
+    """Running wins, draws and losses of the first player, with Elo and SPRT"""
+
+    def __init__(self, elo0=0.0, elo1=10.0, alpha=0.05, beta=0.05):
+        self.wins = self.draws = self.losses = 0
+        self.elo0, self.elo1 = elo0, elo1
+        self.lower = math.log(beta / (1 - alpha))
+        self.upper = math.log((1 - beta) / alpha)
+
+    @property
+    def games(self):
+        return self.wins + self.draws + self.losses
+
+    def add(self, record):
+        """Count a finished game; the first player has white in the even numbered games"""
+        if record['result'] == '1/2-1/2':
+            self.draws += 1
+        elif (record['result'] == '1-0') == (record['game'] % 2 == 0):
+            self.wins += 1
+        else:
+            self.losses += 1
+
+    def _score_variance(self, pseudo=0.0):
+        """Mean and variance of the game scores, with pseudo games of half a win and half a loss added"""
+        wins, losses = self.wins + pseudo / 2, self.losses + pseudo / 2
+        n = self.games + pseudo
+        score = (wins + self.draws / 2) / n
+        variance = (wins * (1 - score) ** 2 + self.draws * (0.5 - score) ** 2 + losses * score ** 2) / n
+        return score, variance
+
+    def elo(self):
+        """Return (Elo difference, 95% error bar) of the first player"""
+        if not self.games:
+            return 0.0, float('inf')
+        score, variance = self._score_variance()
+        if not variance:
+            return elo_from_score(score), float('inf') #all one result says little yet
+        margin = 1.96 * math.sqrt(variance / self.games)
+        return elo_from_score(score), (elo_from_score(score + margin) - elo_from_score(score - margin)) / 2
+
+    def llr(self):
+        """Log-likelihood ratio of elo1 against elo0, normal approximation of the game scores"""
+        if not self.games:
+            return 0.0
+        #one pseudo game keeps the variance above 0, so a clean sweep still decides
+        score, variance = self._score_variance(pseudo=1)
+        s0, s1 = expected_score(self.elo0), expected_score(self.elo1)
+        return (self.games + 1) * ((score - s0) ** 2 - (score - s1) ** 2) / (2 * variance)
+
+    def sprt(self):
+        """'H1' or 'H0' once the test decides, else None"""
+        llr = self.llr()
+        if llr >= self.upper:
+            return 'H1'
+        if llr <= self.lower:
+            return 'H0'
+        return None
+
+
+def _tasks(first, second, games, openings, max_plies):
+    """Yield play_game tasks: opening i with first as white in game 2i and as black in game 2i + 1"""
+    for n in range(games):
+        white, black = (first, second) if n % 2 == 0 else (second, first)
+        yield n, openings[n // 2 % len(openings)], white, black, max_plies
+
+
+def run(first, second, games=100, workers=None, openings=OPENINGS, out=None, sprt=None, max_plies=300):
+    """Play first against second, print progress and the final Elo, return the Match.
+
+    sprt=(elo0, elo1) stops the match as soon as the test accepts either.
+    """
+    parse_player(first)
+    parse_player(second)
+    workers = workers or os.cpu_count() or 1
+    match = Match(*sprt) if sprt else Match()
+    tasks = _tasks(first, second, games, openings, max_plies)
+    decision = None
+    begin = time.perf_counter()
+    log = open(out, 'w') if out else None
+    try:
+        with ProcessPoolExecutor(workers) as pool:
+            pending = set()
+            while True:
+                #once SPRT decides, the games still running finish but no new ones start
+                while len(pending) < 2 * workers and decision is None:
+                    task = next(tasks, None)
+                    if task is None:
+                        break
+                    pending.add(pool.submit(play_game, task))
+                if not pending:
+                    break
+                done, pending = wait(pending, return_when=FIRST_COMPLETED)
+                for future in done:
+                    record = future.result()
+                    match.add(record)
+                    if log:
+                        log.write(json.dumps(record) + '\n')
+                    elo, margin = match.elo()
+                    print(f"game {record['game']:>4} {record['white']} - {record['black']}: {record['result']:<7} "
+                          f"({record['reason']}, {record['plies']} plies, {record['seconds']:.1f}s)  "
+                          f"+{match.wins} ={match.draws} -{match.losses}  Elo {elo:+.0f} +/- {margin:.0f}"
+                          + (f"  LLR {match.llr():.2f}" if sprt else ''))
+                    if sprt and decision is None:
+                        decision = match.sprt()
+    finally:
+        if log:
+            log.close()
+
+    elapsed = time.perf_counter() - begin
+    elo, margin = match.elo()
+    print(f"\n{first} vs {second}: {match.games} games in {elapsed:.1f}s, +{match.wins} ={match.draws} -{match.losses}")
+    print(f"Elo difference {elo:+.1f} +/- {margin:.1f} (95%)")
+    if sprt:
+        verdict = {'H1': f"accepted elo1 = {match.elo1}", 'H0': f"accepted elo0 = {match.elo0}"}
+        print(f"SPRT [{match.elo0}, {match.elo1}]: LLR {match.llr():.2f} in "
+              f"[{match.lower:.2f}, {match.upper:.2f}], {verdict.get(decision, 'no decision')}")
+    return match
+
+
+def check():
+    """SPRT decisions of Match on sweeps, all draws, and scores too close or too short to decide"""
+    for wins, draws, losses, expected in ((30, 0, 0, 'H1'), (0, 0, 30, 'H0'), (0, 300, 0, 'H0'),
+                                          (100, 0, 100, None), (3, 0, 0, None)):
+        match = Match(0, 10)
+        match.wins, match.draws, match.losses = wins, draws, losses
+        if match.sprt() != expected:
+            raise AssertionError(f"+{wins} ={draws} -{losses} gives {match.sprt()}, expected {expected}")
+        print(f"ok   +{wins} ={draws} -{losses}: LLR {match.llr():.2f}, {match.sprt()}")
+    #a sweep stops the test early: the first game count where it decides
+    match = Match(0, 10)
+    while match.sprt() is None:
+        match.wins += 1
+    print(f"ok   a clean sweep accepts H1 after {match.wins} games")
+
+
+def read_openings(path):
+    with open(path) as lines:
+        return [line.strip() for line in lines if line.strip() and not line.startswith('#')]
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Play a match between two players")
+    parser.add_argument('first', nargs='?', help="random, depth:N or time:S")
+    parser.add_argument('second', nargs='?')
+    parser.add_argument('--games', type=int, default=100)
+    parser.add_argument('--workers', type=int, default=None)
+    parser.add_argument('--openings', help="file with one FEN or move line per opening")
+    parser.add_argument('--out', help="JSONL file for the game records")
+    parser.add_argument('--sprt', type=float, nargs=2, metavar=('ELO0', 'ELO1'), help="stop early on an SPRT decision")
+    parser.add_argument('--max-plies', type=int, default=300, help="adjudicate longer games as draws")
+    parser.add_argument('--check', action='store_true', help="check the SPRT decisions")
+    args = parser.parse_args()
+    if args.check:
+        check()
+    elif not args.second:
+        parser.error("give two players")
+    else:
+        run(args.first, args.second, args.games, args.workers,
+            read_openings(args.openings) if args.openings else OPENINGS, args.out, args.sprt, args.max_plies)
@@ -0,0 +1,381 @@
+"""UCI front end for the ChessGame engine.
+
+    python chess_uci.py          #speak UCI on stdin/stdout
+    python chess_uci.py --check  #drive a UCI subprocess through a scripted session
+
+Commands are read on an asyncio event loop while a search runs in a worker
+thread, so isready, stop and ponderhit are answered during the search.
+position commands are applied incrementally: when the new move list extends
+(or shares a start with) the last one, only the differing moves are undone
+and pushed instead of setting the game up again.
+"""
+import argparse, asyncio, sys, threading, time
+
+from chess_bitboard import BitboardChessGame
+from chess_engine import Engine, TranspositionTable, MATE, move_to_string
+from chess_pgn import START_FEN
+
+#time kept back per move for the GUI and pipe overhead, in seconds
+MOVE_OVERHEAD = 0.05
+#seconds to think after a ponderhit when the go ponder had no clock to budget from
+PONDER_MOVETIME = 1.0
+FILES = 'abcdefgh'
+RANKS = '12345678'
+
+
+def _number(text):
+    """The int value of a go parameter, or None if it isn't one"""
+    try:
+        return int(text)
+    except ValueError:
+        return None
+
+
+class UciEngine:
+    """State of one UCI session: the game, the engine and the running search"""
+
+    def __init__(self, out=sys.stdout):
+        self.out = out
+        self._lock = threading.Lock()
+        self.game = BitboardChessGame()
+        self.engine = Engine()
+        self.book = None
+        #the position command last applied: its start position and moves
+        self.base_fen = START_FEN
+        self.moves = []
+        self.search = None
+        self._stop = threading.Event()
+        #while pondering there is no deadline until ponderhit sets one
+        self.pondering = False
+        self.deadline = None
+        self._ponder_budget = None
+        #the position as the search started, d shows it while the worker moves pieces about
+        self._search_fen = None
+
+    def send(self, line):
+        with self._lock:
+            self.out.write(line + '\n')
+            self.out.flush()
+
+    async def run(self, reader):
+        """Handle commands from a StreamReader until quit or end of input"""
+        while True:
+            line = await reader.readline()
+            if not line:
+                break
+            if not await self.handle(line.decode().strip()):
+                break
+        await self.stop_search()
+
+    async def handle(self, line):
+        """Handle one command line, return False on quit"""
+        tokens = line.split()
+        if not tokens:
+            return True
+        command, args = tokens[0], tokens[1:]
+        #one bad line from the GUI is reported and skipped, it doesn't end the session
+        try:
+            return await self._command(command, args)
+        except Exception as error:
+            self.send(f"info string error in {line!r}: {error!r}")
+            return True
+
+    async def _command(self, command, args):
+        if command == 'uci':
+            self.send('id name ChessGame')
+            self.send('id author Automate_boring_stuff')
+            self.send('option name Hash type spin default 16 min 1 max 1024')
+            self.send('option name BookFile type string default <empty>')
+            self.send('option name TablebasePath type string default <empty>')
+            self.send('uciok')
+        elif command == 'isready':
+            self.send('readyok')
+        elif command == 'setoption':
+            await self.stop_search()
+            self.set_option(args)
+        elif command == 'ucinewgame':
+            await self.stop_search()
+            self.engine.tt.clear()
+            self.set_position(['startpos'])
+        elif command == 'position':
+            await self.stop_search()
+            self.set_position(args)
+        elif command == 'go':
+            await self.stop_search()
+            self.go(args)
+        elif command == 'stop':
+            self._stop.set()
+        elif command == 'ponderhit':
+            self.pondering = False
+            if self._ponder_budget:
+                self.deadline = time.perf_counter() + self._ponder_budget
+        elif command == 'd':
+            self.send(f"Fen: {self._search_fen if self.search is not None else self.game.to_fen()}")
+        elif command == 'quit':
+            return False
+        else:
+            self.send(f"info string unknown command {command}")
+        return True
+
+    def set_option(self, args):
+        """setoption name <name> value <value>"""
+        text = ' '.join(args)
+        name, _, value = text.partition(' value ')
+        name = name.replace('name', '', 1).strip().lower()
+        value = value.strip()
+        if name == 'hash':
+            #a table slot is a tuple of about 100 bytes
+            self.engine.tt = TranspositionTable(max(1, int(value)) * (1 << 20) // 100)
+        elif name == 'bookfile':
+            from chess_book import OpeningBook
+            self.book = OpeningBook(value) if value and value != '<empty>' else None
+        elif name == 'tablebasepath':
+            from chess_tablebase import Tablebases
+            self.engine.tablebases = Tablebases(value) if value and value != '<empty>' else None
+
+    def set_position(self, args):
+        """position startpos|fen <fen> [moves ...], reusing as much of the current game as possible"""
+        if 'moves' in args:
+            split = args.index('moves')
+            args, moves = args[:split], args[split + 1:]
+        else:
+            moves = []
+        fen = START_FEN if args[:1] == ['startpos'] else ' '.join(args[1:])
+
+        if fen == self.base_fen:
+            common = 0
+            while common < min(len(moves), len(self.moves)) and moves[common] == self.moves[common]:
+                common += 1
+            for _ in range(len(self.moves) - common):
+                self.game.undo_move()
+        else:
+            try:
+                self.game.load_fen(fen)
+            except (ValueError, IndexError) as error:
+                #the game is unchanged, but nothing is reused from it: the next position sets up afresh
+                self.base_fen = None
+                self.moves = []
+                self.send(f"info string bad fen: {error}")
+                return
+            self.base_fen = fen
+            common = 0
+        del self.moves[common:]
+
+        for text in moves[common:]:
+            move = self.parse_move(text)
+            if move is None:
+                self.send(f"info string illegal move {text}")
+                break
+            self.game.push_move(*move)
+            self.moves.append(text)
+
+    def parse_move(self, text):
+        """Return the legal move for coordinate notation like e7e8q, or None"""
+        if not (4 <= len(text) <= 5 and text[0] in FILES and text[1] in RANKS and text[2] in FILES
+                and text[3] in RANKS and text[4:] in ('', 'q', 'r', 'b', 'n')):
+            return None
+        start = self.game.algebraic_to_index(text[:2])
+        end = self.game.algebraic_to_index(text[2:4])
+        move = (start, end, text[4:] or None)
+        for legal in self.game.legal_moves():
+            if legal == move:
+                return legal
+        return None
+
+    def go(self, args):
+        """Start a search in a worker thread"""
+        params = {}
+        flags = set()
+        root_moves = None
+        i = 0
+        while i < len(args):
+            if args[i] in ('infinite', 'ponder'):
+                flags.add(args[i])
+            elif args[i] == 'searchmoves':
+                root_moves = [move for move in map(self.parse_move, args[i + 1:]) if move]
+                break
+            elif i + 1 < len(args):
+                value = _number(args[i + 1])
+                if value is None:
+                    self.send(f"info string bad value {args[i + 1]} for {args[i]}")
+                else:
+                    params[args[i]] = value
+                i += 1
+            i += 1
+
+        budget = self._budget(params)
+        infinite = 'infinite' in flags
+        self.pondering = 'ponder' in flags
+        self._ponder_budget = (PONDER_MOVETIME if budget is None else budget) if self.pondering else None
+        self.deadline = None if self.pondering or budget is None else time.perf_counter() + budget
+        self._stop.clear()
+        self._search_fen = self.game.to_fen()
+        loop = asyncio.get_running_loop()
+        #a timed search also gets the budget as its time limit, so it won't start an iteration it can't finish
+        time_limit = None if self.pondering else budget
+        self.search = loop.run_in_executor(None, self._search, time_limit, params.get('depth'), root_moves, infinite)
+
+    def _budget(self, params):
+        """Seconds to spend on this move from the go parameters, None for no limit"""
+        if 'movetime' in params:
+            return max(params['movetime'] / 1000 - MOVE_OVERHEAD, 0.01)
+        white = self.game.current_player == 'white'
+        left = params.get('wtime' if white else 'btime')
+        if left is None:
+            return None
+        increment = params.get('winc' if white else 'binc', 0)
+        share = left / params.get('movestogo', 30) + increment * 0.8
+        #never plan on more than half of what is left
+        return max(min(share, left / 2) / 1000 - MOVE_OVERHEAD, 0.01)
+
+    def _should_stop(self):
+        return self._stop.is_set() or (self.deadline is not None and time.perf_counter() > self.deadline)
+
+    def _search(self, time_limit, depth, root_moves, infinite):
+        """Worker thread: search, then report bestmove once UCI allows it"""
+        move = None
+        if self.book and not infinite and not root_moves:
+            move = self.book.random_move(self.game)
+        ponder = None
+        if move is None:
+            move, _ = self.engine.search(self.game, time_limit, depth, info=self._info,
+                                         stop=self._should_stop, root_moves=root_moves)
+            if move:
+                pv = self.engine.principal_variation(self.game, max(self.engine.depth, 2))
+                if len(pv) > 1 and pv[0] == move:
+                    self.game.push_move(*move)
+                    ponder = move_to_string(self.game, pv[1])
+                    self.game.undo_move()
+        #infinite and ponder searches answer only after stop (or ponderhit)
+        while (infinite or self.pondering) and not self._stop.wait(0.01):
+            pass
+        if move is None:
+            self.send('bestmove 0000')
+        else:
+            self.send(f"bestmove {move_to_string(self.game, move)}" + (f" ponder {ponder}" if ponder else ''))
+
+    def _info(self, info):
+        score = info['score']
+        if abs(score) > MATE - 1000:
+            plies = MATE - abs(score)
+            score_text = f"mate {(plies + 1) // 2 if score > 0 else -(plies // 2)}"
+        else:
+            score_text = f"cp {score}"
+        self.send(f"info depth {info['depth']} score {score_text} nodes {info['nodes']} nps {info['nps']} "
+                  f"time {int(info['time'] * 1000)} pv {' '.join(info['pv'])}")
+
+    async def stop_search(self):
+        """Stop a running search and wait until its bestmove is out"""
+        if self.search is not None:
+            self._stop.set()
+            self.pondering = False
+            await self.search
+            self.search = None
+
+
+async def serve():
+    """Run a UCI session on stdin/stdout"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+    await UciEngine().run(reader)
+
+
+async def check_session(timeout=20.0):
+    """Drive chess_uci.py in a subprocess through pipes and check its answers"""
+    process = await asyncio.create_subprocess_exec(sys.executable, __file__, stdin=asyncio.subprocess.PIPE,
+                                                   stdout=asyncio.subprocess.PIPE)
+
+    async def send(line):
+        process.stdin.write((line + '\n').encode())
+        await process.stdin.drain()
+
+    async def expect(prefix):
+        """Return the first output line starting with prefix, skipping others"""
+        while True:
+            line = (await asyncio.wait_for(process.stdout.readline(), timeout)).decode().strip()
+            if not line:
+                raise AssertionError(f"engine exited while waiting for {prefix!r}")
+            if line.startswith(prefix):
+                return line
+
+    def check(name, condition):
+        print(f"{'ok  ' if condition else 'FAIL'} {name}")
+        if not condition:
+            raise AssertionError(name)
+
+    await send('uci')
+    await expect('uciok')
+    await send('isready')
+    check("isready", await expect('readyok') == 'readyok')
+
+    await send('position startpos moves e2e4 e7e5')
+    await send('d')
+    check("startpos moves", await expect('Fen:') ==
+          'Fen: rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR w KQkq e6 0 2')
+    await send('position startpos moves e2e4 e7e5 g1f3')
+    await send('d')
+    check("moves appended", (await expect('Fen:')).split()[1] == 'rnbqkbnr/pppp1ppp/8/4p3/4P3/5N2/PPPP1PPP/RNBQKB1R')
+    await send('position startpos moves e2e4 c7c5')
+    await send('d')
+    check("moves taken back", (await expect('Fen:')).split()[1] == 'rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR')
+
+    await send('go infinite')
+    await asyncio.sleep(0.5)
+    await send('isready')
+    begin = time.perf_counter()
+    line = await expect('')
+    while line.startswith('info'):
+        line = await expect('')
+    check("isready answered during search", line == 'readyok' and time.perf_counter() - begin < 1.0)
+    await send('d')
+    check("d shows the position during search",
+          (await expect('Fen:')).split()[1] == 'rnbqkbnr/pp1ppppp/8/2p5/4P3/8/PPPP1PPP/RNBQKBNR')
+    await send('stop')
+    check("stop ends infinite search", (await expect('bestmove')).split()[1] != '0000')
+
+    await send('position startpos')
+    await send('go ponder wtime 2000 btime 2000')
+    await asyncio.sleep(0.3)
+    begin = time.perf_counter()
+    await send('ponderhit')
+    await expect('bestmove')
+    check("ponderhit starts the clock", time.perf_counter() - begin < 2.0)
+    await send('go ponder')
+    await asyncio.sleep(0.3)
+    begin = time.perf_counter()
+    await send('ponderhit')
+    await expect('bestmove')
+    check("ponderhit without a clock uses the default", time.perf_counter() - begin < PONDER_MOVETIME + 1.0)
+
+    await send('position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+    await send('go depth 3')
+    check("finds mate in one", (await expect('bestmove')).split()[1] == 'a1a8')
+
+    await send('position startpos moves e2e4 zz')
+    check("bad move text reported", (await expect('info string')).startswith('info string illegal move zz'))
+    await send('position fen 8/8/8/8/8/8/8/8 w - - 0 1')
+    await expect('info string bad fen')
+    await send('position startpos moves e2e4 e7e5')
+    await send('d')
+    check("bad fen leaves the game usable",
+          (await expect('Fen:')).split()[1] == 'rnbqkbnr/pppp1ppp/8/4p3/4P3/8/PPPP1PPP/RNBQKBNR')
+    await send('go wtime abc depth 1')
+    check("bad go value reported", (await expect('info string')) == 'info string bad value abc for wtime')
+    check("search still runs", (await expect('bestmove')).split()[1] != '0000')
+
+    await send('position fen 6k1/5ppp/8/8/8/8/8/R5K1 w - - 0 1')
+    await send('go movetime 300')
+    begin = time.perf_counter()
+    await expect('bestmove')
+    check("movetime respected", time.perf_counter() - begin < 1.0)
+
+    await send('quit')
+    check("quit", await asyncio.wait_for(process.wait(), timeout) == 0)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="UCI engine on stdin/stdout")
+    parser.add_argument('--check', action='store_true', help="run a scripted session against a subprocess")
+    args = parser.parse_args()
+    asyncio.run(check_session() if args.check else serve())
@@ -0,0 +1,24 @@
+"""Zobrist random tables for 64-bit ChessGame position keys.
+
+The tables come from a fixed seed so keys are stable between runs, which
+lets them be stored on disk (transposition tables, opening books).
+"""
+import random
+
+_rng = random.Random(0x5A0B1257)
+
+#PIECE_KEYS[piece][sq], sq = row*8 + col
+PIECE_KEYS = {piece: [_rng.getrandbits(64) for _ in range(64)] for piece in 'PNBRQKpnbrqk'}
+#XORed in when black is to move
+SIDE_KEY = _rng.getrandbits(64)
+#only used when the side to move could actually capture en passant
+EP_FILE_KEYS = [_rng.getrandbits(64) for _ in range(8)]
+
+#castling rights as a 4-bit mask: 1 = white kingside, 2 = white queenside, 4 = black kingside, 8 = black queenside
+_right_keys = [_rng.getrandbits(64) for _ in range(4)]
+CASTLING_KEYS = [0] * 16
+for _mask in range(16):
+    for _bit in range(4):
+        if _mask >> _bit & 1:
+            CASTLING_KEYS[_mask] ^= _right_keys[_bit]
+del _mask, _bit
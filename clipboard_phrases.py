@@ -0,0 +1,245 @@
+"""A phrase library for C06_clipboard in one SQLite file, for thousands of snippets.
+
+Opening the store reads nothing: SQLite memory-maps the file and pages
+in only the B-tree nodes a query walks. The file holds two indexes,
+both built when phrases are added:
+
+- phrases, keyed by keyphrase. This B-tree is sorted, so an exact
+  lookup is one descent and a prefix search is a range scan from the
+  prefix. It answers the same queries a trie would, without loading one.
+- grams, the trigrams of every lower-cased keyphrase. A fuzzy search
+  counts the trigrams each key shares with the query and ranks the
+  keys by Jaccard similarity.
+
+    store = PhraseStore('phrases.db')
+    store.add({'agree': 'Yes, I agree.'})
+    store.get('agree'), store.prefix('ag'), store.fuzzy('agre')
+
+    python clipboard_phrases.py [count]     #startup and lookup latency against a dict of phrases
+    python clipboard_phrases.py --check
+"""
+import bisect, difflib, os, random, sqlite3, statistics, subprocess, sys, tempfile, time
+
+SCHEMA = """
+CREATE TABLE IF NOT EXISTS phrases (key TEXT PRIMARY KEY, text TEXT NOT NULL, grams INTEGER NOT NULL) WITHOUT ROWID;
+CREATE TABLE IF NOT EXISTS grams (gram TEXT, key TEXT, PRIMARY KEY (gram, key)) WITHOUT ROWID;
+"""
+MMAP_SIZE = 256 << 20
+#fuzzy matches below this Jaccard similarity of trigrams are not reported
+MIN_SIMILARITY = 0.2
+
+
+def trigrams(key):
+    """The set of trigrams of a lower-cased key, padded so short keys and word starts have some"""
+    padded = f"  {key.lower()} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class PhraseStore:
+    """Keyphrases and their texts in a SQLite file, opened on the first query"""
+
+    def __init__(self, path):
+        self.path = path
+        self._db = None
+
+    @property
+    def db(self):
+        if self._db is None:
+            self._db = sqlite3.connect(self.path)
+            self._db.execute(f"PRAGMA mmap_size = {MMAP_SIZE}")
+            self._db.executescript(SCHEMA)
+        return self._db
+
+    def close(self):
+        if self._db is not None:
+            self._db.close()
+            self._db = None
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def __len__(self):
+        return self.db.execute("SELECT count(*) FROM phrases").fetchone()[0]
+
+    def add(self, phrases):
+        """Add or replace phrases from a {keyphrase: text} dict, updating both indexes"""
+        with self.db as db:
+            for key, text in phrases.items():
+                #a key's grams follow from the key, so a replaced phrase keeps its grams
+                grams = trigrams(key)
+                db.execute("INSERT OR REPLACE INTO phrases VALUES (?, ?, ?)", (key, text, len(grams)))
+                db.executemany("INSERT OR IGNORE INTO grams VALUES (?, ?)", ((gram, key) for gram in grams))
+
+    def remove(self, key):
+        with self.db as db:
+            db.executemany("DELETE FROM grams WHERE gram = ? AND key = ?", ((gram, key) for gram in trigrams(key)))
+            return db.execute("DELETE FROM phrases WHERE key = ?", (key,)).rowcount > 0
+
+    def get(self, key):
+        """The text of a keyphrase, or None"""
+        row = self.db.execute("SELECT text FROM phrases WHERE key = ?", (key,)).fetchone()
+        return row and row[0]
+
+    def prefix(self, prefix, limit=20):
+        """Keyphrases starting with prefix, in order"""
+        if not prefix:
+            rows = self.db.execute("SELECT key FROM phrases ORDER BY key LIMIT ?", (limit,))
+        else:
+            #every key with the prefix sorts in [prefix, prefix + the highest character)
+            rows = self.db.execute("SELECT key FROM phrases WHERE key >= ? AND key < ? ORDER BY key LIMIT ?",
+                                   (prefix, prefix + '\U0010ffff', limit))
+        return [key for key, in rows]
+
+    def fuzzy(self, query, limit=5):
+        """(similarity, keyphrase) of the keyphrases most like query, best first"""
+        grams = trigrams(query)
+        rows = self.db.execute(f"""
+            SELECT shared, grams.key, phrases.grams FROM (
+                SELECT key, count(*) AS shared FROM grams WHERE gram IN ({','.join('?' * len(grams))}) GROUP BY key
+            ) AS grams JOIN phrases ON phrases.key = grams.key""", tuple(grams))
+        scored = [(shared / (len(grams) + count - shared), key) for shared, key, count in rows]
+        scored.sort(key=lambda score: (-score[0], score[1]))
+        return [score for score in scored[:limit] if score[0] >= MIN_SIMILARITY]
+
+
+def dict_prefix(phrases, prefix, limit=20):
+    return sorted(key for key in phrases if key.startswith(prefix))[:limit]
+
+
+def sorted_prefix(ordered, prefix, limit=20):
+    """dict_prefix() over keys already in order: bisect to the first candidate, keep those with the prefix"""
+    i = bisect.bisect_left(ordered, prefix)
+    return [key for key in ordered[i:i + limit] if key.startswith(prefix)]
+
+
+def dict_fuzzy(phrases, query, limit=5):
+    """fuzzy() by brute force over a dict, to check the trigram index against"""
+    grams = trigrams(query)
+    scored = []
+    for key in phrases:
+        key_grams = trigrams(key)
+        shared = len(grams & key_grams)
+        if shared:
+            scored.append((shared / len(grams | key_grams), key))
+    scored.sort(key=lambda score: (-score[0], score[1]))
+    return [score for score in scored[:limit] if score[0] >= MIN_SIMILARITY]
+
+
+def random_phrases(count, seed=0):
+    """count {keyphrase: text} snippets with keyphrases like 'invoice-reply-17'"""
+    rng = random.Random(seed)
+    words = ('agree busy excuse thanks invoice reply meeting later call follow up intro welcome sorry '
+             'decline accept remind deadline review draft signature address holiday').split()
+    phrases = {}
+    while len(phrases) < count:
+        key = '-'.join(rng.sample(words, rng.randrange(1, 3))) + f"-{rng.randrange(count)}"
+        phrases[key] = ' '.join(rng.choices(words, k=rng.randrange(5, 80))).capitalize() + '.'
+    return phrases
+
+
+def check(count=2000):
+    """Exact, prefix and fuzzy search of the store against the same searches over a dict"""
+    phrases = random_phrases(count, seed=1)
+    keys = sorted(phrases)
+    with tempfile.TemporaryDirectory() as directory, PhraseStore(os.path.join(directory, 'phrases.db')) as store:
+        store.add(phrases)
+        store.add({keys[0]: 'replaced'})
+        phrases[keys[0]] = 'replaced'
+        store.remove(keys[1])
+        del phrases[keys[1]]
+        if len(store) != len(phrases) or store.get(keys[1]) is not None:
+            raise AssertionError("add or remove lost track of the phrases")
+        rng = random.Random(2)
+        ordered = sorted(phrases)
+        for key in rng.sample(ordered, 200):
+            if store.get(key) != phrases[key]:
+                raise AssertionError(f"get({key!r}) differs from the dict")
+            for length in range(0, len(key) + 1, 3):
+                if not store.prefix(key[:length]) == dict_prefix(phrases, key[:length]) == \
+                        sorted_prefix(ordered, key[:length]):
+                    raise AssertionError(f"prefix({key[:length]!r}) differs from the dict")
+            typo = list(key)
+            typo[rng.randrange(len(typo))] = rng.choice('abcxyz')
+            typo = ''.join(typo)
+            if store.fuzzy(typo) != dict_fuzzy(phrases, typo):
+                raise AssertionError(f"fuzzy({typo!r}) differs from the dict")
+        if store.get('no such key') is not None or store.prefix('zzz') or store.fuzzy('\x00'):
+            raise AssertionError("a miss found something")
+    print(f"ok   exact, prefix and fuzzy search of {count} phrases match the dict")
+
+
+def _startup(code, runs=7):
+    """Median milliseconds for a fresh interpreter to run code"""
+    times = []
+    for _ in range(runs):
+        begin = time.perf_counter()
+        subprocess.run([sys.executable, '-c', code], check=True, cwd=os.path.dirname(os.path.abspath(__file__)))
+        times.append(time.perf_counter() - begin)
+    return statistics.median(times) * 1000
+
+
+def _latency(function, queries):
+    """Mean microseconds per query"""
+    begin = time.perf_counter()
+    for query in queries:
+        function(query)
+    return (time.perf_counter() - begin) / len(queries) * 1e6
+
+
+def benchmark(count=10000):
+    """Startup and lookup latency of a dict written in the source, as C06_clipboard keeps TEXT, against the store"""
+    phrases = random_phrases(count)
+    rng = random.Random(3)
+    keys = rng.sample(sorted(phrases), 200)
+    with tempfile.TemporaryDirectory() as directory:
+        module = os.path.join(directory, 'phrase_dict.py')
+        with open(module, 'w') as file:
+            file.write(f"TEXT = {phrases!r}\n")
+        path = os.path.join(directory, 'phrases.db')
+        begin = time.perf_counter()
+        with PhraseStore(path) as store:
+            store.add(phrases)
+        print(f"{count:,} phrases: {os.path.getsize(module) / 2 ** 20:.1f} MB as source, "
+              f"{os.path.getsize(path) / 2 ** 20:.1f} MB store built in {time.perf_counter() - begin:.1f}s")
+
+        key = keys[0]
+        print(f"\n{'startup + one lookup, ms':<34}{'median':>10}")
+        print(f"{'python -c pass':<34}{_startup('pass'):>10.1f}")
+        print(f"{'import pyperclip':<34}{_startup('import pyperclip'):>10.1f}")
+        #a fresh copy of the module each run, or the cached bytecode would hide the parse
+        code = f"import sys; sys.dont_write_bytecode = True; sys.path.insert(0, {directory!r}); " \
+               f"import phrase_dict; phrase_dict.TEXT[{key!r}]"
+        print(f"{'dict in source':<34}{_startup(code):>10.1f}")
+        code = f"import sys; sys.path.insert(0, {directory!r}); import phrase_dict; phrase_dict.TEXT[{key!r}]"
+        _startup(code, 1)
+        print(f"{'dict in source, cached .pyc':<34}{_startup(code):>10.1f}")
+        code = f"from clipboard_phrases import PhraseStore; PhraseStore({path!r}).get({key!r})"
+        print(f"{'PhraseStore':<34}{_startup(code):>10.1f}")
+
+        typos = [key[:-1] + 'q' for key in keys]
+        ordered = sorted(phrases)
+        print(f"\n{'lookup, microseconds':<34}{'dict':>10}{'store':>10}")
+        with PhraseStore(path) as store:
+            store.get(key)
+            rows = (
+                ('exact', lambda key: phrases.get(key), store.get, keys),
+                ('prefix, dict scan', lambda key: dict_prefix(phrases, key[:4]),
+                 lambda key: store.prefix(key[:4]), keys),
+                ('prefix, sorted keys + bisect',
+                 lambda key: sorted_prefix(ordered, key[:4]),
+                 lambda key: store.prefix(key[:4]), keys),
+                ('fuzzy, difflib', lambda key: difflib.get_close_matches(key, phrases), store.fuzzy, typos[:20]),
+                ('fuzzy, trigram scan', lambda key: dict_fuzzy(phrases, key), store.fuzzy, typos[:20]),
+            )
+            for name, by_dict, by_store, queries in rows:
+                print(f"{name:<34}{_latency(by_dict, queries):>10.1f}{_latency(by_store, queries):>10.1f}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--check']:
+        check()
+    else:
+        benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 10000)
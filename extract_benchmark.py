@@ -0,0 +1,179 @@
+"""Throughput benchmark and checks for the phone and email extraction in C07_dataExtr.
+
+The corpus is log and mail-like text with phone numbers in their different
+formats, email addresses and the near misses around them: dates, times,
+IP addresses, long digit strings, @mentions, user@localhost.
+
+    python extract_benchmark.py [size_mb] [--file F] #MB/s of each way to extract
+    python extract_benchmark.py --corpus FILE [size_mb] [--seed N]
+    python extract_benchmark.py --check
+"""
+import argparse, io, os, random, tempfile, time
+
+from C07_dataExtr import emailBytesRegex, extract, extract_bulk, phoneBytesRegex, phone_number, scan, scan_matches
+
+WORDS = ('the of and to in is for on that with as was at by from this be or an are not have error warning '
+         'request user session timeout server client retry connection closed opened status sent received '
+         'order invoice please call contact reply thanks regards meeting tomorrow office number mail').split()
+NAMES = ('al', 'jo', 'sam', 'kim', 'lee', 'pat', 'max', 'x_y', 'first.last', 'a+tag', 'o%b', 'mary-ann', 'Info')
+DOMAINS = ('example.com', 'mail.net', 'sub.example.org', 'host.co.uk', 'EXAMPLE.COM', 'uni-x.edu', 'a.b.info')
+BLOCK = 1 << 20
+
+
+def _phone(rng):
+    area, first, last = rng.randrange(200, 1000), rng.randrange(100, 1000), rng.randrange(10000)
+    separator = rng.choice(('-', '.', ' ', '-'))
+    number = f"{first}{separator}{last:04}"
+    form = rng.randrange(5)
+    if form == 1:
+        number = f"{area}{separator}{number}"
+    elif form == 2:
+        number = f"({area}) {number}"
+    elif form == 3:
+        number = f"({area}){number}"
+    if rng.random() < 0.15:
+        number += rng.choice((' ext ', ' x', 'ext.', ' ext. ')) + str(rng.randrange(10, 100000))
+    return number
+
+
+def _email(rng):
+    return f"{rng.choice(NAMES)}{rng.randrange(100)}@{rng.choice(DOMAINS)}"
+
+
+def _noise(rng):
+    kind = rng.randrange(6)
+    if kind == 0:
+        return f"2024-{rng.randrange(1, 13):02}-{rng.randrange(1, 29):02} {rng.randrange(24):02}:{rng.randrange(60):02}"
+    if kind == 1:
+        return '.'.join(str(rng.randrange(256)) for _ in range(4))
+    if kind == 2:
+        return str(rng.randrange(10 ** 12, 10 ** 16))
+    if kind == 3:
+        return '@' + rng.choice(NAMES)
+    if kind == 4:
+        return rng.choice(NAMES) + '@localhost'
+    return f"#{rng.randrange(1000)} {rng.randrange(1000)}"
+
+
+def corpus_lines(seed=0):
+    """Endless corpus lines, about one phone number and one email address in three lines"""
+    rng = random.Random(seed)
+    while True:
+        words = rng.choices(WORDS, k=rng.randrange(4, 16))
+        for make, chance in ((_phone, 0.35), (_email, 0.35), (_noise, 0.5)):
+            if rng.random() < chance:
+                words.insert(rng.randrange(len(words) + 1), make(rng))
+        yield ' '.join(words) + '\n'
+
+
+def generate_corpus(path, size_mb=64, seed=0):
+    """Write size_mb MB of corpus to path, a block at a time"""
+    size = int(size_mb * 2 ** 20)
+    lines = corpus_lines(seed)
+    with open(path, 'wb') as file:
+        while size > 0:
+            block = io.StringIO()
+            while block.tell() < min(BLOCK, size):
+                block.write(next(lines))
+            data = block.getvalue().encode()[:size]
+            file.write(data)
+            size -= len(data)
+    return path
+
+
+def two_regex(data):
+    """(start, end, kind) of both patterns' finditer over data, sorted like scan_matches"""
+    found = [(m.start(), m.end(), 'phone') for m in phoneBytesRegex.finditer(data)]
+    found += [(m.start(), m.end(), 'email') for m in emailBytesRegex.finditer(data)]
+    return sorted(found)
+
+
+#near misses and overlaps of the two patterns, and edges of the buffer
+TRICKY = [
+    '', '@', '@@a.com', 'a@b', 'a@b.c', 'a@b.cd', 'x@a.b@c.de', 'a@b.comm.xyz', '.@.@.ab', '-a@b-.co',
+    '555-1234', '(555)555-1234', '(555) 555-1234 x12', '555.555.1234ext.99', '555 555\n1234', '555-5555-1234',
+    '1234567-1234', '(55)555-1234', '415-555-1234 ext 123456', '5551234', '555-555-12345', '123-4567@a.com',
+    'mail 555-1234@example.com now', 'a555-1234@b.com', '(555-1234', '415 -555-1234', '415--555-1234',
+    'tel:+1 415.555.1234, fax (415)555-9876x7', '\n555-1234\n', 'joe@x.io, 555-1234,joe@x.io',
+    'a' * 5000 + '@example.com', '1' * 30 + '-' + '2' * 30, '555-1234' * 100, 'é@é.com 555\xa0555-1234',
+]
+
+
+def check(size_mb=4, seed=1):
+    """scan_matches against the two patterns' finditer, extract and chunked scans against whole ones"""
+    for text in TRICKY:
+        data = text.encode('utf-8')
+        got = [(m.start, m.end, m.kind) for m in scan_matches(data)]
+        if got != two_regex(data):
+            raise AssertionError(f"scan_matches differs from finditer on {text[:60]!r}")
+        #the values as the clipboard mode reports them; on bytes \d and \s are ASCII only, so only for ASCII text
+        values = [m.value for m in scan_matches(data) if m.kind == 'phone']
+        values += [m.value for m in scan_matches(data) if m.kind == 'email']
+        if text.isascii() and values != extract(text):
+            raise AssertionError(f"scan_matches values differ from extract on {text[:60]!r}")
+    print(f"ok   {len(TRICKY)} hand made cases")
+
+    lines = corpus_lines(seed)
+    data = ''.join(next(lines) for _ in range(size_mb * 2 ** 20 // 60)).encode()
+    matches = list(scan_matches(data))
+    if [(m.start, m.end, m.kind) for m in matches] != two_regex(data):
+        raise AssertionError("scan_matches differs from finditer on the corpus")
+    text = data.decode()
+    phones = [m.value for m in matches if m.kind == 'phone']
+    emails = [m.value for m in matches if m.kind == 'email']
+    if phones + emails != extract(text):
+        raise AssertionError("scan_matches values differ from extract on the corpus")
+    if phones != [phone_number([group.decode() for group in groups]) for groups in phoneBytesRegex.findall(data)]:
+        raise AssertionError("phone values differ from phone_number of the findall groups")
+    print(f"ok   {len(data) / 2 ** 20:.1f} MB corpus, {len(phones):,} phones and {len(emails):,} emails")
+
+    whole = scan(data)
+    for chunk in (1000, 65536, 333333):
+        chunked = sum((scan(data, start, start + chunk) for start in range(0, len(data), chunk)), type(whole)())
+        if chunked != whole:
+            raise AssertionError(f"scans of {chunk} byte chunks differ from a whole scan")
+    print("ok   chunked scans add up to a whole scan")
+
+
+def _rate(size, function):
+    begin = time.perf_counter()
+    count = function()
+    return count, size / 2 ** 20 / (time.perf_counter() - begin)
+
+
+def benchmark(size_mb=64, seed=0, path=None):
+    """MB/s of the clipboard extract, two finditer passes, scan_matches and extract_bulk on one corpus"""
+    with tempfile.TemporaryDirectory() as directory:
+        path = path or generate_corpus(os.path.join(directory, 'corpus.txt'), size_mb, seed)
+        with open(path, 'rb') as file:
+            data = file.read()
+        size = len(data)
+        methods = (
+            ('extract (findall x2, str)', lambda: len(extract(data.decode('utf-8', 'replace')))),
+            ('finditer x2, bytes', lambda: len(two_regex(data))),
+            ('scan_matches', lambda: sum(1 for _ in scan_matches(data))),
+            (f'extract_bulk, {os.cpu_count()} cpus', lambda: extract_bulk([path], io.StringIO(), chunk_size=8 << 20)[0]),
+        )
+        print(f"{size / 2 ** 20:.1f} MB corpus")
+        print(f"{'':<30}{'matches':>12}{'MB/s':>10}")
+        baseline = None
+        for name, function in methods:
+            count, rate = _rate(size, function)
+            baseline = baseline or rate
+            print(f"{name:<30}{count:>12,}{rate:>10.1f}{rate / baseline:>8.1f}x")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="phone and email extraction throughput")
+    parser.add_argument('size_mb', type=float, nargs='?', default=64)
+    parser.add_argument('--seed', type=int, default=0)
+    parser.add_argument('--corpus', help="write a corpus here instead of benchmarking")
+    parser.add_argument('--file', help="benchmark on this file instead of a generated corpus")
+    parser.add_argument('--check', action='store_true', help="compare with the two-regex extraction")
+    args = parser.parse_args()
+    if args.check:
+        check()
+    elif args.corpus:
+        generate_corpus(args.corpus, args.size_mb, args.seed)
+    else:
+        benchmark(args.size_mb, args.seed, args.file)
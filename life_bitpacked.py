@@ -0,0 +1,193 @@
+"""C04_life with 64 cells per uint64 word, skipping tiles where nothing happens.
+
+Each grid row is stored as uint64 words, bit i of word k being cell
+64k + i, so the whole grid takes one bit per cell per generation buffer
+instead of C04_life's byte per cell plus scratch. A generation adds the
+neighbours with bitwise full adders: three-cell row sums as two bit
+planes, then three rows of those, and the rule is read off the sum bits.
+
+The grid is cut into tiles of tile_rows rows by tile_words words. Only
+tiles that changed in the last generation, or touch one that did, are
+stepped; the rest hold still lifes or nothing, so their cells in the other
+buffer already match. Step cost follows the activity, not the area.
+Wraparound is the same as C04_life's, for any width.
+
+    life = PackedLife(Life.random(4096, 4096).grid)
+    life.step(100)
+    life.active_tiles, life.population
+
+    python life_bitpacked.py [side]     #memory and step time against C04_life
+    python life_bitpacked.py --check
+"""
+import sys, time
+
+import numpy as np
+
+from C04_life import Life, _wrap_sum
+
+ONE = np.uint64(1)
+
+
+def _majority(a, b, c):
+    return (a & b) | (c & (a ^ b))
+
+
+class PackedLife:
+    """A wrapping Life grid of bit-packed rows with active tile tracking"""
+
+    def __init__(self, grid, tile_rows=32, tile_words=2):
+        grid = np.asarray(grid, dtype=bool)
+        self.height, self.width = grid.shape
+        self.words = -(-self.width // 64)
+        self.tile_rows, self.tile_words = tile_rows, tile_words
+        tiles_down = -(-self.height // tile_rows)
+        tiles_across = -(-self.words // tile_words)
+        #storage is padded to whole tiles plus one row and word of zeros the last tiles' halos can read
+        rows, words = tiles_down * tile_rows + 1, tiles_across * tile_words + 1
+        padded = np.zeros((rows, words * 64), dtype=bool)
+        padded[:self.height, :self.width] = grid
+        cells = np.packbits(padded, axis=1, bitorder='little').view('<u8').astype(np.uint64)
+        self._buffers = [cells, cells.copy()]
+        self._source = 0
+
+        #valid bits per stored word: 64, the remainder in the last word, 0 in padding
+        valid = np.zeros(words, dtype=np.uint64)
+        valid[:self.words] = 64
+        valid[self.words - 1] = self.width - 64 * (self.words - 1)
+        word_masks = np.where(valid == 64, ~np.uint64(0), (ONE << valid) - ONE)
+        row_masks = np.where(np.arange(rows) < self.height, ~np.uint64(0), np.uint64(0))
+
+        def halo_indices(count, size, real):
+            """Per tile: storage indices of its cells with one halo on each side, wrapping at the real edge"""
+            raw = np.arange(count)[:, None] * size + np.arange(-1, size + 1)
+            wrapped = np.where(raw == -1, real - 1, np.where(raw == real, 0, raw))
+            return raw[:, 1:-1], wrapped
+
+        self._rows, self._row_halos = halo_indices(tiles_down, tile_rows, self.height)
+        self._words, self._word_halos = halo_indices(tiles_across, tile_words, self.words)
+        self._row_masks = row_masks[self._rows]
+        self._word_masks = word_masks[self._words]
+        #shift amounts that bring the neighbouring word's edge cell next to this word's edge cell
+        self._west_shift = np.maximum(valid[self._word_halos[:, :-2]], ONE) - ONE
+        self._east_shift = np.maximum(valid[self._words], ONE) - ONE
+
+        self.tiles = (tiles_down, tiles_across)
+        self._active = np.ones(self.tiles, dtype=bool)
+        self.active_tiles = self._active.size
+        self.generation = 0
+
+    @property
+    def nbytes(self):
+        """Bytes used by both generation buffers"""
+        return sum(buffer.nbytes for buffer in self._buffers)
+
+    @property
+    def grid(self):
+        """The current generation as a (height, width) bool array"""
+        cells = self._buffers[self._source][:self.height, :self.words]
+        bits = np.unpackbits(np.ascontiguousarray(cells).astype('<u8').view(np.uint8), axis=1, bitorder='little')
+        return bits[:, :self.width].astype(bool)
+
+    @property
+    def population(self):
+        return int(np.bitwise_count(self._buffers[self._source]).sum())
+
+    def step(self, generations=1):
+        for _ in range(generations):
+            self._step()
+        return self
+
+    def _step(self):
+        source, out = self._buffers[self._source], self._buffers[1 - self._source]
+        down, across = np.nonzero(self._active)
+        self.active_tiles = len(down)
+        self._source = 1 - self._source
+        self.generation += 1
+        if not len(down):
+            return
+        #(tiles, tile_rows + 2, tile_words + 2) words: the active tiles with their halos
+        cells = source[self._row_halos[down][:, :, None], self._word_halos[across][:, None, :]]
+        centre = cells[:, :, 1:-1]
+        west = (centre << ONE) | (cells[:, :, :-2] >> self._west_shift[across][:, None, :])
+        east = (centre >> ONE) | (cells[:, :, 2:] << self._east_shift[across][:, None, :])
+        #cell plus its west and east neighbours as two bit planes, for every row
+        low = west ^ centre ^ east
+        high = _majority(west, centre, east)
+        #the same over three rows gives the 3x3 block sum = low0 + 2 * (low1 + high0) + 4 * high1
+        low0 = low[:, :-2] ^ low[:, 1:-1] ^ low[:, 2:]
+        low1 = _majority(low[:, :-2], low[:, 1:-1], low[:, 2:])
+        high0 = high[:, :-2] ^ high[:, 1:-1] ^ high[:, 2:]
+        high1 = _majority(high[:, :-2], high[:, 1:-1], high[:, 2:])
+        twos = low1 ^ high0
+        fours = (low1 & high0) ^ high1
+        eight = low1 & high0 & high1
+        alive = centre[:, 1:-1]
+        #block sum 3 (birth, or survival with 2 neighbours) or 4 with the cell alive (3 neighbours)
+        born = low0 & twos & ~fours & ~eight
+        survive = alive & ~low0 & ~twos & fours
+        new = (born | survive) & self._row_masks[down][:, :, None] & self._word_masks[across][:, None, :]
+
+        changed = (new != alive).any(axis=(1, 2))
+        out[self._rows[down][:, :, None], self._words[across][:, None, :]] = new
+        #a tile is stepped next if it or a neighbour changed, wrapping around like the grid
+        marks = np.zeros(self.tiles, dtype=np.uint8)
+        marks[down[changed], across[changed]] = 1
+        rows = np.empty_like(marks)
+        _wrap_sum(marks, 1, rows)
+        self._active = _wrap_sum(rows, 0, marks) > 0
+
+
+def check():
+    """Bit for bit against C04_life, on widths that are not whole words and grids smaller than a tile"""
+    for width, height in ((60, 20), (1, 4), (3, 1), (64, 64), (65, 33), (200, 70), (130, 97)):
+        life = Life.random(width, height, seed=width * height)
+        packed = PackedLife(life.grid, tile_rows=8, tile_words=1)
+        for generation in range(60):
+            life.step()
+            packed.step()
+            if not np.array_equal(packed.grid, life.grid):
+                raise AssertionError(f"{width}x{height} differs from C04_life at generation {generation + 1}")
+        print(f"ok   {width}x{height} for 60 generations, {packed.active_tiles} of {packed._active.size} tiles active")
+
+
+def _timed(life, generations):
+    begin = time.perf_counter()
+    life.step(generations)
+    return (time.perf_counter() - begin) / generations
+
+
+def benchmark(side=4096, generations=20):
+    """Memory per cell and step time of C04_life against PackedLife for dense and sparse activity"""
+    life = Life.random(side, side, seed=1)
+    packed = PackedLife(life.grid)
+    unpacked_bytes = life.grid.nbytes + life._next.nbytes + life._rows.nbytes + life._counts.nbytes
+    print(f"{side}x{side}: C04_life {unpacked_bytes / side ** 2:.3f} bytes/cell, "
+          f"PackedLife {packed.nbytes / side ** 2:.3f} bytes/cell "
+          f"({unpacked_bytes / packed.nbytes:.0f}x less); the original lists of str took 8+")
+
+    print(f"\n{'ms per generation':<34}{'C04_life':>12}{'packed':>12}{'active tiles':>16}")
+    soup = np.zeros((side, side), dtype=bool)
+    middle = side // 2
+    soup[middle - 128:middle + 128, middle - 128:middle + 128] = Life.random(256, 256, seed=2).grid
+    gliders = np.zeros((side, side), dtype=bool)
+    for i in range(8):
+        y = x = 64 + i * side // 8
+        gliders[y:y + 3, x:x + 3] = [[0, 1, 0], [0, 0, 1], [1, 1, 1]]
+    for name, grid in (('random, all of it', life.grid), ('256x256 soup in the middle', soup), ('8 gliders', gliders)):
+        life = Life(grid)
+        packed = PackedLife(grid)
+        #settle: the first generations step every tile
+        life.step(4)
+        packed.step(4)
+        dense = _timed(life, generations)
+        sparse = _timed(packed, generations)
+        if not np.array_equal(packed.grid, life.grid):
+            raise AssertionError(f"{name}: PackedLife differs from C04_life")
+        print(f"{name:<34}{dense * 1000:>12.2f}{sparse * 1000:>12.2f}{packed.active_tiles:>8} of {packed._active.size}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--check']:
+        check()
+    else:
+        benchmark(int(sys.argv[1]) if len(sys.argv) > 1 else 4096)
@@ -0,0 +1,390 @@
+"""HashLife: Conway's game of life on an unbounded plane, far into the future.
+
+The plane is a quadtree whose nodes are hash-consed (equal squares are the
+same object) and every node remembers its centre 2^j generations on, so
+repetitive patterns advance exponentially fast. advance(n) goes n
+generations in at most one power-of-two jump per bit of n. Whenever the
+intern table and result cache grow past max_nodes, even in the middle of
+a jump, they are rebuilt from the live tree and the nodes the jump is
+still working on, which keeps memory bounded. If those alone fill half
+the limit, the limit doubles rather than collecting over and over.
+
+Unlike C04_life.Life the plane does not wrap. Population and bounding box
+are read off the tree, never from a grid:
+
+    life = HashLife.from_text(PATTERNS['gosper-gun'])
+    life.advance_to(10 ** 6)
+    life.population, life.bounding_box
+
+    python life_hashlife.py [pattern] [-n GENERATIONS]   #pattern name, .rle or plaintext file
+    python life_hashlife.py --check
+"""
+import argparse, time
+
+import numpy as np
+
+#plaintext patterns, 'O' alive
+PATTERNS = {
+    'glider': """
+.O.
+..O
+OOO""",
+    'r-pentomino': """
+.OO
+OO.
+.O.""",
+    'acorn': """
+.O.....
+...O...
+OO..OOO""",
+    'diehard': """
+......O.
+OO......
+.O...OOO""",
+    'gosper-gun': """
+........................O...........
+......................O.O...........
+............OO......OO............OO
+...........O...O....OO............OO
+OO........O.....O...OO..............
+OO........O...O.OO....O.O...........
+..........O.....O.......O...........
+...........O...O....................
+............OO......................""",
+}
+
+
+class Node:
+    """A 2^level square; level 0 nodes are single cells"""
+    __slots__ = ('level', 'nw', 'ne', 'sw', 'se', 'population')
+
+    def __init__(self, level, nw, ne, sw, se, population):
+        self.level = level
+        self.nw, self.ne, self.sw, self.se = nw, ne, sw, se
+        self.population = population
+
+
+OFF = Node(0, None, None, None, None, 0)
+ON = Node(0, None, None, None, None, 1)
+
+
+class HashLife:
+    """An unbounded Life universe: the root node, the position of its top-left cell and the generation"""
+
+    def __init__(self, cells=(), max_nodes=4_000_000):
+        self.max_nodes = max_nodes
+        self._limit = max_nodes
+        self.collections = 0
+        #nodes the successor calls in progress still need, kept through a collection
+        self._pinned = []
+        #(nw, ne, sw, se) -> node; children are interned, so identity is equality
+        self._table = {}
+        #(node, j) -> centre of node 2^j generations on
+        self._results = {}
+        #node -> live cell box relative to its corner
+        self._boxes = {}
+        self._empty = [OFF]
+        cells = list(cells)
+        if cells:
+            x0 = min(x for x, _ in cells)
+            y0 = min(y for _, y in cells)
+            extent = max(max(x for x, _ in cells) - x0, max(y for _, y in cells) - y0) + 1
+            level = max(3, (extent - 1).bit_length())
+            root = self._build(level, [(x - x0, y - y0) for x, y in cells])
+        else:
+            x0 = y0 = 0
+            root = self.empty(3)
+        self._start = (root, x0, y0)
+        self.root, self.x, self.y = root, x0, y0
+        self.generation = 0
+
+    @classmethod
+    def from_text(cls, text, **kwargs):
+        """Cells of a plaintext pattern: 'O' or '#' alive, anything else dead, '!' lines are comments"""
+        lines = [line for line in text.strip('\n').splitlines() if not line.startswith('!')]
+        return cls(((x, y) for y, line in enumerate(lines) for x, char in enumerate(line) if char in 'O#'),
+                   **kwargs)
+
+    @classmethod
+    def from_grid(cls, grid, **kwargs):
+        """Cells of a (height, width) bool grid like C04_life.Life.grid, which then no longer wraps"""
+        ys, xs = np.nonzero(grid)
+        return cls(zip(xs.tolist(), ys.tolist()), **kwargs)
+
+    def _build(self, level, cells):
+        """Node for cells (relative x, y) inside a 2^level square"""
+        if not cells:
+            return self.empty(level)
+        if level == 0:
+            return ON
+        half = 1 << (level - 1)
+        quadrants = ([], [], [], [])
+        for x, y in cells:
+            quadrants[(y >= half) * 2 + (x >= half)].append((x % half, y % half))
+        return self.join(*(self._build(level - 1, quadrant) for quadrant in quadrants))
+
+    def join(self, nw, ne, sw, se):
+        """The interned node with these four children"""
+        key = (nw, ne, sw, se)
+        node = self._table.get(key)
+        if node is None:
+            node = self._table[key] = Node(nw.level + 1, nw, ne, sw, se,
+                                           nw.population + ne.population + sw.population + se.population)
+        return node
+
+    def empty(self, level):
+        while len(self._empty) <= level:
+            below = self._empty[-1]
+            self._empty.append(self.join(below, below, below, below))
+        return self._empty[level]
+
+    def _centre(self, m):
+        return self.join(m.nw.se, m.ne.sw, m.sw.ne, m.se.nw)
+
+    def _life_4x4(self, m):
+        """The centre 2x2 of a level 2 node one generation on"""
+        bits = [[0] * 4 for _ in range(4)]
+        for qy, qx, quadrant in ((0, 0, m.nw), (0, 2, m.ne), (2, 0, m.sw), (2, 2, m.se)):
+            bits[qy][qx] = quadrant.nw.population
+            bits[qy][qx + 1] = quadrant.ne.population
+            bits[qy + 1][qx] = quadrant.sw.population
+            bits[qy + 1][qx + 1] = quadrant.se.population
+
+        def rule(y, x):
+            neighbours = sum(bits[y + dy][x + dx] for dy in (-1, 0, 1) for dx in (-1, 0, 1)) - bits[y][x]
+            return ON if neighbours == 3 or (neighbours == 2 and bits[y][x]) else OFF
+        return self.join(rule(1, 1), rule(1, 2), rule(2, 1), rule(2, 2))
+
+    def _successor(self, m, j):
+        """The centre half of a level k node 2^j generations on, j <= k - 2"""
+        key = (m, j)
+        result = self._results.get(key)
+        if result is not None:
+            return result
+        if len(self._table) + len(self._results) > self._limit:
+            #m may be a join made for this call that nothing holds yet
+            self._pinned.append([m])
+            self.collect()
+            self._pinned.pop()
+        if not m.population:
+            result = self.empty(m.level - 1)
+        elif m.level == 2:
+            result = self._life_4x4(m)
+        else:
+            join = self.join
+            nw, ne, sw, se = m.nw, m.ne, m.sw, m.se
+            #the nine overlapping half-size squares, row by row
+            squares = (nw, join(nw.ne, ne.nw, nw.se, ne.sw), ne,
+                       join(nw.sw, nw.se, sw.nw, sw.ne), join(nw.se, ne.sw, sw.ne, se.nw), join(ne.sw, ne.se, se.nw, se.ne),
+                       sw, join(sw.ne, se.nw, sw.se, se.sw), se)
+            held = [m, *squares]
+            self._pinned.append(held)
+            #full speed takes 2^(j-1) generations in each of the two rounds, a smaller j only in the second
+            if j == m.level - 2:
+                r = []
+                for square in squares:
+                    r.append(self._successor(square, j - 1))
+                    held.append(r[-1])
+                j -= 1
+            else:
+                r = [self._centre(square) for square in squares]
+                held.extend(r)
+            quarters = []
+            for a, b, c, d in ((0, 1, 3, 4), (1, 2, 4, 5), (3, 4, 6, 7), (4, 5, 7, 8)):
+                quarters.append(self._successor(join(r[a], r[b], r[c], r[d]), j))
+                held.append(quarters[-1])
+            result = join(*quarters)
+            self._pinned.pop()
+        self._results[key] = result
+        return result
+
+    def _expand(self):
+        """Put the root in the middle of a square twice its size"""
+        m = self.root
+        e = self.empty(m.level - 1)
+        self.root = self.join(self.join(e, e, e, m.nw), self.join(e, e, m.ne, e),
+                              self.join(e, m.sw, e, e), self.join(m.se, e, e, e))
+        self.x -= 1 << (m.level - 1)
+        self.y -= 1 << (m.level - 1)
+
+    def _padded(self):
+        """All live cells are in the middle half of the root"""
+        m = self.root
+        return (m.level >= 3 and m.nw.population == m.nw.se.se.population
+                and m.ne.population == m.ne.sw.sw.population and m.sw.population == m.sw.ne.ne.population
+                and m.se.population == m.se.nw.nw.population)
+
+    def _jump(self, j):
+        """Advance 2^j generations"""
+        while self.root.level < j + 2 or not self._padded():
+            self._expand()
+        #one more so the pattern cannot grow out of the result in 2^j generations
+        self._expand()
+        offset = 1 << (self.root.level - 2)
+        self.root = self._successor(self.root, j)
+        self.x += offset
+        self.y += offset
+        self.generation += 1 << j
+
+    def advance(self, generations):
+        """Go generations on, one jump per set bit"""
+        j = 0
+        while generations:
+            if generations & 1:
+                self._jump(j)
+            generations >>= 1
+            j += 1
+        return self
+
+    def advance_to(self, generation):
+        """Go to a generation, from the starting pattern again if it is in the past"""
+        if generation < self.generation:
+            self.root, self.x, self.y = self._start
+            self.generation = 0
+        return self.advance(generation - self.generation)
+
+    def collect(self):
+        """Drop every node not in the current or starting tree or pinned by a jump, and all cached results"""
+        table = {}
+        stack = [self.root, self._start[0]] + self._empty[1:] + [node for held in self._pinned for node in held]
+        while stack:
+            node = stack.pop()
+            if node.level:
+                key = (node.nw, node.ne, node.sw, node.se)
+                if key not in table:
+                    table[key] = node
+                    stack.extend(key)
+        self._table = table
+        self._results.clear()
+        self._boxes.clear()
+        self.collections += 1
+        self._limit = max(self.max_nodes, 2 * len(table))
+
+    @property
+    def population(self):
+        return self.root.population
+
+    def _box(self, node):
+        """(x0, y0, x1, y1) inclusive box of a node's live cells relative to its corner, None when empty"""
+        if not node.population:
+            return None
+        if not node.level:
+            return (0, 0, 0, 0)
+        box = self._boxes.get(node)
+        if box is None:
+            half = 1 << (node.level - 1)
+            boxes = [(b[0] + dx, b[1] + dy, b[2] + dx, b[3] + dy)
+                     for child, dx, dy in ((node.nw, 0, 0), (node.ne, half, 0), (node.sw, 0, half), (node.se, half, half))
+                     for b in (self._box(child),) if b]
+            box = self._boxes[node] = (min(b[0] for b in boxes), min(b[1] for b in boxes),
+                                       max(b[2] for b in boxes), max(b[3] for b in boxes))
+        return box
+
+    @property
+    def bounding_box(self):
+        """(x0, y0, x1, y1) inclusive box of the live cells, None when there are none"""
+        box = self._box(self.root)
+        return box and (box[0] + self.x, box[1] + self.y, box[2] + self.x, box[3] + self.y)
+
+    def population_at(self, generation):
+        return self.advance_to(generation).population
+
+    def bounding_box_at(self, generation):
+        return self.advance_to(generation).bounding_box
+
+    def cells(self, window=None):
+        """Yield the (x, y) live cells, only those in an inclusive (x0, y0, x1, y1) window if given"""
+        stack = [(self.root, self.x, self.y)]
+        while stack:
+            node, x, y = stack.pop()
+            if not node.population:
+                continue
+            size = 1 << node.level
+            if window and (x > window[2] or y > window[3] or x + size <= window[0] or y + size <= window[1]):
+                continue
+            if not node.level:
+                yield x, y
+                continue
+            half = size >> 1
+            stack += ((node.nw, x, y), (node.ne, x + half, y), (node.sw, x, y + half), (node.se, x + half, y + half))
+
+    def to_grid(self, x0, y0, width, height):
+        """A (height, width) bool grid of the area with its top-left cell at (x0, y0)"""
+        grid = np.zeros((height, width), dtype=bool)
+        for x, y in self.cells((x0, y0, x0 + width - 1, y0 + height - 1)):
+            grid[y - y0, x - x0] = True
+        return grid
+
+
+def check():
+    """Compare with C04_life on a torus too big to wrap, and with known methuselah lifetimes"""
+    from C04_life import Life
+    for name in ('acorn', 'gosper-gun', 'r-pentomino'):
+        life = HashLife.from_text(PATTERNS[name])
+        grid = np.zeros((256, 256), dtype=bool)
+        grid[100:100 + 16, 100:100 + 40] = life.to_grid(0, 0, 40, 16)
+        torus = Life(grid)
+        #uneven jumps exercise the slower-than-full-speed successors
+        for jump in (1, 2, 13, 100, 7, 77):
+            life.advance(jump)
+            torus.step(jump)
+            if not np.array_equal(life.to_grid(-100, -100, 256, 256), torus.grid):
+                raise AssertionError(f"{name} differs from C04_life at generation {life.generation}")
+        print(f"ok   {name} matches C04_life for {life.generation} generations")
+
+    #(pattern, generation, population) from the published lifetimes
+    for name, generation, population in (('r-pentomino', 1103, 116), ('acorn', 5206, 633), ('diehard', 130, 0)):
+        life = HashLife.from_text(PATTERNS[name])
+        found = life.population_at(generation)
+        if found != population:
+            raise AssertionError(f"{name} has {found} cells at generation {generation}, expected {population}")
+        print(f"ok   {name} has {population} cells at generation {generation}")
+
+    life = HashLife.from_text(PATTERNS['gosper-gun'], max_nodes=2000)
+    life.advance((1 << 12) - 1)
+    reference = HashLife.from_text(PATTERNS['gosper-gun']).advance((1 << 12) - 1)
+    if sorted(life.cells()) != sorted(reference.cells()) or not life.collections:
+        raise AssertionError("garbage collection changed the result")
+    print(f"ok   small max_nodes collected {life.collections} times with the same result")
+
+    #one jump is also bounded: it collects as it goes instead of only before it starts
+    life = HashLife.from_text(PATTERNS['acorn'], max_nodes=20000)
+    reference = HashLife.from_text(PATTERNS['acorn'])
+    life._jump(12)
+    reference._jump(12)
+    if sorted(life.cells()) != sorted(reference.cells()) or not life.collections or \
+            len(life._table) + len(life._results) > 2 * life._limit:
+        raise AssertionError("a single jump was not collected, or collecting changed it")
+    print(f"ok   a single 2^12 jump collected {life.collections} times, "
+          f"{len(life._table) + len(life._results):,} entries against {len(reference._table) + len(reference._results):,}")
+
+
+def main(pattern, generations, max_nodes):
+    if pattern in PATTERNS:
+        life = HashLife.from_text(PATTERNS[pattern], max_nodes=max_nodes)
+    else:
+        from life_io import read_pattern, RULE
+        grid, rule = read_pattern(pattern)
+        if rule != RULE:
+            raise ValueError(f"{pattern} is for rule {rule}, only {RULE} is supported")
+        life = HashLife.from_grid(grid, max_nodes=max_nodes)
+    begin = time.perf_counter()
+    life.advance_to(generations)
+    elapsed = time.perf_counter() - begin
+    print(f"generation {life.generation:,}: population {life.population:,}, bounding box {life.bounding_box}")
+    print(f"{elapsed:.2f}s, {len(life._table):,} nodes, {len(life._results):,} cached results, "
+          f"{life.collections} collections")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="Run a Life pattern with HashLife")
+    parser.add_argument('pattern', nargs='?', default='gosper-gun',
+                        help=f"one of {', '.join(PATTERNS)} or an .rle or plaintext file")
+    parser.add_argument('-n', '--generations', type=int, default=10 ** 6)
+    parser.add_argument('--max-nodes', type=int, default=4_000_000, help="collect garbage above this many entries")
+    parser.add_argument('--check', action='store_true')
+    args = parser.parse_args()
+    if args.check:
+        check()
+    else:
+        main(args.pattern, args.generations, args.max_nodes)
@@ -0,0 +1,395 @@
+"""Life pattern files and checkpoints for C04_life grids.
+
+- RLE (.rle) and plaintext (.cells) patterns are read a chunk at a time:
+  NumPy finds the run counts, tags and live cells of a whole chunk at once.
+  Writing formats the runs NumPy finds in the grid the same way, so there
+  is never a Python string or loop step per cell or per run.
+- A checkpoint is a small header (height, width, generation, rule) followed
+  by the grid packed 8 cells per byte, a row per ceil(width / 8) bytes.
+  It is written to a temporary file and renamed, so a crash while saving
+  keeps the last one; load_checkpoint() memory-maps it.
+
+    grid, rule = read_pattern('gun.rle')
+    save_checkpoint('run.ckpt', life.grid, life.generation)
+    life = resume('run.ckpt')
+
+    python life_io.py --check
+    python life_io.py --benchmark [side]
+"""
+import bisect, os, struct, sys, time
+
+import numpy as np
+
+RULE = 'B3/S23'
+MAGIC = b'LIFECKP1'
+#magic, height, width, generation, rule
+HEADER = struct.Struct('<8sQQQ16s')
+LINE_LENGTH = 70
+ROW_BLOCK = 1024
+
+
+def normalize_rule(rule):
+    """'B3/S23', '23/3' and 'b3/s23' all become 'B3/S23'"""
+    rule = rule.strip().upper()
+    if '/' in rule and not rule.startswith(('B', 'S')):
+        survive, born = rule.split('/')
+        return f"B{born}/S{survive}"
+    if rule.startswith('S'):
+        survive, born = rule.split('/')
+        return f"{born}/{survive}"
+    return rule
+
+
+def _token_counts(data):
+    """Counts and tag bytes of the tokens of whitespace-free RLE data ending on a tag; no count means 1"""
+    is_digit = (data >= ord('0')) & (data <= ord('9'))
+    tag_positions = np.flatnonzero(~is_digit)
+    digit_positions = np.flatnonzero(is_digit)
+    #each digit belongs to the next tag, weighted by its distance to it
+    token = np.searchsorted(tag_positions, digit_positions)
+    values = (data[digit_positions] - ord('0')).astype(np.int64) * 10 ** (tag_positions[token] - 1 - digit_positions)
+    counts = np.bincount(token, weights=values, minlength=len(tag_positions)).astype(np.int64)
+    counts[counts == 0] = 1
+    return counts, data[tag_positions]
+
+
+class RleReader:
+    """The header of an RLE file, then its live cells as arrays of (y, x, length) runs, a chunk at a time"""
+
+    def __init__(self, stream, chunk_size=1 << 20):
+        self.stream = stream
+        self.chunk_size = chunk_size
+        self.comments = []
+        self.width = self.height = None
+        self.rule = RULE
+        while True:
+            line = stream.readline()
+            if not line:
+                raise ValueError("RLE file has no 'x = ..., y = ...' header")
+            line = line.strip()
+            if line.startswith('#'):
+                self.comments.append(line)
+            elif line:
+                fields = dict((key.strip().lower(), value.strip())
+                              for key, value in (field.split('=', 1) for field in line.split(',')))
+                self.width, self.height = int(fields['x']), int(fields['y'])
+                self.rule = normalize_rule(fields.get('rule', RULE))
+                break
+
+    def runs(self):
+        x = y = 0
+        carry = b''
+        while True:
+            text = self.stream.read(self.chunk_size)
+            chunk = carry + text.encode('ascii').translate(None, b' \t\r\n')
+            #a run count may go on in the next chunk
+            body = chunk.rstrip(b'0123456789')
+            carry = chunk[len(body):]
+            if body:
+                counts, tags = _token_counts(np.frombuffer(body, dtype=np.uint8))
+                stop = np.flatnonzero(tags == ord('!'))
+                if len(stop):
+                    counts, tags = counts[:stop[0]], tags[:stop[0]]
+                newline = tags == ord('$')
+                across = np.where(newline, 0, counts)
+                #rows and columns before each token: columns count from the last $, or from x for the first row
+                rows = y + np.cumsum(np.where(newline, counts, 0))
+                columns = np.cumsum(across)
+                last_newline = np.maximum.accumulate(np.where(newline, np.arange(len(tags)), -1))
+                before = np.where(last_newline >= 0, columns - columns[last_newline], columns + x) - across
+                alive = ~newline & (tags != ord('b')) & (tags != ord('.'))
+                if alive.any():
+                    yield rows[alive], before[alive], counts[alive]
+                if len(tags):
+                    y = int(rows[-1])
+                    x = int(before[-1] + across[-1]) if not newline[-1] else 0
+                if len(stop):
+                    return
+            if not text:
+                return
+
+
+def _fill(grid, rows, columns, counts):
+    """Set runs of cells of a 2-d grid alive"""
+    height, width = grid.shape
+    if len(rows) and (rows.max() >= height or (columns + counts).max() > width):
+        raise ValueError(f"pattern cells beyond its {width}x{height} size")
+    ends = np.cumsum(counts)
+    #flat index of every cell: run start plus its place in the run
+    cells = np.repeat(rows * width + columns - (ends - counts), counts) + np.arange(ends[-1] if len(ends) else 0)
+    grid.reshape(-1)[cells] = True
+
+
+def read_rle(stream):
+    """Read an RLE pattern, return (bool grid, rule)"""
+    reader = RleReader(stream)
+    grid = np.zeros((reader.height, reader.width), dtype=bool)
+    for rows, columns, counts in reader.runs():
+        _fill(grid, rows, columns, counts)
+    return grid, reader.rule
+
+
+def read_plaintext(stream, chunk_size=1 << 20):
+    """Read a plaintext pattern ('O' or '*' alive, '!' comment lines), return (bool grid, rule)"""
+    found = []
+    width = height = 0
+    carry = b''
+    while True:
+        text = stream.read(chunk_size)
+        data = carry + text.encode('ascii').replace(b'\r', b'')
+        if text:
+            #whole lines only, the rest waits for the next chunk
+            cut = data.rfind(b'\n') + 1
+            data, carry = data[:cut], data[cut:]
+        elif data and not data.endswith(b'\n'):
+            data += b'\n'
+        if data:
+            chars = np.frombuffer(data, dtype=np.uint8)
+            ends = np.flatnonzero(chars == ord('\n'))
+            starts = np.concatenate(([0], ends[:-1] + 1))
+            comment = chars[np.minimum(starts, len(chars) - 1)] == ord('!')
+            comment &= starts < ends
+            row_of_line = height + np.cumsum(~comment) - 1
+            cells = np.flatnonzero((chars == ord('O')) | (chars == ord('*')))
+            line = np.searchsorted(ends, cells)
+            cells, line = cells[~comment[line]], line[~comment[line]]
+            found.append((row_of_line[line], cells - starts[line]))
+            if (~comment).any():
+                width = max(width, int((ends - starts)[~comment].max()))
+            height += int((~comment).sum())
+        if not text:
+            break
+    grid = np.zeros((height, width), dtype=bool)
+    for rows, columns in found:
+        grid[rows, columns] = True
+    return grid, RULE
+
+
+def read_pattern(path):
+    """Read an .rle or plaintext file by its extension, return (bool grid, rule)"""
+    with open(path) as stream:
+        return read_rle(stream) if path.lower().endswith('.rle') else read_plaintext(stream)
+
+
+def grid_runs(grid):
+    """Yield the live cell runs of a bool grid as (rows, starts, lengths) arrays, a block of rows at a time"""
+    height, width = grid.shape
+    for top in range(0, height, ROW_BLOCK):
+        block = np.zeros((min(ROW_BLOCK, height - top), width + 2), dtype=np.int8)
+        block[:, 1:-1] = grid[top:top + ROW_BLOCK]
+        edges = np.diff(block, axis=1)
+        rows, starts = np.nonzero(edges == 1)
+        _, ends = np.nonzero(edges == -1)
+        yield rows + top, starts, ends - starts
+
+
+def _tokens(counts, tags):
+    """RLE tokens as one byte string and each token's length; counts of 1 are left out"""
+    counts = np.asarray(counts, dtype=np.int64)
+    digits = np.zeros(len(counts), dtype=np.int64)
+    power = 10
+    while True:
+        more = counts >= power
+        if not more.any():
+            break
+        digits += more
+        power *= 10
+    digits = np.where(counts > 1, digits + 1, 0)
+    size = int(digits.max(initial=0))
+    chars = np.empty((len(counts), size + 1), dtype=np.uint8)
+    for k in range(size):
+        chars[:, k] = counts // 10 ** (size - 1 - k) % 10 + ord('0')
+    chars[:, size] = tags
+    keep = np.arange(size + 1) >= (size - digits)[:, None]
+    return chars[keep].tobytes(), digits + 1
+
+
+def _write_tokens(stream, counts, tags, column):
+    """Write tokens, starting a new line before one that would pass LINE_LENGTH; return the last line's length"""
+    data, lengths = _tokens(counts, tags)
+    ends = np.cumsum(lengths).tolist()
+    pieces = []
+    start = 0
+    while start < len(data):
+        limit = start + LINE_LENGTH - column
+        if ends[-1] <= limit:
+            pieces.append(data[start:])
+            column += len(data) - start
+            break
+        last = bisect.bisect_right(ends, limit) - 1
+        if last >= 0 and ends[last] > start:
+            pieces.append(data[start:ends[last]])
+            start = ends[last]
+        pieces.append(b'\n')
+        column = 0
+    stream.write(b''.join(pieces).decode('ascii'))
+    return column
+
+
+def write_rle(grid, stream, rule=RULE, comments=()):
+    """Write a bool grid as RLE, lines of at most LINE_LENGTH characters"""
+    grid = np.asarray(grid, dtype=bool)
+    for comment in comments:
+        stream.write(f"#C {comment}\n")
+    stream.write(f"x = {grid.shape[1]}, y = {grid.shape[0]}, rule = {rule}\n")
+    tags = np.array([ord('$'), ord('b'), ord('o')], dtype=np.uint8)
+    #row and end of the last run written
+    row = end = 0
+    column = 0
+    for rows, starts, lengths in grid_runs(grid):
+        if not len(rows):
+            continue
+        previous_rows = np.concatenate(([row], rows[:-1]))
+        previous_ends = np.concatenate(([end], (starts + lengths)[:-1]))
+        new_row = rows != previous_rows
+        #per run: rows to move down, dead cells before it, its own length
+        counts = np.stack([np.where(new_row, rows - previous_rows, 0),
+                           starts - np.where(new_row, 0, previous_ends), lengths], axis=1).ravel()
+        keep = counts > 0
+        column = _write_tokens(stream, counts[keep], np.tile(tags, len(rows))[keep], column)
+        row, end = int(rows[-1]), int(starts[-1] + lengths[-1])
+    _write_tokens(stream, [1], [ord('!')], column)
+    stream.write('\n')
+
+
+def write_plaintext(grid, stream, name=None):
+    """Write a bool grid as plaintext, '.' dead and 'O' alive"""
+    grid = np.asarray(grid, dtype=bool)
+    if name:
+        stream.write(f"!Name: {name}\n")
+    for top in range(0, grid.shape[0], ROW_BLOCK):
+        block = grid[top:top + ROW_BLOCK]
+        chars = np.full((len(block), grid.shape[1] + 1), ord('\n'), dtype=np.uint8)
+        chars[:, :-1] = np.where(block, ord('O'), ord('.'))
+        stream.write(chars.tobytes().decode('ascii'))
+
+
+def write_pattern(grid, path, rule=RULE):
+    with open(path, 'w') as stream:
+        if path.lower().endswith('.rle'):
+            write_rle(grid, stream, rule)
+        else:
+            write_plaintext(grid, stream)
+
+
+def save_checkpoint(path, grid, generation, rule=RULE):
+    """Write a bool grid and its generation, replacing path only once the file is complete"""
+    grid = np.asarray(grid, dtype=bool)
+    height, width = grid.shape
+    row_bytes = (width + 7) // 8
+    temporary = path + '.tmp'
+    with open(temporary, 'wb') as out:
+        out.write(HEADER.pack(MAGIC, height, width, generation, rule.encode('ascii')))
+        out.truncate(HEADER.size + height * row_bytes)
+    if height and row_bytes:
+        bits = np.memmap(temporary, dtype=np.uint8, mode='r+', offset=HEADER.size, shape=(height, row_bytes))
+        for top in range(0, height, ROW_BLOCK):
+            bits[top:top + ROW_BLOCK] = np.packbits(grid[top:top + ROW_BLOCK], axis=1, bitorder='little')
+        bits.flush()
+        del bits
+    os.replace(temporary, path)
+
+
+class Checkpoint:
+    """A memory-mapped checkpoint file"""
+
+    def __init__(self, path):
+        with open(path, 'rb') as source:
+            magic, self.height, self.width, self.generation, rule = HEADER.unpack(source.read(HEADER.size))
+        if magic != MAGIC:
+            raise ValueError(f"{path} is not a Life checkpoint")
+        self.rule = rule.rstrip(b'\0').decode('ascii')
+        row_bytes = (self.width + 7) // 8
+        #the packed rows, read lazily by the OS as they are touched
+        self.bits = (np.memmap(path, dtype=np.uint8, mode='r', offset=HEADER.size, shape=(self.height, row_bytes))
+                     if self.height and row_bytes else np.zeros((self.height, row_bytes), np.uint8))
+
+    def grid(self):
+        return np.unpackbits(self.bits, axis=1, count=self.width, bitorder='little').view(bool)
+
+
+def load_checkpoint(path):
+    return Checkpoint(path)
+
+
+def resume(path):
+    """A C04_life.Life at the checkpoint's generation"""
+    from C04_life import Life
+    checkpoint = load_checkpoint(path)
+    if checkpoint.rule != RULE:
+        raise ValueError(f"checkpoint rule {checkpoint.rule} is not {RULE}")
+    life = Life(checkpoint.grid())
+    life.generation = checkpoint.generation
+    return life
+
+
+GOSPER_GUN_RLE = """#N Gosper glider gun
+x = 36, y = 9, rule = B3/S23
+24bo$22bobo$12b2o6b2o12b2o$11bo3bo4b2o12b2o$2o8bo5bo3b2o$2o8bo3bob2o4b
+obo$10bo5bo7bo$11bo3bo$12b2o!
+"""
+
+
+def check(path='life_io_check'):
+    """Round trips through every format, and a known RLE against its plaintext"""
+    import io
+    from C04_life import Life
+    from life_hashlife import PATTERNS
+
+    gun, rule = read_rle(io.StringIO(GOSPER_GUN_RLE))
+    plain, _ = read_plaintext(io.StringIO(PATTERNS['gosper-gun'].strip('\n')))
+    if rule != RULE or not np.array_equal(gun, plain):
+        raise AssertionError("Gosper gun RLE differs from its plaintext")
+    #a run count split over two lines
+    split, _ = read_rle(io.StringIO("x = 12, y = 1\n1\n1o!\n"))
+    if split.sum() != 11:
+        raise AssertionError("run count split across lines misread")
+    print("ok   RLE reader")
+
+    for width, height in ((36, 9), (1, 1), (300, 200), (71, 3)):
+        grid = Life.random(width, height, seed=width).grid
+        for write, read in ((write_rle, read_rle), (write_plaintext, read_plaintext)):
+            text = io.StringIO()
+            write(grid, text)
+            if write is write_rle and max(map(len, text.getvalue().splitlines()[1:])) > LINE_LENGTH:
+                raise AssertionError("RLE line too long")
+            text.seek(0)
+            back, _ = read(text)
+            if not np.array_equal(back[:height, :width], grid) or back[height:].any() or back[:, width:].any():
+                raise AssertionError(f"{write.__name__} round trip of {width}x{height} failed")
+        life = Life(grid).step(7)
+        save_checkpoint(path, life.grid, life.generation)
+        loaded = resume(path)
+        if loaded.generation != 7 or not np.array_equal(loaded.grid, life.grid):
+            raise AssertionError(f"checkpoint round trip of {width}x{height} failed")
+    os.remove(path)
+    print("ok   RLE, plaintext and checkpoint round trips")
+
+
+def benchmark(side=4096, path='life_io_bench'):
+    """Time writing and reading a random side x side grid in each format"""
+    from C04_life import Life
+    grid = Life.random(side, side, seed=1).grid
+    for name, write, read in (('rle', lambda: write_pattern(grid, path + '.rle'), lambda: read_pattern(path + '.rle')),
+                              ('plaintext', lambda: write_pattern(grid, path + '.cells'),
+                               lambda: read_pattern(path + '.cells')),
+                              ('checkpoint', lambda: save_checkpoint(path + '.ckpt', grid, 0),
+                               lambda: (load_checkpoint(path + '.ckpt').grid(),))):
+        begin = time.perf_counter()
+        write()
+        written = time.perf_counter() - begin
+        begin = time.perf_counter()
+        back = read()[0]
+        loaded = time.perf_counter() - begin
+        if not np.array_equal(back, grid):
+            raise AssertionError(f"{name} round trip failed")
+        file = path + {'rle': '.rle', 'plaintext': '.cells', 'checkpoint': '.ckpt'}[name]
+        print(f"{name:<12}{os.path.getsize(file) / 2 ** 20:>9.1f} MB  write {written:6.2f}s  read {loaded:6.2f}s")
+        os.remove(file)
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--benchmark']:
+        benchmark(int(sys.argv[2]) if len(sys.argv) > 2 else 4096)
+    else:
+        check()
@@ -0,0 +1,166 @@
+"""C04_life on several processes, with the grid in shared memory.
+
+The grid is split into tiles of whole rows, one task per tile and
+generation. Both generations live in one SharedMemory block of shape
+(2, height + 2, width): rows 1..height are the grid and rows 0 and
+height + 1 are ghost rows holding copies of the last and first row, so the
+wraparound is just two more rows and every tile with its halo is one
+contiguous slice. A worker reads its tile and halo from one buffer, writes
+the next generation into the other and, if its tile holds the first or last
+row, refreshes the matching ghost row there. Tasks carry only three ints;
+no cells go through pipes.
+
+    with ParallelLife(grid, workers=4) as life:
+        life.step(100)
+        print(life.population)
+
+    python life_parallel.py [side] [generations]   #scaling over worker counts, checked against C04_life
+"""
+import os, sys, time
+from concurrent.futures import ProcessPoolExecutor
+from multiprocessing import shared_memory
+
+import numpy as np
+
+from C04_life import Life, _wrap_sum
+
+#per-process state of a pool worker, set up once by _init_worker
+_worker = {}
+
+
+def _init_worker(name, shape):
+    shm = shared_memory.SharedMemory(name=name)
+    _worker['shm'] = shm
+    _worker['buffers'] = np.ndarray(shape, dtype=bool, buffer=shm.buf)
+    _worker['scratch'] = {}
+
+
+def step_tile(buffers, source, top, bottom, scratch=None):
+    """Write grid rows top..bottom - 1 of buffers[source] into buffers[1 - source], bit for bit like C04_life.step"""
+    grid = buffers[source]
+    out = buffers[1 - source]
+    height = grid.shape[0] - 2
+    #the tile with one halo row on each side, as padded row numbers top..bottom + 1
+    cells = grid[top:bottom + 2].view(np.uint8)
+    shape = cells.shape
+    if scratch is None or scratch[0].shape != shape:
+        scratch = (np.empty(shape, np.uint8), np.empty((shape[0] - 2, shape[1]), np.uint8))
+    rows, counts = scratch
+    _wrap_sum(cells, 1, rows)
+    np.add(rows[:-2], rows[1:-1], out=counts)
+    counts += rows[2:]
+    tile = cells[1:-1]
+    counts -= tile
+    counts |= tile
+    np.equal(counts, 3, out=out[top + 1:bottom + 1])
+    #halo exchange: the ghost rows of the new generation
+    if top == 0:
+        out[height + 1] = out[1]
+    if bottom == height:
+        out[0] = out[height]
+    return scratch
+
+
+def _step_task(source, top, bottom):
+    scratch = _worker['scratch']
+    scratch[top] = step_tile(_worker['buffers'], source, top, bottom, scratch.get(top))
+    return bottom - top
+
+
+class ParallelLife:
+    """A wrapping Life grid stepped by a process pool, tile by tile.
+
+    Use as a context manager so the pool and shared memory are released.
+    """
+
+    def __init__(self, grid, workers=None, tiles=None):
+        grid = np.asarray(grid, dtype=bool)
+        height, width = grid.shape
+        self.workers = workers or os.cpu_count() or 1
+        tiles = min(tiles or self.workers, height)
+        bounds = [height * i // tiles for i in range(tiles + 1)]
+        self.tiles = list(zip(bounds, bounds[1:]))
+        self.shape = (2, height + 2, width)
+        self.shm = shared_memory.SharedMemory(create=True, size=max(2 * (height + 2) * width, 1))
+        self._buffers = np.ndarray(self.shape, dtype=bool, buffer=self.shm.buf)
+        self._source = 0
+        self._buffers[0, 1:-1] = grid
+        self._buffers[0, 0] = grid[-1]
+        self._buffers[0, -1] = grid[0]
+        self.generation = 0
+        self.pool = ProcessPoolExecutor(self.workers, initializer=_init_worker, initargs=(self.shm.name, self.shape))
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+    def close(self):
+        self.pool.shutdown()
+        del self._buffers
+        self.shm.close()
+        self.shm.unlink()
+
+    @property
+    def grid(self):
+        """The current generation, a view into shared memory that the next step overwrites"""
+        return self._buffers[self._source, 1:-1]
+
+    @property
+    def population(self):
+        return int(np.count_nonzero(self.grid))
+
+    def step(self, generations=1):
+        for _ in range(generations):
+            source = self._source
+            #every tile of a generation has to finish before any tile of the next starts
+            for _ in self.pool.map(_step_task, *zip(*((source, top, bottom) for top, bottom in self.tiles))):
+                pass
+            self._source = 1 - source
+            self.generation += 1
+        return self
+
+
+def benchmark(side=4096, generations=20, worker_counts=None):
+    """Cell updates/s of C04_life and of ParallelLife for each worker count, checking every result"""
+    worker_counts = worker_counts or sorted({1, 2, 4, os.cpu_count() or 1})
+    grid = Life.random(side, side, seed=1).grid
+    life = Life(grid)
+    begin = time.perf_counter()
+    life.step(generations)
+    serial = side * side * generations / (time.perf_counter() - begin)
+    print(f"{side}x{side}, {generations} generations, {os.cpu_count()} cpus")
+    print(f"{'C04_life':<16}{serial:>16,.0f} cell updates/s")
+    for workers in worker_counts:
+        with ParallelLife(grid, workers) as parallel:
+            parallel.step() #start the workers
+            begin = time.perf_counter()
+            parallel.step(generations - 1)
+            rate = side * side * (generations - 1) / (time.perf_counter() - begin)
+            if not np.array_equal(parallel.grid, life.grid):
+                raise AssertionError(f"{workers} workers differ from C04_life")
+        print(f"{f'{workers} workers':<16}{rate:>16,.0f} cell updates/s {rate / serial:>6.2f}x  matches C04_life")
+
+
+def check():
+    """Bit for bit against C04_life, also with more tiles than rows and one row tiles"""
+    for width, height, workers, tiles in ((60, 20, 2, None), (31, 7, 3, 7), (5, 1, 2, 4), (64, 64, 2, 5)):
+        grid = Life.random(width, height, seed=width).grid
+        life = Life(grid)
+        with ParallelLife(grid, workers, tiles) as parallel:
+            for generation in range(30):
+                life.step()
+                parallel.step()
+                if not np.array_equal(parallel.grid, life.grid):
+                    raise AssertionError(f"{width}x{height} in {tiles} tiles differs at generation {generation + 1}")
+        print(f"ok   {width}x{height}, {len(parallel.tiles)} tiles on {workers} workers")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--check']:
+        check()
+    else:
+        side = int(sys.argv[1]) if len(sys.argv) > 1 else 4096
+        generations = int(sys.argv[2]) if len(sys.argv) > 2 else 20
+        benchmark(side, generations)
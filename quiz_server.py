@@ -0,0 +1,265 @@
+"""C08_inputValidation's multiplication quiz for many players at once, on asyncio.
+
+A session is a coroutine, so one process runs thousands of quizzes at
+once. Answers go through the same checks as pyip.inputStr in
+C08_inputValidation: pysimplevalidate.validateStr with the answer as an
+allow regex and a block-everything regex. Each question has the same
+timeout and retry limit. The pause between questions is asyncio.sleep.
+Unlike inputStr, the timeout also fires when no answer comes at all, so a
+silent client cannot hold its session open.
+
+    python quiz_server.py [--port 8008]              #serve over TCP, play with: nc localhost 8008
+    python quiz_server.py --stdio                    #one quiz on stdin/stdout, for pipes
+    python quiz_server.py --load 2000 [--delay 0.1]  #load test: latency percentiles of simulated players
+    python quiz_server.py --check
+"""
+import argparse, asyncio, random, sys, time
+
+import pysimplevalidate as pysv
+
+QUESTIONS = 10
+TIMEOUT = 8
+LIMIT = 3
+DELAY = 1
+WRONG = 'Wrong answer dummy!'
+
+
+def check_answer(response, answer):
+    """None if response is the answer, otherwise the message pyip.inputStr prints for it"""
+    try:
+        pysv.validateStr(response, allowRegexes=['^%s$' % answer], blockRegexes=[('.*', WRONG)])
+    except pysv.ValidationException as exc:
+        return str(exc)
+    return None
+
+
+async def ask(reader, write, prompt, answer, timeout=TIMEOUT, limit=LIMIT):
+    """Ask one question like pyip.inputStr(timeout=timeout, limit=limit): True if answered right in time,
+    False if out of time or retries, None if the player left"""
+    deadline = asyncio.get_running_loop().time() + timeout
+    tries = 0
+    while True:
+        await write(prompt)
+        try:
+            #a deadline on the current task, wait_for would start a task per answer
+            async with asyncio.timeout_at(deadline):
+                line = await reader.readline()
+        except TimeoutError:
+            await write('\nOut of time!\n')
+            return False
+        if not line:
+            return None
+        tries += 1
+        message = check_answer(line.decode('utf-8', 'replace').rstrip('\r\n'), answer)
+        late = asyncio.get_running_loop().time() > deadline
+        if message is None and not late:
+            await write('Correct!\n')
+            return True
+        if message is not None:
+            await write(message + '\n')
+        if late:
+            await write('Out of time!\n')
+            return False
+        if tries >= limit:
+            await write('Out of retries!\n')
+            return False
+
+
+async def run_session(reader, write, rng, questions=QUESTIONS, timeout=TIMEOUT, limit=LIMIT, delay=DELAY):
+    """Play one quiz over a stream reader and an async write(str); return the score, or None if the player left"""
+    correctAnswers = 0
+    for questionNumber in range(questions):
+        #pick two random numbers
+        num1 = rng.randint(0, 9)
+        num2 = rng.randint(0, 9)
+        prompt = '#%s: %s x %s = ' % (questionNumber, num1, num2)
+        result = await ask(reader, write, prompt, num1 * num2, timeout, limit)
+        if result is None:
+            return None
+        correctAnswers += result
+        await asyncio.sleep(delay)
+    await write('Score: %s / %s\n' % (correctAnswers, questions))
+    return correctAnswers
+
+
+class QuizServer:
+    """A TCP server running one quiz session per connection"""
+
+    def __init__(self, questions=QUESTIONS, timeout=TIMEOUT, limit=LIMIT, delay=DELAY, seed=None):
+        self.settings = (questions, timeout, limit, delay)
+        self.rng = random.Random(seed)
+        self.sessions = self.finished = 0
+        self.server = None
+
+    async def handle(self, reader, writer):
+        self.sessions += 1
+
+        async def write(text):
+            writer.write(text.encode())
+            await writer.drain()
+
+        try:
+            if await run_session(reader, write, random.Random(self.rng.random()), *self.settings) is not None:
+                self.finished += 1
+        except ConnectionError:
+            pass
+        finally:
+            writer.close()
+
+    async def start(self, host='127.0.0.1', port=8008):
+        self.server = await asyncio.start_server(self.handle, host, port, backlog=4096)
+        return self.server.sockets[0].getsockname()[1]
+
+    async def serve(self, host='127.0.0.1', port=8008):
+        port = await self.start(host, port)
+        print(f'Quiz server on {host}:{port}', file=sys.stderr)
+        async with self.server:
+            await self.server.serve_forever()
+
+
+async def serve_stdio(questions=QUESTIONS, timeout=TIMEOUT, limit=LIMIT, delay=DELAY, seed=None):
+    """One quiz over stdin and stdout, without blocking the event loop on either"""
+    loop = asyncio.get_running_loop()
+    reader = asyncio.StreamReader()
+    await loop.connect_read_pipe(lambda: asyncio.StreamReaderProtocol(reader), sys.stdin)
+
+    async def write(text):
+        sys.stdout.write(text)
+        sys.stdout.flush()
+
+    return await run_session(reader, write, random.Random(seed), questions, timeout, limit, delay)
+
+
+async def _player(port, rng, questions, latencies, right):
+    """A simulated player answering right with chance right; return its score, or None if the server got it wrong"""
+    reader, writer = await asyncio.open_connection('127.0.0.1', port)
+    expected = 0
+    buffer = b''
+    try:
+        for _ in range(questions):
+            tries = 0
+            while True:
+                while not buffer.endswith(b'= '):
+                    buffer += await reader.read(4096)
+                prompt = buffer.decode().rsplit('#', 1)[1]
+                num1, num2 = map(int, prompt.split(':')[1].split('=')[0].split('x'))
+                wrong = rng.random() > right
+                writer.write(b'%d\n' % (num1 * num2 + wrong))
+                begin = time.perf_counter()
+                buffer = await reader.read(4096)
+                latencies.append(time.perf_counter() - begin)
+                tries += 1
+                if not wrong:
+                    expected += 1
+                    break
+                if tries == LIMIT:
+                    break
+        while not buffer.endswith(b'\n') or b'Score' not in buffer:
+            buffer += await reader.read(4096)
+        score = int(buffer.decode().rsplit('Score: ', 1)[1].split('/')[0])
+        return score if score == expected else None
+    finally:
+        writer.close()
+
+
+def _percentile(ordered, fraction):
+    return ordered[min(int(len(ordered) * fraction), len(ordered) - 1)]
+
+
+async def load_test(clients=2000, questions=QUESTIONS, delay=0.1, right=0.8, seed=0):
+    """Run clients simulated players at once against an in-process server, print answer latency percentiles"""
+    server = QuizServer(questions, TIMEOUT, LIMIT, delay, seed)
+    port = await server.start(port=0)
+    rng = random.Random(seed)
+    latencies = []
+    begin = time.perf_counter()
+    async with server.server:
+        scores = await asyncio.gather(*(_player(port, random.Random(rng.random()), questions, latencies, right)
+                                        for _ in range(clients)), return_exceptions=True)
+    elapsed = time.perf_counter() - begin
+    failed = [score for score in scores if isinstance(score, BaseException)]
+    wrong = sum(score is None for score in scores)
+    latencies.sort()
+    print(f"{clients} players x {questions} questions, {delay}s between questions: {elapsed:.1f}s, "
+          f"{len(latencies) / elapsed:,.0f} answers/s, {server.finished} sessions finished")
+    print(f"{'answer latency, ms':<22}" + ''.join(f"{name:>9}" for name in ('p50', 'p90', 'p99', 'p99.9', 'max')))
+    print(f"{'':<22}" + ''.join(f"{_percentile(latencies, fraction) * 1000:>9.2f}"
+                                for fraction in (0.5, 0.9, 0.99, 0.999, 1)))
+    if failed or wrong:
+        raise AssertionError(f"{len(failed)} players failed ({failed[:1]}), {wrong} got a wrong score")
+    #a session sleeps after every question, anything over that is waiting on the server
+    print(f"shortest possible run {questions * delay:.1f}s, all {clients} scores right")
+
+
+async def _scripted(lines, timeout=TIMEOUT, questions=2, seed=1):
+    """Transcript and score of a session fed lines, a float in lines waits that long instead"""
+    reader = asyncio.StreamReader()
+    transcript = []
+
+    async def write(text):
+        transcript.append(text)
+
+    async def feed():
+        for line in lines:
+            if isinstance(line, float):
+                await asyncio.sleep(line)
+            else:
+                reader.feed_data(line.encode() + b'\n')
+        reader.feed_eof()
+
+    feeder = asyncio.create_task(feed())
+    score = await run_session(reader, write, random.Random(seed), questions, timeout, LIMIT, 0)
+    await feeder
+    return ''.join(transcript), score
+
+
+def check():
+    """Scripted sessions: right, wrong then right, blank, out of retries, out of time, late, gone"""
+    rng = random.Random(1)
+    first, second = [rng.randint(0, 9) * rng.randint(0, 9) for _ in range(2)]
+    cases = (
+        ([f'{first}', f' {second} '], 2, ['Correct!', 'Correct!', 'Score: 2 / 2']),
+        (['x', '', f'{first}', f'{second}'], 2, [WRONG, 'Blank values are not allowed.', 'Correct!', 'Score: 2 / 2']),
+        (['1000', '1001', '1002', f'{second}x', f'{second}'], 1,
+         [WRONG, WRONG, WRONG, 'Out of retries!', WRONG, 'Correct!', 'Score: 1 / 2']),
+        ([0.3, f'{second}'], 1, ['Out of time!', 'Correct!', 'Score: 1 / 2']),
+        ([f'{first}', 0.3, f'{second}'], 1, ['Correct!', 'Out of time!', 'Score: 1 / 2']),
+        (['1000'], None, [WRONG]),
+    )
+    for lines, expected, messages in cases:
+        transcript, score = asyncio.run(_scripted(lines, timeout=0.2))
+        position = 0
+        for message in messages:
+            position = transcript.find(message, position)
+            if position < 0:
+                raise AssertionError(f"{lines}: no {message!r} in {transcript!r}")
+        if score != expected:
+            raise AssertionError(f"{lines}: score {score}, expected {expected}")
+        print(f"ok   {lines!r:<34} score {score}")
+    #validateStr strips the answer, like pyip.inputStr does
+    for response, accepted in (('42', True), (' 42 ', True), ('042', False), ('42.0', False), ('', False),
+                               ('4 2', False), ('42\n', True)):
+        if (check_answer(response, 42) is None) != accepted:
+            raise AssertionError(f"check_answer({response!r}) should {'' if accepted else 'not '}accept it")
+    print("ok   check_answer accepts and rejects like pyip.inputStr")
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="multiplication quiz server")
+    parser.add_argument('--port', type=int, default=8008)
+    parser.add_argument('--stdio', action='store_true', help="play one quiz on stdin/stdout")
+    parser.add_argument('--load', type=int, metavar='CLIENTS', help="load test with this many simulated players")
+    parser.add_argument('--delay', type=float, help=f"seconds between questions, {DELAY} or 0.1 for --load")
+    parser.add_argument('--seed', type=int)
+    parser.add_argument('--check', action='store_true')
+    args = parser.parse_args()
+    if args.check:
+        check()
+    elif args.load:
+        asyncio.run(load_test(args.load, delay=0.1 if args.delay is None else args.delay, seed=args.seed or 0))
+    elif args.stdio:
+        asyncio.run(serve_stdio(delay=DELAY if args.delay is None else args.delay, seed=args.seed))
+    else:
+        try:
+            asyncio.run(QuizServer(delay=DELAY if args.delay is None else args.delay, seed=args.seed).serve(port=args.port))
+        except KeyboardInterrupt:
+            pass
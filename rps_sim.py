@@ -0,0 +1,311 @@
+"""Rock, paper, scissors strategies played against each other by the million, with NumPy.
+
+Moves are 0, 1, 2 for rock, paper, scissors. A round is scored by looking
+up PAYOFF[move, other] instead of comparing moves. A match is many
+independent games played side by side, one NumPy operation per round
+for all of them. Strategies that ignore the opponent (random, cycle,
+constant) generate whole blocks of rounds at once.
+
+A strategy is started for a number of games and then, every round,
+gives its moves and sees both sides' moves:
+
+    class Strategy:
+        oblivious = False               #True if it never looks at the opponent; then define block()
+        def start(self, games, rng): ...
+        def move(self): ...             #(games,) moves
+        def update(self, own, other): ...
+
+    play(Markov(2), Cycle(), rounds=1000, games=1000)
+    tournament({name: make() for name, make in STRATEGIES.items()})
+
+    python rps_sim.py [rounds] [games]     #tournament of STRATEGIES
+    python rps_sim.py --benchmark
+    python rps_sim.py --check
+"""
+import random, sys, time
+from collections import namedtuple
+
+import numpy as np
+
+MOVES = 'rps'
+NAMES = ('ROCK', 'PAPER', 'SCISSORS')
+#PAYOFF[move, other]: 1 if move beats other, -1 if it loses, 0 for a tie
+PAYOFF = np.array([[0, -1, 1],
+                   [1, 0, -1],
+                   [-1, 1, 0]], dtype=np.int8)
+#BEATS[move]: the move that beats it
+BEATS = np.array([1, 2, 0], dtype=np.int8)
+#largest block of rounds x games generated at once by oblivious strategies
+BLOCK = 1 << 22
+
+Result = namedtuple('Result', 'wins losses ties score error')
+
+
+class Uniform:
+    """Each move with the same chance, like random.randint(1, 3)"""
+    oblivious = True
+
+    def start(self, games, rng):
+        self.games, self.rng = games, rng
+
+    def block(self, rounds):
+        return self.rng.integers(0, 3, (self.games, rounds), dtype=np.int8)
+
+    def move(self):
+        return self.block(1)[:, 0]
+
+    def update(self, own, other):
+        pass
+
+
+class Biased(Uniform):
+    """Rock, paper and scissors with the chances p"""
+
+    def __init__(self, p=(0.5, 0.3, 0.2)):
+        self.p = p
+
+    def block(self, rounds):
+        return self.rng.choice(3, (self.games, rounds), p=self.p).astype(np.int8)
+
+
+class Constant(Uniform):
+    def __init__(self, move=0):
+        self.constant = move
+
+    def block(self, rounds):
+        return np.full((self.games, rounds), self.constant, dtype=np.int8)
+
+
+class Cycle(Uniform):
+    """Rock, paper, scissors, rock... from a random move in each game"""
+
+    def start(self, games, rng):
+        super().start(games, rng)
+        self.next = rng.integers(0, 3, games)
+
+    def block(self, rounds):
+        moves = ((self.next[:, None] + np.arange(rounds)) % 3).astype(np.int8)
+        self.next = (self.next + rounds) % 3
+        return moves
+
+
+class Copy:
+    """The opponent's last move; rock first"""
+    oblivious = False
+
+    def start(self, games, rng):
+        self.last = np.zeros(games, dtype=np.int8)
+
+    def move(self):
+        return self.last
+
+    def update(self, own, other):
+        self.last = other
+
+
+class BeatLast(Copy):
+    """The move that beats the opponent's last move"""
+
+    def move(self):
+        return BEATS[self.last]
+
+
+class Frequency:
+    """The move that beats the opponent's most frequent move so far, ties broken at random"""
+    oblivious = False
+
+    def start(self, games, rng):
+        self.rng = rng
+        self.counts = np.zeros((games, 3), dtype=np.int32)
+        self.games = np.arange(games)
+
+    def move(self):
+        return BEATS[self._predict(self.counts)]
+
+    def _predict(self, counts):
+        #noise below 1 only decides between equal counts
+        return np.argmax(counts + self.rng.random(counts.shape, dtype=np.float32) * 0.5, axis=1)
+
+    def update(self, own, other):
+        self.counts[self.games, other] += 1
+
+
+class Markov(Frequency):
+    """An n-gram predictor: counts what the opponent played after each of its last order moves,
+    and beats the most frequent follow-up of the current context.
+
+    The context is the last order moves as a base 3 number, rolled on each
+    round, so an update is one count and one multiply-add per game
+    whatever the order.
+    """
+
+    def __init__(self, order=1):
+        self.order = order
+        self.contexts = 3 ** order
+
+    def start(self, games, rng):
+        super().start(games, rng)
+        self.counts = np.zeros((games, self.contexts, 3), dtype=np.int32)
+        #the history starts as if the opponent had played rock order times
+        self.context = np.zeros(games, dtype=np.intp)
+
+    def move(self):
+        return BEATS[self._predict(self.counts[self.games, self.context])]
+
+    def update(self, own, other):
+        self.counts[self.games, self.context, other] += 1
+        self.context = (self.context * 3 + other) % self.contexts
+
+
+STRATEGIES = {
+    'random': Uniform,
+    'biased': Biased,
+    'rock': Constant,
+    'cycle': Cycle,
+    'copy': Copy,
+    'beat-last': BeatLast,
+    'frequency': Frequency,
+    'markov1': lambda: Markov(1),
+    'markov2': lambda: Markov(2),
+    'markov3': lambda: Markov(3),
+}
+
+
+def play(a, b, rounds=1000, games=1000, seed=None, record=False):
+    """Play rounds rounds of games games of a against b; return a's Result, and both move arrays if record.
+
+    score is a's mean payoff per round, error its standard error over the games.
+    """
+    rng = np.random.default_rng(seed)
+    a.start(games, rng)
+    b.start(games, rng)
+    totals = np.zeros((games, 3), dtype=np.int64)
+    history = []
+    if a.oblivious and b.oblivious:
+        step = max(BLOCK // games, 1)
+        for done in range(0, rounds, step):
+            count = min(step, rounds - done)
+            moves_a, moves_b = a.block(count), b.block(count)
+            outcomes = PAYOFF[moves_a, moves_b]
+            for outcome in (-1, 0, 1):
+                totals[:, outcome + 1] += np.count_nonzero(outcomes == outcome, axis=1)
+            if record:
+                history.append((moves_a, moves_b))
+    else:
+        rows = np.arange(games)
+        for _ in range(rounds):
+            moves_a, moves_b = a.move(), b.move()
+            totals[rows, PAYOFF[moves_a, moves_b] + 1] += 1
+            a.update(moves_a, moves_b)
+            b.update(moves_b, moves_a)
+            if record:
+                history.append((moves_a[:, None], moves_b[:, None]))
+    losses, ties, wins = totals.sum(axis=0).tolist()
+    per_game = (totals[:, 2] - totals[:, 0]) / max(rounds, 1)
+    error = per_game.std(ddof=1) / np.sqrt(games) if games > 1 else 0.0
+    result = Result(wins, losses, ties, float(per_game.mean()), float(error))
+    if record:
+        return result, np.hstack([moves for moves, _ in history]), np.hstack([moves for _, moves in history])
+    return result
+
+
+def tournament(strategies, rounds=1000, games=200, seed=0):
+    """Play every strategy against every other, print the score table and return the names ranked best first"""
+    names = list(strategies)
+    scores = np.zeros((len(names), len(names)))
+    for i, first in enumerate(names):
+        for j in range(i + 1, len(names)):
+            score = play(strategies[first], strategies[names[j]], rounds, games, seed=seed + i * len(names) + j).score
+            scores[i, j], scores[j, i] = score, -score
+    ranked = sorted(range(len(names)), key=lambda i: -scores[i].mean())
+    width = max(map(len, names)) + 2
+    print(f"{'':<{width}}" + ''.join(f"{names[j][:9]:>10}" for j in ranked) + f"{'mean':>10}")
+    for i in ranked:
+        print(f"{names[i]:<{width}}" + ''.join(f"{scores[i, j]:>10.3f}" for j in ranked) + f"{scores[i].mean():>10.3f}")
+    return [names[i] for i in ranked]
+
+
+def branching_round(playerMove):
+    """One round the way C02_RPS plays it: random.randint and comparisons; 1 win, 0 tie, -1 loss"""
+    randomNumber = random.randint(1, 3)
+    if randomNumber == 1:
+        computerMove = 'r'
+    if randomNumber == 2:
+        computerMove = 'p'
+    if randomNumber == 3:
+        computerMove = 's'
+    if playerMove == computerMove:
+        return 0
+    elif (playerMove == 'r' and computerMove == 's') or (playerMove == 's' and computerMove == 'p') or \
+            (playerMove == 'p' and computerMove == 'r'):
+        return 1
+    return -1
+
+
+def benchmark(seconds=1.0):
+    """Rounds per second of the branching loop and of batched matches"""
+    begin = time.perf_counter()
+    rounds = 0
+    while time.perf_counter() - begin < seconds:
+        for move in 'rps' * 1000:
+            branching_round(move)
+        rounds += 3000
+    print(f"{'C02_RPS loop, randint + if':<36}{rounds / (time.perf_counter() - begin):>16,.0f} rounds/s")
+    for name, a, b, rounds, games in (('random v random, blocks', Uniform(), Uniform(), 10000, 2000),
+                                      ('cycle v biased, blocks', Cycle(), Biased(), 10000, 2000),
+                                      ('markov2 v cycle, per round', Markov(2), Cycle(), 1000, 2000),
+                                      ('markov3 v frequency, per round', Markov(3), Frequency(), 1000, 2000)):
+        begin = time.perf_counter()
+        play(a, b, rounds, games, seed=1)
+        rate = rounds * games / (time.perf_counter() - begin)
+        print(f"{name:<36}{rate:>16,.0f} rounds/s")
+
+
+def check():
+    """PAYOFF against C02_RPS's comparisons, incremental counts against recounts, and matchups with known winners"""
+    for move in range(3):
+        for other in range(3):
+            playerMove, computerMove = MOVES[move], MOVES[other]
+            if playerMove == computerMove:
+                expected = 0
+            elif (playerMove == 'r' and computerMove == 's') or (playerMove == 's' and computerMove == 'p') or \
+                    (playerMove == 'p' and computerMove == 'r'):
+                expected = 1
+            else:
+                expected = -1
+            if PAYOFF[move, other] != expected or PAYOFF[BEATS[other], other] != 1:
+                raise AssertionError(f"PAYOFF[{playerMove}, {computerMove}] is wrong")
+    print("ok   PAYOFF and BEATS agree with C02_RPS")
+
+    for order in (1, 2, 3):
+        markov = Markov(order)
+        result, own, other = play(markov, Biased(), rounds=300, games=50, seed=order, record=True)
+        #the counts from the whole history, with order rocks before it
+        padded = np.hstack([np.zeros((50, order), dtype=np.int64), other])
+        context = sum(padded[:, k:k + 300] * 3 ** (order - 1 - k) for k in range(order))
+        counts = np.zeros_like(markov.counts)
+        np.add.at(counts, (np.arange(50)[:, None], context, other), 1)
+        if not np.array_equal(counts, markov.counts) or result.wins + result.losses + result.ties != 300 * 50:
+            raise AssertionError(f"markov{order} counts differ from a recount of the history")
+    print("ok   Markov counts updated per round equal a recount of the history")
+
+    result, own, other = play(Uniform(), Uniform(), rounds=3000, games=1000, seed=1, record=True)
+    if own.shape != (1000, 3000) or abs(result.score) > 4 * result.error or \
+            abs(result.ties / 3e6 - 1 / 3) > 0.005:
+        raise AssertionError(f"random v random is not even: {result}")
+    for a, b in ((Markov(1), Cycle()), (Markov(2), BeatLast()), (Frequency(), Constant()), (BeatLast(), Constant()),
+                 (Frequency(), Biased()), (Markov(1), Copy())):
+        result = play(a, b, rounds=500, games=200, seed=2)
+        if result.score < 0.2 or result.score < 4 * result.error:
+            raise AssertionError(f"{type(a).__name__} should beat {type(b).__name__}: {result}")
+        print(f"ok   {type(a).__name__:<10} beats {type(b).__name__:<10} {result.score:+.3f} +- {result.error:.3f}")
+
+
+if __name__ == "__main__":
+    if sys.argv[1:2] == ['--check']:
+        check()
+    elif sys.argv[1:2] == ['--benchmark']:
+        benchmark()
+    else:
+        tournament({name: make() for name, make in STRATEGIES.items()},
+                   int(sys.argv[1]) if len(sys.argv) > 1 else 1000, int(sys.argv[2]) if len(sys.argv) > 2 else 200)